@@ -0,0 +1,450 @@
+"""
+Synthetic input data for the pipeline benchmarks: TA's, GPM (IMERG) HDF5 files, a COSMO NetCDF, rainfall per TA and a
+scenario library (depth.tif, region_statistics.gpkg and vulnerable_*.gpkg per scenario). All data is written in the
+folder layout of the pipeline (data/...) relative to the current working directory.
+"""
+import math
+import h5py
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import rasterio
+import xarray as xr
+from datetime import datetime, timedelta
+from pathlib import Path
+from rasterio.transform import from_origin
+from shapely.geometry import LineString, Point, box
+from mapping_tables.exposure_mapping_tables import EXPOSURE_TYPES
+from mapping_tables import upstream_mapping
+from mapping_tables.upstream_mapping import UPSTREAM_PLACECODES, compile_upstream_matrix
+from utils.general_utils.convert_placecode_to_district import convert_placecode_to_region
+from settings.base import (
+    ASSET_TYPES,
+    DATA_FOLDER,
+    ENVIRONMENT,
+    EVENT_SEVERITY_ORDER,
+    EVENT_SEVERITY_ORDER_URBAN,
+    REGIONS,
+    UPSTREAM_MAP,
+)
+
+TA_ORIGIN = (33.5, -9.6)  # north-west corner of the synthetic TA's (lon, lat)
+GPM_RESOLUTION = 0.1
+COSMO_RESOLUTION = 0.025
+GFS_RESOLUTION = 0.25
+GFS_MISSING_VALUE = 9.999e20
+VULNERABILITIES = ["high risk", "moderate risk", "no risk"]
+
+PIPELINE_FOLDERS = [
+    "data/gpm/raw",
+    "data/cosmo",
+    "data/gfs",
+    f"data/static_data/{ENVIRONMENT}",
+    f"data/{ENVIRONMENT}/logs",
+    f"data/{ENVIRONMENT}/debug_output",
+    f"data/{ENVIRONMENT}/events",
+    f"data/{ENVIRONMENT}/flood_extents",
+    f"data/{ENVIRONMENT}/temp_rasters",
+    str(DATA_FOLDER),
+]
+
+
+def create_pipeline_folders():
+    for folder in PIPELINE_FOLDERS:
+        Path(folder).mkdir(parents=True, exist_ok=True)
+
+
+def utc_now():
+    return datetime.utcnow().replace(second=0, microsecond=0)
+
+
+def scenario_names(nr_of_scenarios=None):
+    """
+    Names of the scenarios in the severity orders (e.g., 20mm_12hr), None for all scenarios.
+    """
+    names = list(dict.fromkeys(EVENT_SEVERITY_ORDER + EVENT_SEVERITY_ORDER_URBAN))
+    return names if nr_of_scenarios is None else names[:nr_of_scenarios]
+
+
+def pipeline_place_codes():
+    """
+    Placecodes of the pipeline: the TA's of UPSTREAM_MAP followed by the other TA's of the regions.
+    """
+    return list(
+        dict.fromkeys(
+            UPSTREAM_PLACECODES
+            + [
+                place_code
+                for region in REGIONS.values()
+                for place_code in region["placecodes"]
+            ]
+        )
+    )
+
+
+def synthetic_place_codes(nr_of_tas):
+    """
+    Synthetic placecodes of the TA's of a case beyond the placecodes of the pipeline.
+    """
+    return [
+        f"MW9{index:05d}"
+        for index in range(max(nr_of_tas - len(pipeline_place_codes()), 0))
+    ]
+
+
+def register_synthetic_tas(nr_of_tas):
+    """
+    Give the synthetic TA's of a case an entry in UPSTREAM_MAP (an upstream area of only the TA itself) and recompile the
+    upstream matrix, so the scenario selector processes them like the TA's of the pipeline. Must be called before the
+    scenario selector is imported.
+
+    Args:
+        nr_of_tas (int): number of TA's of the case
+    """
+    upstream_map = dict(UPSTREAM_MAP)
+    upstream_map.update(
+        {place_code: [place_code] for place_code in synthetic_place_codes(nr_of_tas)}
+    )
+    (
+        upstream_mapping.UPSTREAM_PLACECODES,
+        upstream_mapping.UPSTREAM_MATRIX,
+    ) = compile_upstream_matrix(upstream_map)
+
+
+def create_tas(nr_of_tas, ta_size=0.01):
+    """
+    Square TA's on a grid. The first TA's get the placecodes of the pipeline (the scenario selector needs all TA's of
+    UPSTREAM_MAP), additional TA's get synthetic placecodes (see register_synthetic_tas).
+
+    Args:
+        nr_of_tas (int): number of TA's
+        ta_size (float): width and height of a TA in degrees
+
+    Returns:
+        ta_gdf (gpd.GeoDataFrame): TA's with placeCode and geometry (EPSG:4326)
+    """
+    place_codes = pipeline_place_codes()[:nr_of_tas]
+    place_codes += synthetic_place_codes(nr_of_tas)
+
+    nr_of_columns = math.ceil(math.sqrt(nr_of_tas))
+    geometries = [
+        box(
+            TA_ORIGIN[0] + (index % nr_of_columns) * ta_size,
+            TA_ORIGIN[1] - (index // nr_of_columns + 1) * ta_size,
+            TA_ORIGIN[0] + (index % nr_of_columns + 1) * ta_size,
+            TA_ORIGIN[1] - (index // nr_of_columns) * ta_size,
+        )
+        for index in range(nr_of_tas)
+    ]
+    return gpd.GeoDataFrame({"placeCode": place_codes}, geometry=geometries, crs=4326)
+
+
+def region_of_ta(place_code, ta_index):
+    """
+    Region key of a TA: TA's with a placecode of a region belong to that region, other TA's are divided over the regions.
+    """
+    region_key = convert_placecode_to_region(place_code)
+    if region_key is None:
+        region_key = list(REGIONS)[ta_index % len(REGIONS)]
+    return region_key
+
+
+def write_raster(path, data, bounds, resolution, nodata=-9999):
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        width=data.shape[1],
+        height=data.shape[0],
+        count=1,
+        dtype=data.dtype,
+        crs="EPSG:4326",
+        transform=from_origin(bounds[0], bounds[3], resolution, resolution),
+        nodata=nodata,
+        compress="deflate",
+    ) as dest:
+        dest.write(data, 1)
+
+
+def create_static_data(ta_gdf, depth_resolution=1e-4):
+    """
+    Write regions.gpkg, region_statistics_zeroes.gpkg and nodata_ibf.tif to data/static_data/<ENVIRONMENT>.
+    """
+    static_folder = Path(f"data/static_data/{ENVIRONMENT}")
+    ta_gdf.to_file(static_folder / "regions.gpkg")
+
+    region_statistics_zeroes = ta_gdf.rename(columns={"placeCode": "ADM3_PCODE"})
+    for column in EXPOSURE_TYPES:
+        region_statistics_zeroes[column] = 0.0
+    region_statistics_zeroes.to_file(static_folder / "region_statistics_zeroes.gpkg")
+
+    bounds = ta_gdf.total_bounds
+    nodata = np.full(
+        (
+            math.ceil((bounds[3] - bounds[1]) / depth_resolution),
+            math.ceil((bounds[2] - bounds[0]) / depth_resolution),
+        ),
+        -9999,
+        dtype="float32",
+    )
+    write_raster(static_folder / "nodata_ibf.tif", nodata, bounds, depth_resolution)
+
+
+def create_scenario_library(
+    ta_gdf, scenarios, assets_per_ta=50, depth_resolution=1e-4, seed=0
+):
+    """
+    Write a scenario library to DATA_FOLDER: per scenario a flood depth map, the region statistics of all TA's and the
+    vulnerable assets. The assets are the same in all scenarios, their vulnerability differs per scenario.
+
+    Args:
+        ta_gdf (gpd.GeoDataFrame): TA's (see create_tas)
+        scenarios (list): names of the scenarios (e.g., 20mm_12hr)
+        assets_per_ta (int): number of assets of each asset type per TA
+        depth_resolution (float): resolution of the flood depth maps in degrees
+        seed (int): seed of the random generator
+    """
+    rng = np.random.default_rng(seed)
+    ta_gdf_3857 = ta_gdf.to_crs(3857)
+    bounds = ta_gdf.total_bounds
+    depth_shape = (
+        math.ceil((bounds[3] - bounds[1]) / depth_resolution),
+        math.ceil((bounds[2] - bounds[0]) / depth_resolution),
+    )
+
+    # asset locations: uniformly distributed within the (bounding box of) each TA
+    asset_locations = []
+    for geometry in ta_gdf_3857.geometry:
+        xmin, ymin, xmax, ymax = geometry.bounds
+        asset_locations.append(
+            np.column_stack(
+                [
+                    rng.uniform(xmin, xmax, assets_per_ta),
+                    rng.uniform(ymin, ymax, assets_per_ta),
+                ]
+            )
+        )
+    asset_locations = np.concatenate(asset_locations)
+    asset_geometries = {
+        "vulnerable_roads": [LineString([(x, y), (x + 300, y + 200)]) for x, y in asset_locations],
+        "vulnerable_buildings": [box(x, y, x + 10, y + 10) for x, y in asset_locations],
+        "vulnerable_schools": [Point(x, y) for x, y in asset_locations],
+        "vulnerable_waterpoints": [Point(x + 5, y) for x, y in asset_locations],
+        "vulnerable_health_sites": [Point(x, y + 5) for x, y in asset_locations],
+    }
+
+    for scenario in scenarios:
+        scenario_folder = Path(DATA_FOLDER) / scenario
+        scenario_folder.mkdir(parents=True, exist_ok=True)
+
+        depth = rng.gamma(0.5, 0.4, depth_shape).astype("float32")
+        depth[depth < 0.2] = -9999
+        write_raster(scenario_folder / "depth.tif", depth, bounds, depth_resolution)
+
+        region_statistics = ta_gdf[["placeCode", "geometry"]].copy()
+        for column in EXPOSURE_TYPES:
+            region_statistics[column] = rng.integers(0, 60, len(ta_gdf)).astype(float)
+        region_statistics.to_file(scenario_folder / "region_statistics.gpkg")
+
+        for asset_type in ASSET_TYPES:
+            if asset_type == "region_statistics":
+                continue
+            gpd.GeoDataFrame(
+                {
+                    "id": np.arange(len(asset_locations)),
+                    "vulnerability": rng.choice(VULNERABILITIES, len(asset_locations)),
+                },
+                geometry=asset_geometries[asset_type],
+                crs=3857,
+            ).to_file(scenario_folder / f"{asset_type}.gpkg")
+
+
+def rainfall(rng, shape, rain_scale):
+    """
+    Rainfall (mm/hr) which is zero in 60% of the cells.
+    """
+    return (rng.gamma(0.5, rain_scale, shape) * (rng.random(shape) < 0.4)).astype(
+        "float32"
+    )
+
+
+def create_gpm_files(ta_gdf, nr_of_timesteps, end=None, rain_scale=2, seed=0):
+    """
+    Write half-hourly IMERG HDF5 files (global 0.1 degree grid, gzip compressed like the GES DISC files) to data/gpm/raw,
+    the last one starting at end. It rains around the TA's only.
+
+    Args:
+        ta_gdf (gpd.GeoDataFrame): TA's (see create_tas)
+        nr_of_timesteps (int): number of half-hourly files
+        end (datetime): start time of the last file, defaults to the last half hour (UTC)
+        rain_scale (float): scale of the rainfall distribution (mm/hr)
+        seed (int): seed of the random generator
+
+    Returns:
+        filenames (list): names of the HDF5 files
+    """
+    rng = np.random.default_rng(seed)
+    if end is None:
+        now = utc_now()
+        end = now.replace(minute=30 * (now.minute // 30))
+
+    lats = np.arange(-89.95, 90, GPM_RESOLUTION)
+    lons = np.arange(-179.95, 180, GPM_RESOLUTION)
+    xmin, ymin, xmax, ymax = ta_gdf.total_bounds
+    lon_slice = slice(
+        np.searchsorted(lons, xmin - 1), np.searchsorted(lons, xmax + 1)
+    )
+    lat_slice = slice(
+        np.searchsorted(lats, ymin - 1), np.searchsorted(lats, ymax + 1)
+    )
+
+    filenames = []
+    for step in range(nr_of_timesteps - 1, -1, -1):
+        start = end - timedelta(minutes=30 * step)
+        filename = (
+            f"3B-HHR-L.MS.MRG.3IMERG.{start:%Y%m%d}-S{start:%H%M%S}-E{start + timedelta(minutes=29, seconds=59):%H%M%S}."
+            f"{start.hour * 60 + start.minute:04d}.V07B.HDF5"
+        )
+        # IMERG grids are stored as (lon, lat)
+        precipitation = np.zeros((1, len(lons), len(lats)), dtype="float32")
+        precipitation[0, lon_slice, lat_slice] = rainfall(
+            rng,
+            (lon_slice.stop - lon_slice.start, lat_slice.stop - lat_slice.start),
+            rain_scale,
+        )
+
+        with h5py.File(Path("data/gpm/raw") / filename, "w") as hdf5_file:
+            grid = hdf5_file.create_group("Grid")
+            grid["lat"] = lats
+            grid["lon"] = lons
+            time = grid.create_dataset(
+                "time", data=np.array([int((start - datetime(1970, 1, 1)).total_seconds())])
+            )
+            time.attrs["Units"] = np.bytes_(b"seconds since 1970-01-01 00:00:00 UTC")
+            grid.create_dataset(
+                "precipitation",
+                data=precipitation,
+                chunks=(1, 145, 1800),
+                compression="gzip",
+                compression_opts=4,
+            )
+        filenames.append(filename)
+    return filenames
+
+
+def create_cosmo_file(ta_gdf, nr_of_timesteps, run_date=None, rain_scale=2, seed=0):
+    """
+    Write a COSMO forecast (accumulated precipitation tp on a rotated-pole-like rlat/rlon grid in degrees) to
+    data/cosmo/COSMO_MLW_<run date>T00_prec.nc.
+
+    Args:
+        ta_gdf (gpd.GeoDataFrame): TA's (see create_tas)
+        nr_of_timesteps (int): number of hourly forecast steps
+        run_date (datetime): date of the COSMO run, defaults to today (UTC)
+        rain_scale (float): scale of the rainfall distribution (mm/hr)
+        seed (int): seed of the random generator
+
+    Returns:
+        cosmo_path (Path): path of the NetCDF file
+    """
+    rng = np.random.default_rng(seed)
+    if run_date is None:
+        run_date = utc_now()
+    run_date = run_date.replace(hour=0, minute=0)
+
+    xmin, ymin, xmax, ymax = ta_gdf.total_bounds
+    rlon = np.arange(xmin - 0.5, xmax + 0.5, COSMO_RESOLUTION)
+    rlat = np.arange(ymin - 0.5, ymax + 0.5, COSMO_RESOLUTION)
+    increments = rainfall(rng, (nr_of_timesteps, len(rlat), len(rlon)), rain_scale)
+
+    cosmo_path = Path(f"data/cosmo/COSMO_MLW_{run_date:%Y%m%d}T00_prec.nc")
+    xr.Dataset(
+        {"tp": (("time", "rlat", "rlon"), np.cumsum(increments, axis=0))},
+        coords={
+            "time": pd.date_range(run_date, periods=nr_of_timesteps, freq="h"),
+            "rlat": rlat,
+            "rlon": rlon,
+        },
+    ).to_netcdf(cosmo_path)
+    return cosmo_path
+
+
+def create_gfs_file(ta_gdf, cycle, nr_of_timesteps=41, rain_scale=2, seed=0):
+    """
+    Write a GFS run as served by the NOMADS OPeNDAP server (GrADS time units, global 0.25 degree grid with 0-360
+    longitudes, missing_value attributes, more parameters than the accumulated precipitation apcpsfc) to
+    data/gfs/gfs_<cycle date>_<cycle hour>z.nc. Used as local stand-in for the server, see GFS_OPENDAP_URL.
+
+    Args:
+        ta_gdf (gpd.GeoDataFrame): TA's (see create_tas)
+        cycle (datetime): issue time of the GFS run
+        nr_of_timesteps (int): number of 3-hourly forecast steps
+        rain_scale (float): scale of the rainfall distribution (mm/hr)
+        seed (int): seed of the random generator
+
+    Returns:
+        gfs_path (Path): path of the NetCDF file
+    """
+    rng = np.random.default_rng(seed)
+    lats = np.arange(-90, 90 + GFS_RESOLUTION / 2, GFS_RESOLUTION)
+    lons = np.arange(0, 360, GFS_RESOLUTION)
+    xmin, ymin, xmax, ymax = ta_gdf.total_bounds
+    lon_slice = slice(np.searchsorted(lons, xmin - 1), np.searchsorted(lons, xmax + 1))
+    lat_slice = slice(np.searchsorted(lats, ymin - 1), np.searchsorted(lats, ymax + 1))
+
+    increments = np.zeros((nr_of_timesteps, len(lats), len(lons)), dtype="float32")
+    increments[:, lat_slice, lon_slice] = 3 * rainfall(
+        rng,
+        (nr_of_timesteps, lat_slice.stop - lat_slice.start, lon_slice.stop - lon_slice.start),
+        rain_scale,
+    )
+    apcpsfc = np.cumsum(increments, axis=0)
+    apcpsfc[0] = GFS_MISSING_VALUE  # no accumulation at the analysis time
+
+    grads_attributes = {"missing_value": GFS_MISSING_VALUE, "_FillValue": GFS_MISSING_VALUE}
+    gfs_path = Path(f"data/gfs/gfs_{cycle:%Y%m%d_%H}z.nc")
+    xr.Dataset(
+        {
+            "apcpsfc": (("time", "lat", "lon"), apcpsfc, grads_attributes),
+            "tmp2m": (("time", "lat", "lon"), np.full_like(apcpsfc, 293.15), grads_attributes),
+        },
+        coords={
+            "time": (
+                "time",
+                (cycle - datetime(1, 1, 1)).days + 2 + (cycle.hour + 3 * np.arange(nr_of_timesteps)) / 24,
+                {"units": "days since 1-1-1 00:00:0.0"},
+            ),
+            "lat": lats,
+            "lon": lons,
+        },
+    ).to_netcdf(
+        gfs_path,
+        encoding={
+            "apcpsfc": {"zlib": True, "chunksizes": (1, 181, 360)},
+            "tmp2m": {"zlib": True, "chunksizes": (1, 181, 360)},
+        },
+    )
+    return gfs_path
+
+def create_forcing(place_codes, nr_of_timesteps, rain_scale=2, seed=0):
+    """
+    Hourly rainfall per TA in the format of ForcingProcessor.construct_forcing_timeseries, with the last 48 hours in the
+    future (the forecast).
+
+    Returns:
+        forcing (dict): dictionary with placeCode as key and dataframe with datetime and precipitation as value
+    """
+    rng = np.random.default_rng(seed)
+    start = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(
+        hours=nr_of_timesteps - 49
+    )
+    datetimes = pd.date_range(start, periods=nr_of_timesteps, freq="h")
+    return {
+        place_code: pd.DataFrame(
+            {
+                "datetime": datetimes,
+                "precipitation": rainfall(rng, nr_of_timesteps, rain_scale).astype(float),
+            }
+        )
+        for place_code in place_codes
+    }
@@ -0,0 +1,112 @@
+"""
+Benchmark of the GPM download against a stub GES DISC server (see benchmarks/stub_gesdisc.py): full global IMERG files
+against the Malawi subsets requested with an OPeNDAP constraint expression (GPM_SUBSET_DOWNLOAD). Reports the time, the
+bytes transferred and stored, and whether both modes give the same GPM archive. Then times the cold-start decode (empty
+GPM archive) of the full files with every number of decode processes (GPM_DECODE_WORKERS).
+
+Run from the flash_flood_pipeline folder: python -m benchmarks.gpm_download --timesteps 336 --decode-workers 1 2 4
+"""
+import argparse
+import os
+import tempfile
+import time
+import xarray as xr
+from datetime import timedelta
+from pathlib import Path
+from benchmarks import fixtures
+from benchmarks.stub_gesdisc import StubGesDisc
+from data_download.download_gpm import GpmDownload
+
+
+def download(stub, download_path, t0, ensure_available_days, subset):
+    """
+    Download and decode the IMERG files served by the stub in the given mode.
+
+    Returns:
+        wall_s (float): seconds to download the files
+        archive_path (Path): path of the GPM archive (see GpmDownload.process_data)
+    """
+    download_path.mkdir(parents=True)
+    gpm_download = GpmDownload(
+        download_path=download_path,
+        t0=t0,
+        ensure_available_days=ensure_available_days,
+        catalog_cache_folder=download_path.parent / "gpm_catalogs",
+        subset=subset,
+        base_url=stub.url,
+    )
+    try:
+        start = time.perf_counter()
+        gpm_download.get_catalogs()
+        urls = gpm_download.get_urls()
+        gpm_download.download_hdf(urls)
+        wall_s = time.perf_counter() - start
+        gpm_download.validate_hdf()
+        archive_path = gpm_download.process_data()
+    finally:
+        gpm_download.close()
+    return wall_s, archive_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--timesteps", type=int, default=96)
+    parser.add_argument("--tas", type=int, default=45)
+    parser.add_argument("--decode-workers", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        folder = Path(folder)
+        working_directory = os.getcwd()
+        os.chdir(folder)
+        try:
+            ta_gdf = fixtures.create_tas(args.tas)
+            Path("data/gpm/raw").mkdir(parents=True)
+            end = fixtures.utc_now()
+            end = end.replace(minute=30 * (end.minute // 30))
+            fixtures.create_gpm_files(ta_gdf, args.timesteps, end=end)
+        finally:
+            os.chdir(working_directory)
+
+        stub = StubGesDisc(folder / "data/gpm/raw").start()
+        ensure_available_days = (args.timesteps // 48) + 1
+        archives = {}
+        for mode, subset in (("full", False), ("subset", True)):
+            stub.reset()
+            download_path = folder / mode / "raw"
+            wall_s, archives[mode] = download(
+                stub, download_path, end + timedelta(minutes=30), ensure_available_days, subset
+            )
+            summary = stub.summary()
+            stored_bytes = sum(path.stat().st_size for path in download_path.glob("*.HDF5"))
+            print(
+                f"{mode:<7} {wall_s:8.2f} s {summary['requests']:6d} requests "
+                f"{summary['bytes_sent'] / 1e6:9.2f} MB transferred {stored_bytes / 1e6:9.2f} MB stored"
+            )
+        stub.stop()
+
+        with xr.open_dataset(archives["full"]) as full, xr.open_dataset(
+            archives["subset"]
+        ) as subset:
+            print(f"identical archives: {full.identical(subset)}")
+
+        for decode_workers in args.decode_workers:
+            archives["full"].unlink()
+            gpm_download = GpmDownload(
+                download_path=folder / "full" / "raw",
+                t0=end + timedelta(minutes=30),
+                ensure_available_days=ensure_available_days,
+                decode_workers=decode_workers,
+            )
+            gpm_download.close()
+            gpm_download.validate_hdf()
+            start = time.perf_counter()
+            gpm_download.process_data()
+            wall_s = time.perf_counter() - start
+            print(
+                f"cold-start decode of {len(gpm_download.filenames)} files with {decode_workers} process(es): {wall_s:8.2f} s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark of merging flood map tiles with merge_rasters_gdal: the former path (VRT written to disk, single threaded
+compression) against the in-memory VRT with the creation options of FLOOD_MAP_CREATION_OPTIONS and some variants.
+
+Run from the flash_flood_pipeline folder: python -m benchmarks.merge_rasters --tiles 20 --size 2000
+"""
+import argparse
+import tempfile
+import time
+import numpy as np
+import rasterio
+from pathlib import Path
+from rasterio.transform import from_origin
+from utils.raster_utils.merge_rasters_gdal import merge_rasters_gdal
+
+PIXEL_SIZE = 1.358452567584323166e-05
+
+
+def create_tiles(folder, nr_of_tiles, size, seed=0):
+    """
+    Create synthetic flood depth tiles (float32, nodata outside the flooded cells) next to each other.
+    """
+    rng = np.random.default_rng(seed)
+    raster_paths = []
+    for tile_index in range(nr_of_tiles):
+        depth = rng.gamma(0.5, 0.4, (1, size, size)).astype("float32")
+        depth[depth < 0.1] = -9999
+        raster_path = Path(folder) / f"tile_{tile_index}.tif"
+        with rasterio.open(
+            raster_path,
+            "w",
+            driver="GTiff",
+            width=size,
+            height=size,
+            count=1,
+            dtype="float32",
+            crs="EPSG:4326",
+            transform=from_origin(
+                33 + (tile_index % 5) * size * PIXEL_SIZE,
+                -9 - (tile_index // 5) * size * PIXEL_SIZE,
+                PIXEL_SIZE,
+                PIXEL_SIZE,
+            ),
+            nodata=-9999,
+            compress="deflate",
+        ) as dest:
+            dest.write(depth)
+        raster_paths.append(str(raster_path))
+    return raster_paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tiles", type=int, default=20)
+    parser.add_argument("--size", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        raster_paths = create_tiles(folder, args.tiles, args.size)
+        variants = {
+            "vrt on disk, 1 thread (former)": dict(
+                vrt_path=str(Path(folder) / "merged.vrt"),
+                creation_options={"NUM_THREADS": 1},
+            ),
+            "vrt in memory, 1 thread": dict(creation_options={"NUM_THREADS": 1}),
+            "vrt in memory (FLOOD_MAP_CREATION_OPTIONS)": dict(),
+            "vrt in memory, predictor 3, tiled": dict(
+                creation_options={"PREDICTOR": 3, "TILED": "YES"}
+            ),
+            "vrt in memory, zlevel 1": dict(creation_options={"ZLEVEL": 1}),
+        }
+        for name, kwargs in variants.items():
+            output_path = Path(folder) / "flood_extent.tif"
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                merge_rasters_gdal(str(output_path), raster_paths, **kwargs)
+                timings.append(time.perf_counter() - start)
+            print(
+                f"{name:<45} {min(timings):8.2f} s (best of {args.repeat}) {output_path.stat().st_size / 1e6:8.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""
+Offline benchmark of the pipeline stages with synthetic data (see benchmarks/fixtures.py) and a stub IBF API (see
+benchmarks/stub_api.py). Every case runs in a new process in its own data folder and reports the wall time, CPU time,
+peak memory and disk IO per stage (see utils/general_utils/stage_instrumentation.py).
+
+The cases vary one dimension at a time (number of TA's, number of timesteps, number of triggered scenarios), starting
+from the first value of every dimension. The stages are timed in isolation: GPM decode and sampling, COSMO processing,
+GFS subsetting (from a local stand-in of the OPeNDAP server) and sampling, scenario selection, trigger evaluation,
+region stitching, the flood map merge and the uploads. With --end-to-end, runPipeline.main is also run for every (TA's,
+timesteps) case, with the external data sources (GPM catalogs, satellite and sensor data) replaced by the synthetic
+data. The scenario selector decides which scenarios trigger, so the scenario library of these runs contains all
+scenarios of the severity orders.
+
+Run from the flash_flood_pipeline folder: python -m benchmarks.pipeline --tas 45 100 200 --timesteps 96 336 --scenarios 1 5 20
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from unittest import mock
+from mapping_tables.upstream_mapping import UPSTREAM_PLACECODES
+from benchmarks.stub_api import StubIbfApi
+
+LEAD_TIME = 3  # hours, lead time of the isolated uploads
+COSMO_FORECAST_TIMESTEPS = 120  # hourly steps of the COSMO run of the end-to-end benchmark
+GFS_STAND_IN_URL = "data/gfs/gfs_{date}_{hour}z.nc"  # GFS runs written by fixtures.create_gfs_file
+
+
+def benchmark_cases(nr_of_tas, nr_of_timesteps, nr_of_scenarios):
+    """
+    Cases which vary one dimension at a time, starting from the first value of every dimension.
+
+    Returns:
+        cases (list): list of (nr of TA's, nr of timesteps, nr of scenarios) tuples
+    """
+    base_case = (nr_of_tas[0], nr_of_timesteps[0], nr_of_scenarios[0])
+    cases = [base_case]
+    for dimension, values in enumerate([nr_of_tas, nr_of_timesteps, nr_of_scenarios]):
+        for value in values[1:]:
+            case = list(base_case)
+            case[dimension] = value
+            cases.append(tuple(case))
+    return list(dict.fromkeys(cases))
+
+
+def point_to_stub_api(api_url):
+    os.environ.update(
+        {
+            "IBF_URL": api_url,
+            "ADMIN_LOGIN": "benchmark",
+            "IBF_PASSWORD": "benchmark",
+            "SENSOR_USERNAME": "benchmark",
+            "SENSOR_PASSWORD": "benchmark",
+        }
+    )
+
+
+def run_stages(case_folder, api_url, nr_of_tas, nr_of_timesteps, nr_of_scenarios, options):
+    """
+    Create the synthetic data of a case and time the pipeline stages in isolation. Runs in a new process.
+
+    Returns:
+        report (dict): run report of the stages (see StageRecorder.report)
+    """
+    point_to_stub_api(api_url)
+    os.chdir(case_folder)
+
+    # pipeline modules read the IBF credentials when they are imported, so they are imported after pointing them to the stub API
+    import xarray as xr
+    from benchmarks import fixtures
+
+    # the scenario selector imports the upstream matrix, so the synthetic TA's are registered before it is imported
+    fixtures.register_synthetic_tas(nr_of_tas)
+
+    from compile_library import (
+        compile_depth_tiles,
+        compile_vector_assets,
+        load_manifest_for_update,
+    )
+    from data_download.download_gfs import GfsDownload
+    from data_download.download_gpm import GpmDownload
+    from data_processing.process_cosmo import process_cosmo
+    from data_upload.raster_uploader import RasterUploader
+    from data_upload.upload_scheduler import UploadScheduler
+    from runPipeline import (
+        determine_trigger_states,
+        schedule_region_uploads,
+        stitch_region_events,
+    )
+    from scenario_selection.scenario_selector import scenarioSelector
+    from settings.base import ENVIRONMENT, REGIONS, REGION_MAX_WORKERS
+    from utils.api import api_authenticate, api_post_request
+    from utils.general_utils.stage_instrumentation import (
+        get_stage_recorder,
+        record_stage,
+    )
+    from utils.raster_utils.merge_rasters_gdal import merge_rasters_gdal
+    from utils.raster_utils.ta_weight_matrix import sample_ta_means
+    from utils.vector_utils.region_statistics_index import load_region_statistics_index
+
+    fixtures.create_pipeline_folders()
+    ta_gdf = fixtures.create_tas(nr_of_tas, options["ta_size"])
+    scenarios = fixtures.scenario_names(nr_of_scenarios)
+    fixtures.create_static_data(ta_gdf, options["depth_resolution"])
+    fixtures.create_scenario_library(
+        ta_gdf, scenarios, options["assets_per_ta"], options["depth_resolution"]
+    )
+    fixtures.create_gpm_files(ta_gdf, nr_of_timesteps, rain_scale=options["rain_scale"])
+    cosmo_path = fixtures.create_cosmo_file(
+        ta_gdf, nr_of_timesteps, rain_scale=options["rain_scale"]
+    )
+    forcing = fixtures.create_forcing(
+        ta_gdf["placeCode"], nr_of_timesteps, rain_scale=options["rain_scale"]
+    )
+
+    # every TA is triggered, the scenarios are divided over the TA's
+    region_events = {region_key: {} for region_key in REGIONS}
+    for ta_index, place_code in enumerate(ta_gdf["placeCode"]):
+        region_events[fixtures.region_of_ta(place_code, ta_index)][place_code] = scenarios[
+            ta_index % len(scenarios)
+        ]
+    region_events = {
+        region_key: events for region_key, events in region_events.items() if events
+    }
+
+    stage_recorder = get_stage_recorder()
+
+    gpm_download = GpmDownload(download_path=Path("data/gpm/raw"))
+    gpm_download.validate_hdf()
+    with record_stage("gpm decode"):
+        gpm_archive_path = gpm_download.process_data()
+    with record_stage("gpm sampling"):
+        with xr.open_dataset(gpm_archive_path, mask_and_scale=False) as gpm_archive:
+            sample_ta_means(gpm_archive["gpm_precipitation"].load(), ta_gdf)
+
+    with record_stage("cosmo processing"):
+        process_cosmo(ta_gdf=ta_gdf, cosmo_path=cosmo_path)
+
+    gfs_download = GfsDownload(
+        ta_gdf=ta_gdf, date=datetime.datetime.now(), url_template=GFS_STAND_IN_URL
+    )
+    fixtures.create_gfs_file(ta_gdf, gfs_download.cycle, rain_scale=options["rain_scale"])
+    with record_stage("gfs download"):
+        gfs_dataset = gfs_download.retrieve()
+    with record_stage("gfs sampling"):
+        gfs_download.sample(gfs_dataset)
+
+    with record_stage("scenario selection"):
+        scenarioSelector(gfs_data=forcing).select_scenarios()
+
+    with record_stage("region statistics index"):
+        load_region_statistics_index()
+    with record_stage("trigger evaluation"):
+        determine_trigger_states(region_events)
+
+    if options["compiled_library"]:
+        with record_stage("compile library"):
+            manifest = load_manifest_for_update()
+            compile_vector_assets(ta_gdf, manifest)
+            compile_depth_tiles(ta_gdf, manifest)
+
+    with record_stage("region stitching"), ProcessPoolExecutor(
+        max_workers=min(len(region_events), REGION_MAX_WORKERS)
+    ) as executor:
+        region_datasets = dict(
+            zip(
+                region_events,
+                executor.map(
+                    stitch_region_events,
+                    repeat(ta_gdf),
+                    region_events.values(),
+                    region_events,
+                ),
+            )
+        )
+    for _, _, stage_records in region_datasets.values():
+        stage_recorder.add_records(stage_records, parent="region stitching")
+
+    flood_extent_path = (
+        f"data/{ENVIRONMENT}/flood_extents/flood_extent_{LEAD_TIME}-hour_MWI.tif"
+    )
+    with record_stage(f"merge flood map {LEAD_TIME}-hour"):
+        merge_rasters_gdal(
+            flood_extent_path,
+            [
+                raster_path
+                for _, raster_paths, _ in region_datasets.values()
+                for raster_path in raster_paths
+            ]
+            + [rf"data/static_data/{ENVIRONMENT}/nodata_ibf.tif"],
+        )
+
+    with record_stage("uploads"):
+        token = api_authenticate()
+        date = datetime.datetime.now(tz=datetime.timezone.utc)
+        upload_scheduler = UploadScheduler()
+        for region_key, (vector_datasets, _, _) in region_datasets.items():
+            schedule_region_uploads(
+                token=token,
+                vector_datasets=vector_datasets,
+                lead_time=LEAD_TIME,
+                region_key=region_key,
+                date=date,
+                upload_scheduler=upload_scheduler,
+            )
+        raster_uploader = RasterUploader(raster_files=[flood_extent_path], token=token)
+        upload_scheduler.submit(
+            f"{LEAD_TIME}-hour: upload raster file waterdepth",
+            raster_uploader.upload_raster_file,
+        )
+        upload_scheduler.submit(
+            "close events",
+            api_post_request,
+            token=token,
+            path="events/process?noNotifications=true",
+            body={
+                "countryCodeISO3": "MWI",
+                "disasterType": "flash-floods",
+                "date": date.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            },
+            depends_on=upload_scheduler.phases(),
+        )
+        upload_scheduler.wait()
+
+    return stage_recorder.report()
+
+
+def run_end_to_end(case_folder, api_url, nr_of_tas, nr_of_timesteps, options):
+    """
+    Create the synthetic data of a case and run runPipeline.main, with the external data sources (GPM catalogs,
+    satellite and sensor data) replaced by the synthetic data. Runs in a new process.
+
+    Returns:
+        report (dict): run report of the pipeline run (see StageRecorder.report)
+    """
+    point_to_stub_api(api_url)
+    os.chdir(case_folder)
+
+    from benchmarks import fixtures
+
+    # the scenario selector imports the upstream matrix, so the synthetic TA's are registered before it is imported
+    fixtures.register_synthetic_tas(nr_of_tas)
+
+    import pandas as pd
+    import runPipeline
+    from data_download.download_gpm import GpmDownload
+    from utils.general_utils.stage_instrumentation import get_stage_recorder
+
+    fixtures.create_pipeline_folders()
+    ta_gdf = fixtures.create_tas(nr_of_tas, options["ta_size"])
+    fixtures.create_static_data(ta_gdf, options["depth_resolution"])
+    fixtures.create_scenario_library(
+        ta_gdf,
+        fixtures.scenario_names(),
+        options["assets_per_ta"],
+        options["depth_resolution"],
+    )
+    fixtures.create_gpm_files(ta_gdf, nr_of_timesteps, rain_scale=options["rain_scale"])
+    fixtures.create_cosmo_file(
+        ta_gdf, COSMO_FORECAST_TIMESTEPS, rain_scale=options["rain_scale"]
+    )
+
+    with mock.patch.object(
+        GpmDownload, "get_catalogs", lambda self: {}
+    ), mock.patch.object(GpmDownload, "get_urls", lambda self: {}), mock.patch.multiple(
+        runPipeline,
+        gather_satellite_data=lambda: None,
+        process_waterlevel_sensor_data=lambda: ({}, {}, {}),
+        process_karonga_rainfall_sensor_data=lambda start_date: None,
+        process_blantyre_rainfall_sensor_data=lambda: pd.DataFrame(),
+        blantyre_raingauge_idw=lambda **kwargs: pd.DataFrame(),
+    ):
+        runPipeline.main()
+
+    return get_stage_recorder().report()
+
+
+def print_report(title, report):
+    print(f"\n{title}: {report['wall_s']:.2f} s wall, peak memory {report['peak_rss_mb']} MB")
+    print(
+        f"{'stage':<50} {'status':<7} {'wall s':>8} {'cpu s':>8} {'peak MB':>9} {'+peak MB':>9} {'read MB':>9} {'write MB':>9}"
+    )
+    for record in report["stages"]:
+        name = record["name"] if record["parent"] is None else f"  {record['name']}"
+        io = (
+            ""
+            if record["read_bytes"] is None
+            else f"{record['read_bytes'] / 1e6:9.1f} {record['write_bytes'] / 1e6:9.1f}"
+        )
+        print(
+            f"{name[:50]:<50} {record['status']:<7} {record['wall_s']:8.2f} {record['cpu_s']:8.2f} {record['peak_rss_so_far_mb'] or 0:9.0f} {record['peak_rss_delta_mb'] or 0:9.0f} {io}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tas", type=int, nargs="+", default=[45, 100, 200])
+    parser.add_argument("--timesteps", type=int, nargs="+", default=[96, 336])
+    parser.add_argument("--scenarios", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--assets-per-ta", type=int, default=50)
+    parser.add_argument("--ta-size", type=float, default=0.01, help="degrees")
+    parser.add_argument("--depth-resolution", type=float, default=1e-4, help="degrees")
+    parser.add_argument("--rain-scale", type=float, default=2, help="mm/hr")
+    parser.add_argument(
+        "--compiled-library",
+        action="store_true",
+        help="compile the scenario library before stitching",
+    )
+    parser.add_argument("--end-to-end", action="store_true", help="also run runPipeline.main")
+    parser.add_argument(
+        "--api-latency", type=float, default=0.0, help="seconds per request of the stub API"
+    )
+    parser.add_argument("--workdir", help="folder for the synthetic data (kept), defaults to a temporary folder")
+    parser.add_argument(
+        "--output",
+        default=f"benchmark_pipeline_{datetime.datetime.now().strftime('%Y-%m-%d_%H%M%S')}.json",
+        help="path of the JSON report",
+    )
+    args = parser.parse_args()
+
+    if min(args.tas) < len(UPSTREAM_PLACECODES):
+        parser.error(
+            f"the scenario selector needs all {len(UPSTREAM_PLACECODES)} TA's of UPSTREAM_MAP, use --tas >= {len(UPSTREAM_PLACECODES)}"
+        )
+    options = {
+        "assets_per_ta": args.assets_per_ta,
+        "ta_size": args.ta_size,
+        "depth_resolution": args.depth_resolution,
+        "rain_scale": args.rain_scale,
+        "compiled_library": args.compiled_library,
+    }
+
+    jobs = [
+        ("stages", run_stages, case)
+        for case in benchmark_cases(args.tas, args.timesteps, args.scenarios)
+    ]
+    if args.end_to_end:
+        jobs += [
+            ("end-to-end", run_end_to_end, case)
+            for case in dict.fromkeys(
+                case[:2] for case in benchmark_cases(args.tas, args.timesteps, [None])
+            )
+        ]
+
+    stub_api = StubIbfApi(latency=args.api_latency).start()
+    results = []
+    with tempfile.TemporaryDirectory() as temporary_folder:
+        workdir = Path(args.workdir or temporary_folder).resolve()
+        for mode, run_case, case in jobs:
+            case_folder = workdir / f"{mode}_{'_'.join(str(value) for value in case)}"
+            case_folder.mkdir(parents=True, exist_ok=True)
+            stub_api.reset()
+
+            result = {
+                "mode": mode,
+                "nr_of_tas": case[0],
+                "nr_of_timesteps": case[1],
+                "nr_of_scenarios": case[2] if len(case) > 2 else None,
+                "options": options,
+            }
+            with ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                try:
+                    result["report"] = executor.submit(
+                        run_case, str(case_folder), stub_api.url, *case, options
+                    ).result()
+                except Exception as error:
+                    result["error"] = repr(error)
+            result["api"] = stub_api.summary()
+            results.append(result)
+
+            title = f"{mode}: {case[0]} TA's, {case[1]} timesteps" + (
+                f", {case[2]} scenarios" if len(case) > 2 else ""
+            )
+            if "error" in result:
+                print(f"\n{title}: failed with {result['error']}")
+            else:
+                print_report(title, result["report"])
+    stub_api.stop()
+
+    with open(args.output, "w") as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Stub of the IBF API for the pipeline benchmarks: accepts every POST request (login returns a token), optionally after a
+fixed latency, and counts the requests and bytes received per endpoint and the most requests in flight at the same
+time. Optionally keeps the bodies (e.g., to check
+which data the portal would show, see tests/test_upload_cache.py).
+"""
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubIbfApi:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, record_bodies=False):
+        """
+        Args:
+            host (str): host to listen on
+            port (int): port to listen on, 0 for a free port
+            latency (float): seconds to wait before answering a request (e.g., the processing time of the IBF API)
+            record_bodies (bool): keep the (endpoint, body) of every JSON request in bodies
+        """
+        self.latency = latency
+        self.record_bodies = record_bodies
+        self.bodies = []
+        self.requests = Counter()
+        self.bytes_received = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.request_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def request_handler(self):
+        stub = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = self.read_body()
+                endpoint = self.path.split("?")[0].lstrip("/")
+                with stub.lock:
+                    stub.requests[endpoint] += 1
+                    stub.bytes_received[endpoint] += len(body)
+                    is_json = self.headers.get("Content-Type", "").startswith(
+                        "application/json"
+                    )
+                    if stub.record_bodies and is_json and endpoint != "user/login":
+                        stub.bodies.append((endpoint, json.loads(body)))
+
+                if endpoint == "user/login":
+                    self.send_json(200, {"user": {"token": "benchmark"}})
+                    return
+
+                with stub.lock:
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    time.sleep(stub.latency)
+                    self.send_json(201, {})
+                finally:
+                    with stub.lock:
+                        stub.in_flight -= 1
+
+            def read_body(self):
+                if "Content-Length" in self.headers:
+                    return self.rfile.read(int(self.headers["Content-Length"]))
+
+                # chunked transfer encoding
+                body = b""
+                while True:
+                    chunk_size = int(self.rfile.readline().strip(), 16)
+                    body += self.rfile.read(chunk_size)
+                    self.rfile.readline()
+                    if chunk_size == 0:
+                        return body
+
+            def send_json(self, status_code, body):
+                content = json.dumps(body).encode()
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+        return RequestHandler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset(self):
+        with self.lock:
+            self.requests.clear()
+            self.bytes_received.clear()
+            self.bodies.clear()
+            self.max_in_flight = self.in_flight
+
+    def summary(self):
+        with self.lock:
+            return {
+                "requests": sum(self.requests.values()),
+                "bytes_received": sum(self.bytes_received.values()),
+                "max_in_flight": self.max_in_flight,
+                "endpoints": {
+                    endpoint: {
+                        "requests": self.requests[endpoint],
+                        "bytes_received": self.bytes_received[endpoint],
+                    }
+                    for endpoint in sorted(self.requests)
+                },
+            }
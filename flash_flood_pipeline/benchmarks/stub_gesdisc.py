@@ -0,0 +1,157 @@
+"""
+Stub of the GES DISC server for the GPM download benchmark: serves the IMERG HDF5 files of a local folder (see
+fixtures.create_gpm_files) as daily hyrax catalogs, as full files (data/...) and as subsets selected with a DAP4
+constraint expression (opendap/hyrax/....dap.nc4?dap4.ce=...), and counts the requests and bytes sent per kind.
+"""
+import io
+import re
+import threading
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+import h5py
+import numpy as np
+from data_download.download_gpm import hdf5_timestamp
+
+COLLECTION = "GPM_L3/GPM_3IMERGHHL.07"
+CONSTRAINT_PATTERN = re.compile(r"^/Grid/(\w+)((?:\[\d+:\d+\])*)$")
+
+
+def subset_hdf5(source_path, constraint):
+    """
+    Select the variables of an IMERG HDF5 file with a DAP4 constraint expression (e.g.,
+    /Grid/time;/Grid/lon[2110:2179]) and write them, with their attributes, to an in-memory HDF5 file. String attributes
+    are written as str, like the netCDF4 responses of hyrax.
+
+    Returns:
+        content (bytes): the subset HDF5 file
+    """
+    output = io.BytesIO()
+    with h5py.File(source_path, "r") as source, h5py.File(output, "w") as subset:
+        grid = subset.create_group("Grid")
+        for projection in constraint.split(";"):
+            name, ranges = CONSTRAINT_PATTERN.match(projection).groups()
+            index = tuple(
+                slice(int(start), int(stop) + 1)
+                for start, stop in re.findall(r"\[(\d+):(\d+)\]", ranges)
+            )
+            variable = grid.create_dataset(name, data=source["Grid"][name][index])
+            for key, value in source["Grid"][name].attrs.items():
+                variable.attrs[key] = (
+                    value.decode() if isinstance(value, (bytes, np.bytes_)) else value
+                )
+    return output.getvalue()
+
+
+class StubGesDisc:
+    def __init__(self, source_folder, host="127.0.0.1", port=0):
+        """
+        Args:
+            source_folder (Path): folder with the IMERG HDF5 files to serve
+            host (str): host to listen on
+            port (int): port to listen on, 0 for a free port
+        """
+        self.source_folder = Path(source_folder)
+        self.requests = Counter()
+        self.bytes_sent = Counter()
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.request_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def catalog(self, year, day_of_year):
+        """
+        Hyrax catalog of a day: three service elements followed by the dataset with the HDF5 files of that day.
+        """
+        date = datetime.strptime(f"{year}{day_of_year}", "%Y%j")
+        folder = f"{COLLECTION}/{year}/{day_of_year}"
+        datasets = "".join(
+            f'<dataset name="{path.name}" ID="/opendap/hyrax/{folder}/{path.name}"/>'
+            for path in sorted(self.source_folder.glob("*.HDF5"))
+            if hdf5_timestamp(path).date() == date.date()
+        )
+        return (
+            "<catalog>"
+            '<service name="dap"/><service name="file"/><service name="wms"/>'
+            f'<dataset name="/{folder}" ID="/opendap/hyrax/{folder}/">{datasets}</dataset>'
+            "</catalog>"
+        ).encode()
+
+    def request_handler(self):
+        stub = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                path = url.path.replace("//", "/")
+                name = path.split("/")[-1]
+
+                if name == "catalog.xml":
+                    year, day_of_year = path.split("/")[-3:-1]
+                    self.send_content("catalog", stub.catalog(year, day_of_year))
+                elif path.startswith("/data/") and name.endswith(".HDF5"):
+                    source_path = stub.source_folder / name
+                    if not source_path.exists():
+                        self.send_content("missing", b"", status_code=404)
+                        return
+                    self.send_content("full", source_path.read_bytes())
+                elif path.startswith("/opendap/hyrax/") and name.endswith(".dap.nc4"):
+                    source_path = stub.source_folder / name.removesuffix(".dap.nc4")
+                    constraint = unquote(url.query.removeprefix("dap4.ce="))
+                    if not source_path.exists():
+                        self.send_content("missing", b"", status_code=404)
+                        return
+                    self.send_content("subset", subset_hdf5(source_path, constraint))
+                else:
+                    self.send_content("missing", b"", status_code=404)
+
+            def send_content(self, kind, content, status_code=200):
+                with stub.lock:
+                    stub.requests[kind] += 1
+                    stub.bytes_sent[kind] += len(content)
+                self.send_response(status_code)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+        return RequestHandler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset(self):
+        with self.lock:
+            self.requests.clear()
+            self.bytes_sent.clear()
+
+    def summary(self):
+        with self.lock:
+            return {
+                "requests": sum(self.requests.values()),
+                "bytes_sent": sum(self.bytes_sent.values()),
+                "kinds": {
+                    kind: {
+                        "requests": self.requests[kind],
+                        "bytes_sent": self.bytes_sent[kind],
+                    }
+                    for kind in sorted(self.requests)
+                },
+            }
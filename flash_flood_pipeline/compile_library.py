@@ -0,0 +1,285 @@
+import argparse
+import json
+import logging
+import shutil
+import geopandas as gpd
+import pandas as pd
+import rasterio
+import rasterio.mask
+import rasterio.shutil
+from pathlib import Path
+from rasterio.io import MemoryFile
+from settings.base import ASSET_TYPES, COMPILED_LIBRARY_FOLDER, DATA_FOLDER
+from logger_config.configure_logger import configure_logger
+from utils.vector_utils.compiled_library import (
+    DEPTH_ASSET_TYPE,
+    MANIFEST_FILE,
+    REGIONS_FILE,
+    asset_partition_path,
+    depth_tile_path,
+    source_file_name,
+)
+from utils.vector_utils.region_statistics_index import build_region_statistics_index
+
+logger = logging.getLogger(__name__)
+
+VECTOR_ASSET_TYPES = [
+    asset_type for asset_type in ASSET_TYPES if asset_type != "region_statistics"
+]
+
+
+def partition_assets_by_ta(assets, ta_gdf, include_geometry=False):
+    """
+    Split the assets of a scenario by TA. An asset is part of every TA it intersects (e.g., roads crossing the border of
+    two TA's), equal to clipping the assets on the TA geometry.
+
+    Args:
+        assets (gpd.GeoDataFrame): assets of a scenario with id, vulnerability and geometry
+        ta_gdf (gpd.GeoDataFrame): dataframe with all TA's (placeCode and geometry)
+        include_geometry (bool): keep the geometry of the assets, clipped on the TA
+
+    Returns:
+        ta_assets (dict): dictionary with placeCode as key and dataframe with the assets within the TA as value
+    """
+    ta_gdf = ta_gdf.to_crs(assets.crs)[["placeCode", "geometry"]]
+    joined = gpd.sjoin(
+        assets[["id", "vulnerability", "geometry"]],
+        ta_gdf,
+        how="inner",
+        predicate="intersects",
+    )
+
+    columns = ["id", "vulnerability"]
+    if include_geometry:
+        joined["geometry"] = joined.geometry.intersection(
+            gpd.GeoSeries(ta_gdf.geometry.loc[joined["index_right"]].values, index=joined.index)
+        )
+        columns += ["geometry"]
+
+    return {
+        place_code: ta_assets[columns].reset_index(drop=True)
+        for place_code, ta_assets in joined.groupby("placeCode", sort=True)
+    }
+
+
+def load_manifest_for_update(library_folder=COMPILED_LIBRARY_FOLDER, force=False):
+    """
+    Load the manifest of the compiled library to update it. A new manifest is started when the library has not been
+    compiled yet, when regions.gpkg changed after compiling or when force is set.
+
+    Args:
+        library_folder (Path): Path to the compiled scenario library
+        force (bool): start a new manifest (recompile all scenarios)
+
+    Returns:
+        manifest (dict): manifest of the compiled library
+    """
+    manifest_path = Path(library_folder) / MANIFEST_FILE
+    regions_mtime = REGIONS_FILE.stat().st_mtime if REGIONS_FILE.exists() else 0
+
+    manifest = {"scenarios": {}}
+    if manifest_path.exists() and not force:
+        with open(manifest_path, "r") as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("regions_mtime", 0) < regions_mtime:
+            manifest = {"scenarios": {}}
+    manifest["regions_mtime"] = regions_mtime
+    return manifest
+
+
+def write_manifest(manifest, library_folder=COMPILED_LIBRARY_FOLDER):
+    library_folder = Path(library_folder)
+    library_folder.mkdir(parents=True, exist_ok=True)
+    with open(library_folder / MANIFEST_FILE, "w") as manifest_file:
+        json.dump(manifest, manifest_file)
+
+
+def is_compiled(manifest, scenario, asset_type, source_path, **options):
+    """
+    Check whether an asset type of a scenario is compiled from the current source file (with the same options).
+    """
+    entry = manifest["scenarios"].get(scenario, {}).get(asset_type)
+    return (
+        entry is not None
+        and entry["source_mtime"] >= source_path.stat().st_mtime
+        and all(entry.get(key) == value for key, value in options.items())
+    )
+
+
+def compile_vector_assets(
+    ta_gdf,
+    manifest,
+    data_folder=DATA_FOLDER,
+    library_folder=COMPILED_LIBRARY_FOLDER,
+    include_geometry=False,
+):
+    """
+    Compile the vector assets (vulnerable roads, schools, etc.) of all scenarios in the scenario library into one file per
+    (scenario, TA, asset type), so the pipeline can combine assets of different scenarios without clipping. The number
+    of assets per TA is added to the manifest. Scenarios which did not change since the last compilation are skipped.
+
+    Args:
+        ta_gdf (gpd.GeoDataFrame): dataframe with all TA's (placeCode and geometry)
+        manifest (dict): manifest of the compiled library (see load_manifest_for_update), updated in place
+        data_folder (Path): Path to folder where all scenarios are stored (one folder per scenario, e.g. 100mm_24hr)
+        library_folder (Path): Path to the compiled scenario library
+        include_geometry (bool): store the geometry of the assets (not needed for uploading exposure to the IBF portal)
+    """
+    scenario_folders = sorted(
+        folder for folder in Path(data_folder).iterdir() if folder.is_dir()
+    )
+    for scenario_folder in scenario_folders:
+        scenario = scenario_folder.name
+        for asset_type in VECTOR_ASSET_TYPES:
+            source_path = scenario_folder / source_file_name(asset_type)
+            if not source_path.exists():
+                continue
+
+            if is_compiled(
+                manifest,
+                scenario,
+                asset_type,
+                source_path,
+                include_geometry=include_geometry,
+            ):
+                continue
+
+            ta_assets = partition_assets_by_ta(
+                gpd.read_file(source_path), ta_gdf, include_geometry
+            )
+            for place_code in ta_gdf["placeCode"]:
+                asset_partition_path(
+                    library_folder, scenario, place_code, asset_type
+                ).unlink(missing_ok=True)
+
+            for place_code, assets in ta_assets.items():
+                partition_path = asset_partition_path(
+                    library_folder, scenario, place_code, asset_type
+                )
+                partition_path.parent.mkdir(parents=True, exist_ok=True)
+                if include_geometry:
+                    gpd.GeoDataFrame(assets).to_parquet(partition_path)
+                else:
+                    pd.DataFrame(assets).to_parquet(partition_path, index=False)
+
+            manifest["scenarios"].setdefault(scenario, {})[asset_type] = {
+                "source_mtime": source_path.stat().st_mtime,
+                "include_geometry": include_geometry,
+                "feature_counts": {
+                    place_code: len(assets) for place_code, assets in ta_assets.items()
+                },
+            }
+            logger.info(
+                f"Compiled {asset_type} of {scenario}: {sum(len(assets) for assets in ta_assets.values())} assets"
+            )
+
+        # write the manifest after every scenario, so an interrupted compilation can be resumed
+        write_manifest(manifest, library_folder)
+
+
+def compile_depth_tiles(
+    ta_gdf, manifest, data_folder=DATA_FOLDER, library_folder=COMPILED_LIBRARY_FOLDER
+):
+    """
+    Clip the country wide flood map (depth.tif) of all scenarios in the scenario library to one Cloud Optimized GeoTIFF
+    per (scenario, TA), masked outside the TA. The pipeline builds the flood map of an event from these tiles without
+    clipping. The TA's with a tile are added to the manifest. Scenarios which did not change since the last compilation
+    are skipped.
+
+    Args:
+        ta_gdf (gpd.GeoDataFrame): dataframe with all TA's (placeCode and geometry)
+        manifest (dict): manifest of the compiled library (see load_manifest_for_update), updated in place
+        data_folder (Path): Path to folder where all scenarios are stored (one folder per scenario, e.g. 100mm_24hr)
+        library_folder (Path): Path to the compiled scenario library
+    """
+    scenario_folders = sorted(
+        folder for folder in Path(data_folder).iterdir() if folder.is_dir()
+    )
+    for scenario_folder in scenario_folders:
+        scenario = scenario_folder.name
+        source_path = scenario_folder / source_file_name(DEPTH_ASSET_TYPE)
+        if not source_path.exists() or is_compiled(
+            manifest, scenario, DEPTH_ASSET_TYPE, source_path
+        ):
+            continue
+
+        tiles = []
+        with rasterio.open(source_path) as src:
+            ta_gdf_raster_crs = ta_gdf.to_crs(src.crs)
+            for place_code, geometry in zip(
+                ta_gdf_raster_crs["placeCode"], ta_gdf_raster_crs.geometry
+            ):
+                tile_path = depth_tile_path(library_folder, scenario, place_code)
+                tile_path.unlink(missing_ok=True)
+                try:
+                    out_image, out_transform = rasterio.mask.mask(
+                        src, [geometry], crop=True
+                    )
+                except ValueError:
+                    # TA does not overlap the flood map
+                    continue
+
+                out_meta = src.meta.copy()
+                out_meta.update(
+                    {
+                        "driver": "GTiff",
+                        "height": out_image.shape[1],
+                        "width": out_image.shape[2],
+                        "transform": out_transform,
+                    }
+                )
+                tile_path.parent.mkdir(parents=True, exist_ok=True)
+                with MemoryFile() as memfile:
+                    with memfile.open(**out_meta) as tile:
+                        tile.write(out_image)
+                        rasterio.shutil.copy(
+                            tile, tile_path, driver="COG", compress="DEFLATE"
+                        )
+                tiles.append(place_code)
+
+        manifest["scenarios"].setdefault(scenario, {})[DEPTH_ASSET_TYPE] = {
+            "source_mtime": source_path.stat().st_mtime,
+            "tiles": tiles,
+        }
+        logger.info(f"Compiled {DEPTH_ASSET_TYPE} of {scenario}: {len(tiles)} tiles")
+        write_manifest(manifest, library_folder)
+
+
+def remove_obsolete_scenarios(
+    manifest, data_folder=DATA_FOLDER, library_folder=COMPILED_LIBRARY_FOLDER
+):
+    """
+    Remove scenarios which are no longer part of the scenario library from the compiled library and the manifest.
+    """
+    scenarios = {folder.name for folder in Path(data_folder).iterdir() if folder.is_dir()}
+    for scenario in set(manifest["scenarios"]) - scenarios:
+        shutil.rmtree(Path(library_folder) / scenario, ignore_errors=True)
+        del manifest["scenarios"][scenario]
+    write_manifest(manifest, library_folder)
+
+
+def main():
+    """Compile the scenario library for the pipeline (region statistics index, vector assets and flood map tiles per TA)."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        "--include-geometry",
+        action="store_true",
+        help="store the geometry of the assets in the compiled library",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="recompile all scenarios"
+    )
+    args = parser.parse_args()
+
+    configure_logger()
+    ta_gdf = gpd.read_file(REGIONS_FILE)
+
+    build_region_statistics_index(DATA_FOLDER)
+    manifest = load_manifest_for_update(force=args.force)
+    compile_vector_assets(ta_gdf, manifest, include_geometry=args.include_geometry)
+    compile_depth_tiles(ta_gdf, manifest)
+    remove_obsolete_scenarios(manifest)
+
+
+if __name__ == "__main__":
+    main()
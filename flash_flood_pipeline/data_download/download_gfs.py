@@ -9,8 +9,8 @@ import netCDF4 as nc
 from pathlib import Path
 import xarray as xr
 import rioxarray
-import xvec
-from rasterio.enums import Resampling
+from settings.base import CACHE_FOLDER, GFS_CACHE_DAYS, GFS_OPENDAP_URL
+from utils.raster_utils.ta_weight_matrix import sample_ta_means
 from utils.general_utils.round_to_nearest_hour import (
     round_to_nearest_hour,
 )
@@ -24,29 +24,54 @@ warnings.filterwarnings("ignore")
 logger = logging.getLogger(__name__)
 
 
-def convert_to_xr(ds, bbox=None, parameter_to_obtain="apcpsfc"):
-    xr_dataset = xr.open_dataset(xr.backends.NetCDF4DataStore(ds))
-
-    xr_dataset = xr_dataset.rio.set_spatial_dims("lat", "lon")
-    xr_dataset = xr_dataset.rio.write_crs("epsg:4326")
-
-    vars_to_drop = [
-        x
-        for x in xr_dataset.variables
-        if x not in ["time", "lat", "lon", "spatial_ref", parameter_to_obtain]
-    ]
+def subset_gfs(ds, bbox, parameter_to_obtain="apcpsfc"):
+    """
+    Read one parameter of a GFS run inside a bounding box. Only the coordinates and the index range of the bounding box
+    are requested from the OPeNDAP server (or read from a local NetCDF file).
+
+    Args:
+        ds (nc.Dataset): opened GFS run
+        bbox (tuple): (lon min, lat min, lon max, lat max) of the bounding box
+        parameter_to_obtain (str): name of the GFS parameter
+
+    Returns:
+        xr_dataset (xr.Dataset): the parameter with time, y and x coordinates (CF decoded)
+    """
+    ds.set_auto_maskandscale(False)
+    lats = ds.variables["lat"][:]
+    lons = ds.variables["lon"][:]
+    lat_index = np.flatnonzero((lats >= bbox[1]) & (lats <= bbox[3]))
+    lon_index = np.flatnonzero((lons >= bbox[0]) & (lons <= bbox[2]))
+    index = {
+        "time": slice(None),
+        "lat": slice(lat_index[0], lat_index[-1] + 1),
+        "lon": slice(lon_index[0], lon_index[-1] + 1),
+    }
+
+    variables = {}
+    for name in ["time", "lat", "lon", parameter_to_obtain]:
+        variable = ds.variables[name]
+        variables[name] = xr.Variable(
+            variable.dimensions,
+            variable[tuple(index[dimension] for dimension in variable.dimensions)],
+            {attribute: variable.getncattr(attribute) for attribute in variable.ncattrs()},
+        )
 
-    xr_dataset = xr_dataset.drop_vars(vars_to_drop)
+    xr_dataset = xr.decode_cf(xr.Dataset(variables))
     xr_dataset = xr_dataset.rename({"lat": "y", "lon": "x"})
-
-    if bbox:
-        xr_dataset = xr_dataset.rio.clip_box(*bbox)
-
+    xr_dataset = xr_dataset.rio.set_spatial_dims("x", "y")
+    xr_dataset = xr_dataset.rio.write_crs("epsg:4326")
     return xr_dataset
 
 
 class GfsDownload:
-    def __init__(self, ta_gdf, date):
+    def __init__(
+        self,
+        ta_gdf,
+        date,
+        url_template=GFS_OPENDAP_URL,
+        cache_folder=CACHE_FOLDER / "gfs",
+    ):
         self.malawi_bbox = (
             31.0000000000000000,  # lon min
             -19.0000000000000000,  # lat min
@@ -56,6 +81,8 @@ class GfsDownload:
         self.ta_shapes = ta_gdf
         self.date = date
         self.gfs_parameter_to_obtain = "apcpsfc"
+        self.url_template = url_template
+        self.cache_folder = Path(cache_folder)
 
     @property
     def forecast_start(self):
@@ -76,54 +103,70 @@ class GfsDownload:
 
         return forecast_start_hour
 
+    @property
+    def cycle(self):
+        """Issue time of the GFS run used (e.g., 2024-01-01 06:00 for the 06z run)"""
+        return datetime.strptime(
+            f"{self.forecast_start.strftime('%Y%m%d')}{self.forecast_start_hour}",
+            "%Y%m%d%H",
+        )
+
+    @property
+    def cache_path(self):
+        return self.cache_folder / f"gfs_{self.cycle.strftime('%Y%m%d_%H')}z.nc"
+
     def retrieve(self):
-        logger.info("GfsDownload - Retrieving GFS-precipitation data")
+        """
+        Retrieve the precipitation of the GFS run inside the Malawi bounding box. The subset of each run is requested
+        once and stored in the cache folder, later runs within the same cycle (e.g., the gap fill) read it from there.
+
+        Returns:
+            xr_dataset (xr.Dataset): accumulated surface total precipitation [kg/m^2] with time, y and x coordinates
+        """
+        if self.cache_path.exists():
+            logger.info(f"GfsDownload - Reading GFS-precipitation data from {self.cache_path}")
+            with xr.open_dataset(self.cache_path, decode_coords="all") as xr_dataset:
+                return xr_dataset.load()
 
+        logger.info("GfsDownload - Retrieving GFS-precipitation data")
         nc_dataset_forecast = nc.Dataset(
-            "https://nomads.ncep.noaa.gov/dods/gfs_0p25/gfs{}/gfs_0p25_{}z".format(
-                self.forecast_start.strftime("%Y%m%d"), self.forecast_start_hour
+            self.url_template.format(
+                date=self.forecast_start.strftime("%Y%m%d"),
+                hour=self.forecast_start_hour,
             )
         )
-        # surface total precipitation [kg/m^2]
+        try:
+            xr_dataset = subset_gfs(
+                ds=nc_dataset_forecast,
+                bbox=self.malawi_bbox,
+                parameter_to_obtain=self.gfs_parameter_to_obtain,
+            )
+        finally:
+            nc_dataset_forecast.close()
 
-        xr_dataset = convert_to_xr(
-            ds=nc_dataset_forecast,
-            bbox=self.malawi_bbox,
-            parameter_to_obtain=self.gfs_parameter_to_obtain,
-        )
+        self.cache(xr_dataset)
+        return xr_dataset
 
-        upscale_factor = 8
+    def cache(self, xr_dataset):
+        """
+        Store the subset of the GFS run in the cache folder and remove runs older than GFS_CACHE_DAYS.
 
-        new_width = xr_dataset.rio.width * upscale_factor
-        new_height = xr_dataset.rio.height * upscale_factor
-        xr_dataset_upsampled = xr_dataset.rio.reproject(
-            xr_dataset.rio.crs,
-            shape=(new_height, new_width),
-            resampling=Resampling.bilinear,
-        )
-        return xr_dataset_upsampled
+        Args:
+            xr_dataset (xr.Dataset): subset of the GFS run (see subset_gfs)
+        """
+        self.cache_folder.mkdir(parents=True, exist_ok=True)
+        oldest_cycle = (self.cycle - timedelta(days=GFS_CACHE_DAYS)).strftime("%Y%m%d_%H")
+        for cache_path in self.cache_folder.glob("gfs_*z.nc"):
+            if cache_path.stem[len("gfs_") : -len("z")] < oldest_cycle:
+                cache_path.unlink()
 
-    def sample(self, dataset):
-        ta_shapes_4326 = self.ta_shapes.to_crs("epsg:4326")
-
-        sampled = dataset.xvec.zonal_stats(
-            ta_shapes_4326.geometry,
-            x_coords="x",
-            y_coords="y",
-            stats=np.nanmean,
-            all_touched=False,
-        )
-        gfs_rainfall = sampled.xvec.to_geodataframe().reset_index(drop=False)
+        temporary_path = self.cache_path.with_suffix(".nc.tmp")
+        xr_dataset.to_netcdf(temporary_path)
+        temporary_path.replace(self.cache_path)
 
-        gfs_rainfall["ta"] = gfs_rainfall.apply(
-            lambda row: ta_shapes_4326.loc[
-                ta_shapes_4326.geometry == row.geometry, "placeCode"
-            ].iloc[0],
-            axis=1,
-        )
-        gfs_rainfall = gfs_rainfall.reset_index(drop=True)
-        gfs_rainfall_pvt = gfs_rainfall.pivot(
-            index="time", columns="ta", values=self.gfs_parameter_to_obtain
+    def sample(self, dataset):
+        gfs_rainfall_pvt = sample_ta_means(
+            dataset[self.gfs_parameter_to_obtain], self.ta_shapes
         )
         gfs_rainfall_pvt = gfs_rainfall_pvt.diff()
         gfs_rainfall_pvt = gfs_rainfall_pvt.fillna(0)
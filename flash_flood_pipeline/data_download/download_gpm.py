@@ -1,22 +1,44 @@
 import os
 import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta, time
+from urllib.parse import quote
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 import rasterio
 import h5py
 import pandas as pd
 import xarray as xr
 from pathlib import Path
 import rioxarray
-from concurrent.futures import ThreadPoolExecutor
+from rioxarray.rioxarray import affine_to_coords
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from time import perf_counter
 import logging
+from settings.base import (
+    CACHE_FOLDER,
+    GPM_DECODE_PARALLEL_MIN_FILES,
+    GPM_DECODE_WORKERS,
+    GPM_MAX_WORKERS,
+    GPM_SUBSET_DOWNLOAD,
+    GPM_TIMEOUT,
+)
 
 logger = logging.getLogger(__name__)
 
+GPM_BASE_URL = "https://gpm2.gesdisc.eosdis.nasa.gov/"
+GPM_FILES_PER_DAY = 48  # half-hourly IMERG files
+GPM_DOWNLOAD_CHUNK_SIZE = 1024**2  # bytes
 
-def get_catalog(date):
-    catalog_location = f"https://gpm2.gesdisc.eosdis.nasa.gov/opendap/hyrax/GPM_L3/GPM_3IMERGHHL.07/{date.strftime('%Y')}/{date.strftime('%j')}/catalog.xml"
-    catalog_raw = requests.get(catalog_location)
+# cell centres of the global 0.1 degree IMERG grid, precipitation is stored as (time, lon, lat)
+IMERG_LONS = np.round(np.arange(3600) * 0.1 - 179.95, 2)
+IMERG_LATS = np.round(np.arange(1800) * 0.1 - 89.95, 2)
+
+
+def get_catalog(date, session=requests, base_url=GPM_BASE_URL):
+    catalog_location = f"{base_url}opendap/hyrax/GPM_L3/GPM_3IMERGHHL.07/{date.strftime('%Y')}/{date.strftime('%j')}/catalog.xml"
+    catalog_raw = session.get(catalog_location, timeout=GPM_TIMEOUT)
     if catalog_raw.status_code == 200:
         catalog = ET.fromstring(catalog_raw.text)
     else:
@@ -24,16 +46,107 @@ def get_catalog(date):
     return catalog
 
 
+def hdf5_timestamp(path):
+    """Start time of the half-hourly IMERG interval, parsed from the HDF5 filename"""
+    stem = Path(path).stem
+    return datetime.strptime(
+        f'{stem.split("IMERG.")[-1].split("-S")[0]} {stem.split("-S")[-1].split("-")[0]}',
+        "%Y%m%d %H%M%S",
+    )
+
+
+_CROP_SLICES = {}  # per process, see crop_slices
+
+
+def crop_slices(lats, lons, bounds):
+    """
+    Index slices of the cells inside a bounding box. The slices are computed once per grid (the global grid of the full
+    files and the grid of the subsets, see GpmDownload.subset_constraint) and cached.
+
+    Args:
+        lats (np.ndarray): ascending latitudes of the grid
+        lons (np.ndarray): ascending longitudes of the grid
+        bounds (tuple): (lon min, lat min, lon max, lat max) of the bounding box
+
+    Returns:
+        lon_slice (slice): slice of the longitudes inside the bounding box
+        lat_slice (slice): slice of the latitudes inside the bounding box
+    """
+    key = (tuple(bounds), lons.size, float(lons[0]), lats.size, float(lats[0]))
+    if key not in _CROP_SLICES:
+        _CROP_SLICES[key] = (
+            slice(
+                np.searchsorted(lons, bounds[0], side="right"),
+                np.searchsorted(lons, bounds[2], side="left"),
+            ),
+            slice(
+                np.searchsorted(lats, bounds[1], side="right"),
+                np.searchsorted(lats, bounds[3], side="left"),
+            ),
+        )
+    return _CROP_SLICES[key]
+
+
+def read_imerg_bbox(path, bounds, precipitation=None):
+    """
+    Read the precipitation of a single IMERG HDF5 file inside a bounding box. Only the bounding box is read from the
+    file (hyperslab selection).
+
+    Args:
+        path (Path): path of the HDF5 file
+        bounds (tuple): (lon min, lat min, lon max, lat max) of the bounding box
+        precipitation (np.ndarray): (y, x) array to write the precipitation (mm/hr) to, north up. A new array if not
+            given (e.g., in the workers of GpmDownload.decode_files)
+
+    Returns:
+        timestamp (datetime): start time of the half-hourly interval
+        precipitation (np.ndarray): precipitation (mm/hr) inside the bounding box
+    """
+    with h5py.File(path, "r") as dataset:
+        grid = dataset["Grid"]
+        lon_slice, lat_slice = crop_slices(grid["lat"][:], grid["lon"][:], bounds)
+
+        # bytes in the original HDF5 files, str in the netCDF4 subsets (see GpmDownload.subset_constraint)
+        time_units = grid["time"].attrs["Units"]
+        if isinstance(time_units, bytes):
+            time_units = time_units.decode()
+        timestamp = datetime.strptime(
+            time_units, "seconds since %Y-%m-%d %H:%M:%S UTC"
+        ) + timedelta(seconds=int(grid["time"][0]))
+
+        # IMERG grids are stored as (lon, lat) with ascending latitudes
+        bbox_precipitation = grid["precipitation"][0, lon_slice, lat_slice].T[::-1, :]
+
+    if precipitation is None:
+        return timestamp, bbox_precipitation
+    precipitation[:] = bbox_precipitation
+    return timestamp, precipitation
+
 class GpmDownload:
     def __init__(
         self,
         download_path: Path,
         t0: datetime = datetime.now(),
         ensure_available_days: int = 7,
+        catalog_cache_folder: Path = CACHE_FOLDER / "gpm_catalogs",
+        subset: bool = GPM_SUBSET_DOWNLOAD,
+        base_url: str = GPM_BASE_URL,
+        decode_workers: int = GPM_DECODE_WORKERS,
     ):
-        self.base_url = "https://gpm2.gesdisc.eosdis.nasa.gov/"
+        self.base_url = base_url
+        self.subset = subset
+        self.decode_workers = decode_workers
         self.missing_days = []
         self.download_path = download_path
+        self.catalog_cache_folder = Path(catalog_cache_folder)
+
+        # catalogs and HDF5 files are requested through one pooled session and thread pool
+        self.session = requests.Session()
+        self.session.mount(
+            "https://",
+            HTTPAdapter(pool_connections=GPM_MAX_WORKERS, pool_maxsize=GPM_MAX_WORKERS),
+        )
+        self.executor = ThreadPoolExecutor(max_workers=GPM_MAX_WORKERS)
 
         self.malawi_bounds = (
             31.0000000000000000,  # lon min
@@ -43,16 +156,85 @@ class GpmDownload:
         )
         self.t0 = t0
         self.archive_start_date = self.t0 - timedelta(days=ensure_available_days)
+        self.archive_path = self.download_path.parent / "gpm_rolling_week.nc"
+
+    def close(self):
+        self.executor.shutdown()
+        self.session.close()
+
+    def catalog_cache_path(self, key):
+        return self.catalog_cache_folder / f"{key}.xml"
 
     def get_catalogs(self):
+        """
+        Get the catalogs of all days of the archive period. Catalogs of closed days (see cache_closed_catalogs) are read
+        from disk, the other days are requested concurrently.
+
+        Returns:
+            catalogs (dict): dictionary with the date (YYYYmmdd) as key and the catalog as value, None if the catalog is not available
+        """
+        dates = pd.date_range(start=self.archive_start_date, end=self.t0, freq="d")
+        keys = [date.strftime("%Y%m%d") for date in dates]
+
+        # remove cached catalogs of days before the archive period
+        for cache_path in self.catalog_cache_folder.glob("*.xml"):
+            if cache_path.stem < keys[0]:
+                cache_path.unlink()
+
+        cached_catalogs = {
+            key: ET.parse(self.catalog_cache_path(key)).getroot()
+            for key in keys
+            if self.catalog_cache_path(key).exists()
+        }
+        requested_dates = [
+            date for date, key in zip(dates, keys) if key not in cached_catalogs
+        ]
+        requested_catalogs = dict(
+            zip(
+                [date.strftime("%Y%m%d") for date in requested_dates],
+                self.executor.map(
+                    lambda date: get_catalog(date, self.session, self.base_url),
+                    requested_dates,
+                ),
+            )
+        )
+        logger.info(
+            f"GPM catalogs: {len(cached_catalogs)} days from cache, {len(requested_catalogs)} days requested"
+        )
+
         self.catalogs = {}
-        for date in pd.date_range(start=self.archive_start_date, end=self.t0, freq="d"):
-            self.catalogs[date.strftime("%Y%m%d")] = get_catalog(date)
-            if self.catalogs[date.strftime("%Y%m%d")] == None:
-                self.missing_days.append(date.strftime("%Y%m%d"))
+        for key in keys:
+            self.catalogs[key] = cached_catalogs.get(key, requested_catalogs.get(key))
+            if self.catalogs[key] == None:
+                self.missing_days.append(key)
 
         return self.catalogs
 
+    def cache_closed_catalogs(self, urls):
+        """
+        Store the catalogs of closed days on disk, so they are not requested again: days before t0 of which the catalog
+        lists all half-hourly files and all these files are downloaded.
+
+        Args:
+            urls (dict): dictionary with the date (YYYYmmdd) as key and the urls of the HDF5 files as value (see get_urls)
+        """
+        for key, date_url_list in urls.items():
+            cache_path = self.catalog_cache_path(key)
+            if (
+                key >= self.t0.strftime("%Y%m%d")
+                or not date_url_list
+                or cache_path.exists()
+                or len(date_url_list) < GPM_FILES_PER_DAY
+            ):
+                continue
+
+            if all(
+                (self.download_path / os.path.split(url)[1]).exists()
+                for url in date_url_list
+            ):
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                ET.ElementTree(self.catalogs[key]).write(cache_path)
+
     def get_urls(self):
         self.url_dict = {}
         for key, catalog in self.catalogs.items():
@@ -73,17 +255,79 @@ class GpmDownload:
                 self.url_dict[key] = None
         return self.url_dict
 
-    def gpm_request(self, download_meta: tuple):
-        """download_meta: (url, filename)"""
-        raw = requests.get(self.base_url + download_meta[1])
+    def subset_constraint(self):
+        """
+        DAP4 constraint expression which selects the Malawi bounding box of the precipitation (and its coordinates)
+        from an IMERG file. Only the cells which decode_hdf keeps are selected.
 
-        if raw.status_code == 200:
-            with open(self.download_path / download_meta[0], "wb") as f:
-                f.write(raw.content)
+        Returns:
+            constraint (str): constraint expression, e.g., /Grid/time;/Grid/lon[2110:2179];...
+        """
+        lon_index = np.flatnonzero(
+            (IMERG_LONS > self.malawi_bounds[0]) & (IMERG_LONS < self.malawi_bounds[2])
+        )
+        lat_index = np.flatnonzero(
+            (IMERG_LATS > self.malawi_bounds[1]) & (IMERG_LATS < self.malawi_bounds[3])
+        )
+        lon_range = f"[{lon_index[0]}:{lon_index[-1]}]"
+        lat_range = f"[{lat_index[0]}:{lat_index[-1]}]"
+        return ";".join(
+            [
+                "/Grid/time",
+                f"/Grid/lon{lon_range}",
+                f"/Grid/lat{lat_range}",
+                f"/Grid/precipitation[0:0]{lon_range}{lat_range}",
+            ]
+        )
 
-            return (True, download_meta[1])
-        else:
-            return (False, download_meta[1])
+    def request_url(self, url):
+        """
+        Url to download an IMERG file from: the full HDF5 file, or in subset mode the Malawi subset as netCDF4 (HDF5)
+        file through the OPeNDAP (hyrax) service of the file.
+
+        Args:
+            url (str): path of the HDF5 file on the data server (see get_urls)
+
+        Returns:
+            request_url (str): url to request
+        """
+        if not self.subset:
+            return self.base_url + url
+        opendap_url = self.base_url + url.replace("data", "opendap/hyrax", 1)
+        return f"{opendap_url}.dap.nc4?dap4.ce={quote(self.subset_constraint(), safe='/;:')}"
+
+    def gpm_request(self, download_meta: tuple):
+        """
+        Download an IMERG file to the download folder. The response is streamed to a temporary file, which is renamed
+        once complete, so an interrupted download is not mistaken for a downloaded file by the next run.
+
+        Args:
+            download_meta (tuple): (filename, url) of the HDF5 file (see get_urls)
+
+        Returns:
+            success (bool): whether the file is downloaded
+            url (str): url of the HDF5 file
+        """
+        filename, url = download_meta
+        output_path = self.download_path / filename
+        temporary_path = output_path.with_suffix(".part")
+        try:
+            with self.session.get(
+                self.request_url(url), timeout=GPM_TIMEOUT, stream=True
+            ) as raw:
+                if raw.status_code != 200:
+                    return (False, url)
+
+                with open(temporary_path, "wb") as f:
+                    for chunk in raw.iter_content(chunk_size=GPM_DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+        except requests.RequestException as e:
+            logger.warning(f"GPM download of {filename} failed: {e}")
+            temporary_path.unlink(missing_ok=True)
+            return (False, url)
+
+        temporary_path.replace(output_path)
+        return (True, url)
 
     def download_hdf(self, urls):
         self.filenames = []
@@ -97,8 +341,7 @@ class GpmDownload:
                     if not (self.download_path / filename).exists():
                         download_meta_tuples.append((filename, url))
 
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            output_paths = executor.map(self.gpm_request, download_meta_tuples)
+        output_paths = self.executor.map(self.gpm_request, download_meta_tuples)
 
         downloaded_paths = []
         failed_paths = []
@@ -108,21 +351,24 @@ class GpmDownload:
                 downloaded_paths.append(path)
             else:
                 failed_paths.append(path)
+        logger.info(
+            f"GPM download: {len(downloaded_paths)} files downloaded, {len(failed_paths)} failed"
+        )
 
-    def validate_hdf(self):
-        start_date = datetime.combine(
+        self.cache_closed_catalogs(urls)
+
+    @property
+    def start_date(self):
+        return datetime.combine(
             self.archive_start_date.date(), time(hour=0, minute=0, second=0)
         )
 
+    def validate_hdf(self):
+        start_date = self.start_date
+
         # clean
         hdf5_paths = [p for p in self.download_path.glob("*.HDF5")]
-        hdf5_dates = [
-            datetime.strptime(
-                f'{p.stem.split("IMERG.")[-1].split("-S")[0]} {p.stem.split("-S")[-1].split("-")[0]}',
-                "%Y%m%d %H%M%S",
-            )
-            for p in self.download_path.glob("*.HDF5")
-        ]
+        hdf5_dates = [hdf5_timestamp(p) for p in self.download_path.glob("*.HDF5")]
 
         hdf5_index = {k: v for k, v in zip(hdf5_paths, hdf5_dates)}
 
@@ -133,13 +379,7 @@ class GpmDownload:
         # reload
         hdf5_paths = [p for p in self.download_path.glob("*.HDF5")]
         self.filenames = [p.name for p in self.download_path.glob("*.HDF5")]
-        hdf5_dates = [
-            datetime.strptime(
-                f'{p.stem.split("IMERG.")[-1].split("-S")[0]} {p.stem.split("-S")[-1].split("-")[0]}',
-                "%Y%m%d %H%M%S",
-            )
-            for p in self.download_path.glob("*.HDF5")
-        ]
+        hdf5_dates = [hdf5_timestamp(p) for p in self.download_path.glob("*.HDF5")]
 
         expected_daterange = pd.date_range(
             start=start_date, end=hdf5_dates[-1], freq="30min"
@@ -159,77 +399,168 @@ class GpmDownload:
 
         return no_gap_bool, hdf5_dates[0], hdf5_dates[-1]
 
-    def process_data(self):
-        lonbounds = (self.malawi_bounds[0], self.malawi_bounds[2])
-        latbounds = (self.malawi_bounds[1], self.malawi_bounds[3])
+    @property
+    def grid_shape(self):
+        """(height, width) of the Malawi bounding box on the 0.1 degree grid"""
+        return (
+            round((self.malawi_bounds[3] - self.malawi_bounds[1]) * 10),
+            round((self.malawi_bounds[2] - self.malawi_bounds[0]) * 10),
+        )
+
+    @property
+    def grid_transform(self):
+        """Geotransform of the Malawi bounding box on the 0.1 degree grid"""
+        return rasterio.transform.from_origin(
+            self.malawi_bounds[0], self.malawi_bounds[3], 0.1, 0.1
+        )
+
+    def grid_coords(self):
+        """
+        Coordinates of the cell centres of the Malawi bounding box, computed from the geotransform like rioxarray does
+        (y descending), so they match the archive written by earlier runs.
+
+        Returns:
+            coords (dict): dictionary with the y and x coordinates
+        """
+        height, width = self.grid_shape
+        return affine_to_coords(self.grid_transform, width, height)
+
+    def decode_hdf(self, filename, precipitation):
+        """
+        Read the precipitation of a single IMERG HDF5 file inside the Malawi bounding box (see read_imerg_bbox).
+
+        Args:
+            filename (str): name of the HDF5 file in the download folder
+            precipitation (np.ndarray): (y, x) array to write the precipitation (mm/hr) to, north up
+
+        Returns:
+            timestamp (datetime): start time of the half-hourly interval
+        """
+        timestamp, _ = read_imerg_bbox(
+            self.download_path / filename, self.malawi_bounds, precipitation
+        )
+        return timestamp
+
+    def decode_files(self, filenames, precipitation):
+        """
+        Decode IMERG HDF5 files into the precipitation cube. Backfills (e.g., an empty archive) of at least
+        GPM_DECODE_PARALLEL_MIN_FILES files are decoded in a process pool: the workers return the small bounding box
+        arrays, which are written into the cube in order, so memory stays bounded by the cube.
+
+        Args:
+            filenames (list): names of the HDF5 files in the download folder
+            precipitation (np.ndarray): (time, y, x) array to write the precipitation (mm/hr) to
+
+        Returns:
+            timestamps (list): start times of the half-hourly intervals
+        """
+        start = perf_counter()
+        workers = min(self.decode_workers, len(filenames))
+        if workers > 1 and len(filenames) >= GPM_DECODE_PARALLEL_MIN_FILES:
+            timestamps = []
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                decoded_files = executor.map(
+                    read_imerg_bbox,
+                    [self.download_path / filename for filename in filenames],
+                    repeat(self.malawi_bounds),
+                    chunksize=max(1, len(filenames) // (4 * workers)),
+                )
+                for index, (timestamp, bbox_precipitation) in enumerate(decoded_files):
+                    timestamps.append(timestamp)
+                    precipitation[index] = bbox_precipitation
+        else:
+            workers = 1
+            timestamps = [
+                self.decode_hdf(filename, precipitation[index])
+                for index, filename in enumerate(filenames)
+            ]
 
-        self.timestamps = []
+        duration = perf_counter() - start
+        if filenames:
+            logger.info(
+                f"GPM decode: {len(filenames)} files in {duration:.2f} s with {workers} process(es) "
+                f"({len(filenames) / duration:.0f} files/s)"
+            )
+        return timestamps
 
-        xr_datasets = []
+    def load_archive(self):
+        """
+        Load the persistent GPM cube (time, y, x) written by earlier runs.
 
-        for filename in self.filenames:
-            dataset = h5py.File(os.path.join(self.download_path, filename), "r")
+        Returns:
+            archive (xr.DataArray): archived precipitation, None if no archive exists yet
+        """
+        if not self.archive_path.exists():
+            return None
 
-            lats = dataset["Grid"]["lat"][:]
-            lons = dataset["Grid"]["lon"][:]
+        with xr.open_dataset(
+            self.archive_path, decode_coords="all", mask_and_scale=False
+        ) as archive_dataset:
+            archive = archive_dataset["gpm_precipitation"].load()
+        return archive
 
-            timestamp = datetime.strptime(
-                str(dataset["Grid"]["time"].attrs["Units"]),
-                "b'seconds since %Y-%m-%d %H:%M:%S UTC'",
-            ) + timedelta(seconds=int(dataset["Grid"]["time"][0]))
+    def process_data(self):
+        """
+        Update the persistent GPM cube: only HDF5 files of timesteps which are not yet archived are decoded and added,
+        timesteps before the start of the rolling window are trimmed.
 
-            self.timestamps.append(timestamp)
+        Returns:
+            output_path (Path): path of the updated cube (gpm_rolling_week.nc)
+        """
+        archive = self.load_archive()
 
-            precipitation_all = dataset["Grid"]["precipitation"][0, :, :]
-            lat_index = [
-                index
-                for index, value in enumerate(lats)
-                if (value > latbounds[0]) & (value < latbounds[1])
-            ]
+        if archive is not None:
+            archived_timestamps = set(pd.to_datetime(archive["time"].values))
+        else:
+            archived_timestamps = set()
 
-            lon_index = [
-                index
-                for index, value in enumerate(lons)
-                if (value > lonbounds[0]) & (value < lonbounds[1])
-            ]
+        new_filenames = [
+            filename
+            for filename in self.filenames
+            if hdf5_timestamp(filename) not in archived_timestamps
+        ]
+        logger.info(
+            f"GPM archive: {len(archived_timestamps)} archived timesteps, decoding {len(new_filenames)} new files"
+        )
+
+        precipitation = np.empty(
+            (len(new_filenames), *self.grid_shape), dtype="float32"
+        )
+        self.timestamps = self.decode_files(new_filenames, precipitation)
+
+        cubes = []
+        if archive is not None:
+            cubes.append(archive)
+
+        if new_filenames:
+            da = xr.DataArray(
+                precipitation,
+                coords={"time": self.timestamps, **self.grid_coords()},
+                dims=("time", "y", "x"),
+                name="gpm_precipitation",
+                attrs={
+                    "_FillValue": -1.0,
+                    "AREA_OR_POINT": "Area",
+                    "scale_factor": 1.0,
+                    "add_offset": 0.0,
+                },
+            )
+            da = da.rio.write_crs("epsg:4326")
+            da = da.rio.write_transform(self.grid_transform)
+            da = da.rio.set_spatial_dims("x", "y")
+            cubes.append(da)
 
-            lat_index = [lat_index[0], lat_index[-1]]
-            lon_index = [lon_index[0], lon_index[-1]]
+        da = xr.concat(cubes, dim="time") if len(cubes) > 1 else cubes[0]
+        da = da.sortby("time")
+        da = da.isel(time=~da.indexes["time"].duplicated(keep="last"))
+        da = da.sel(time=da["time"] >= pd.Timestamp(self.start_date))
 
-            precip = precipitation_all[
-                lon_index[0] : lon_index[1] + 1, lat_index[0] : lat_index[1] + 1
-            ]
+        if not new_filenames and len(da["time"]) == len(archived_timestamps):
+            return self.archive_path
 
-            rev = range(len(precip[0, :]) - 1, -1, -1)
-            precip = precip.transpose()[rev, :]
-
-            with rasterio.Env(GDAL_PAM_ENABLED=False):
-                with rasterio.io.MemoryFile() as memfile:
-                    with memfile.open(
-                        driver="GTiff",
-                        width=(lonbounds[1] - lonbounds[0]) * 10,
-                        height=(latbounds[1] - latbounds[0]) * 10,
-                        count=1,
-                        dtype=precip.dtype,
-                        crs="EPSG:4326",
-                        transform=rasterio.transform.from_origin(
-                            lonbounds[0], latbounds[1], 0.1, 0.1
-                        ),
-                        nodata=-1,
-                    ) as dst:
-                        dst.write(precip, 1)
-
-                    xr_datasets.append(rioxarray.open_rasterio(memfile))
-
-        time = xr.Variable("time", self.timestamps)
-
-        da = xr.concat([f for f in xr_datasets], dim=time).rename("gpm_precipitation")
         da = da.rio.write_crs("epsg:4326")
-        da = da.rio.set_spatial_dims("x", "y")
-        da = da.isel(band=0)
-
-        da = da.drop("band")
 
-        output_path = Path(r"data/gpm/gpm_rolling_week.nc")
-        da.to_netcdf(output_path)
-        return output_path
+        temporary_path = self.archive_path.with_suffix(".nc.tmp")
+        da.to_netcdf(temporary_path)
+        temporary_path.replace(self.archive_path)
+        return self.archive_path
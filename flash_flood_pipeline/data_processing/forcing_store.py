@@ -0,0 +1,160 @@
+import logging
+import pandas as pd
+from pathlib import Path
+from settings.base import FORCING_STORE_FOLDER, FORCING_STORE_RETENTION_DAYS
+
+logger = logging.getLogger(__name__)
+
+STORE_COLUMNS = ["issue_time", "valid_time", "placeCode", "precipitation"]
+
+
+class ForcingStore:
+    """
+    On-disk store of rainfall per TA for all forcing sources (GPM, COSMO, GFS). Rows are keyed by (source, issue time,
+    valid time, placeCode) and stored as one Parquet file per source and day of the valid time, so a source is only
+    written once per issue and the combiner only reads the days of the window it needs.
+    """
+
+    def __init__(
+        self,
+        folder: Path = FORCING_STORE_FOLDER,
+        retention_days: int = FORCING_STORE_RETENTION_DAYS,
+    ):
+        """
+        Args:
+            folder (Path): folder of the store
+            retention_days (int): days of valid time kept per source, counted back from the latest stored day
+        """
+        self.folder = Path(folder)
+        self.retention_days = retention_days
+
+    def partition_path(self, source, day):
+        return self.folder / source / f"{pd.Timestamp(day):%Y-%m-%d}.parquet"
+
+    def partition_days(self, source, start=None, end=None):
+        """
+        Days for which data of a source is stored, optionally limited to the window [start, end].
+        """
+        days = sorted(
+            pd.Timestamp(path.stem) for path in (self.folder / source).glob("*.parquet")
+        )
+        if start is not None:
+            days = [day for day in days if day >= pd.Timestamp(start).normalize()]
+        if end is not None:
+            days = [day for day in days if day <= pd.Timestamp(end)]
+        return days
+
+    def write(self, source, timeseries, issue_time=None):
+        """
+        Write (upsert) rainfall per TA of a single issue of a source. Existing rows with the same key are overwritten.
+
+        Args:
+            source (str): name of the forcing source (e.g., GPM, COSMO, GFS)
+            timeseries (pd.DataFrame): rainfall with valid time as index and placeCode as columns
+            issue_time (datetime): issue time of the forecast, None for observations (issue time equals valid time)
+        """
+        records = timeseries.copy()
+        records.index = pd.DatetimeIndex(records.index, name="valid_time")
+        records.columns = records.columns.astype(str)
+        records = records.reset_index().melt(
+            id_vars="valid_time", var_name="placeCode", value_name="precipitation"
+        )
+
+        if issue_time is None:
+            records["issue_time"] = records["valid_time"]
+        else:
+            records["issue_time"] = pd.Timestamp(issue_time)
+
+        records = records[STORE_COLUMNS]
+
+        for day, day_records in records.groupby(records["valid_time"].dt.normalize()):
+            path = self.partition_path(source, day)
+            if path.exists():
+                day_records = pd.concat([pd.read_parquet(path), day_records])
+                day_records = day_records.drop_duplicates(
+                    subset=["issue_time", "valid_time", "placeCode"], keep="last"
+                )
+            path.parent.mkdir(parents=True, exist_ok=True)
+            day_records.sort_values(["valid_time", "placeCode"]).to_parquet(
+                path, index=False
+            )
+        logger.info(f"ForcingStore - wrote {len(records)} records of {source}")
+        self.prune(source)
+
+    def prune(self, source):
+        """
+        Remove the days of a source older than retention_days before its latest stored day.
+        """
+        days = self.partition_days(source)
+        if not days:
+            return
+        oldest_day = days[-1] - pd.Timedelta(days=self.retention_days)
+        for day in days:
+            if day < oldest_day:
+                self.partition_path(source, day).unlink()
+                logger.info(f"ForcingStore - removed {source} of {day:%Y-%m-%d}")
+
+    def read(self, source, start=None, end=None, issue_time=None):
+        """
+        Read rainfall per TA of a source in the window [start, end]. If a timestep is stored for multiple issues, the
+        latest issue is used.
+
+        Args:
+            source (str): name of the forcing source (e.g., GPM, COSMO, GFS)
+            start (datetime): first valid time to read, None to read from the first stored day
+            end (datetime): last valid time to read, None to read up to the last stored day
+            issue_time (datetime): read only this issue of the source
+
+        Returns:
+            timeseries (pd.DataFrame): rainfall with valid time as index and placeCode as columns, empty if nothing is stored
+        """
+        if issue_time is not None and start is None:
+            start = issue_time
+
+        paths = [
+            self.partition_path(source, day)
+            for day in self.partition_days(source, start, end)
+        ]
+        if not paths:
+            return pd.DataFrame()
+
+        records = pd.concat([pd.read_parquet(path) for path in paths])
+
+        if start is not None:
+            records = records.loc[records["valid_time"] >= pd.Timestamp(start)]
+        if end is not None:
+            records = records.loc[records["valid_time"] <= pd.Timestamp(end)]
+        if issue_time is not None:
+            records = records.loc[records["issue_time"] == pd.Timestamp(issue_time)]
+
+        records = records.sort_values("issue_time", kind="stable").drop_duplicates(
+            subset=["valid_time", "placeCode"], keep="last"
+        )
+        timeseries = records.pivot(
+            index="valid_time", columns="placeCode", values="precipitation"
+        )
+        timeseries.index.name = None
+        timeseries.columns.name = None
+        return timeseries
+
+    def contains(self, source, issue_time):
+        """
+        Check whether an issue of a source is stored (the issue time is expected to be the first valid time).
+        """
+        path = self.partition_path(source, pd.Timestamp(issue_time).normalize())
+        if not path.exists():
+            return False
+        issue_times = pd.read_parquet(path, columns=["issue_time"])["issue_time"]
+        return bool((issue_times == pd.Timestamp(issue_time)).any())
+
+    def last_valid_time(self, source):
+        """
+        Most recent valid time stored for a source, None if the source has no data yet.
+        """
+        days = self.partition_days(source)
+        if not days:
+            return None
+        valid_times = pd.read_parquet(
+            self.partition_path(source, days[-1]), columns=["valid_time"]
+        )["valid_time"]
+        return valid_times.max()
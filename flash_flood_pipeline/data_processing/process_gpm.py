@@ -1,66 +1,72 @@
 from pathlib import Path
 from data_download.download_gpm import GpmDownload
 import logging
-import rioxarray
-from rasterio.enums import Resampling
-import xvec
-import numpy as np
 import pandas as pd
+import xarray as xr
+from utils.raster_utils.ta_weight_matrix import sample_ta_means
+from utils.general_utils.stage_instrumentation import record_stage
 
 logger = logging.getLogger(__name__)
 
 
-def update_gpm_archive(ta_gdf):
+def update_gpm_archive(ta_gdf, forcing_store):
+    """
+    Update the GPM archive and the GPM rainfall per TA in the forcing store. Only timesteps from the last stored hour
+    onwards are sampled to TA's, the last stored hour is sampled again as it may have been incomplete. Hours of files
+    which arrived late (before the last stored hour) are sampled again as well.
+
+    Args:
+        ta_gdf (gpd.GeoDataFrame): dataframe with all TA's
+        forcing_store (ForcingStore): store with rainfall per TA for all forcing sources
+
+    Returns:
+        gpm_rainfall (pd.DataFrame): hourly GPM rainfall with datetime as index and placeCode as columns for the rolling window
+    """
     download_path = Path(r"data/gpm/raw")
     gpm_download = GpmDownload(download_path=download_path)
 
-    gpm_download.get_catalogs()
-    urls = gpm_download.get_urls()
+    with record_stage("gpm download"):
+        try:
+            gpm_download.get_catalogs()
+            urls = gpm_download.get_urls()
 
-    gpm_download.download_hdf(urls=urls)
+            gpm_download.download_hdf(urls=urls)
+        finally:
+            gpm_download.close()
 
     is_valid, nc_start_date, nc_end_date = gpm_download.validate_hdf()
     logger.info(
         f"GPM archive up to date from {nc_start_date} to {nc_end_date}. No temporal datagaps: {is_valid}"
     )
-    xr_output_path = gpm_download.process_data()
+    with record_stage("gpm decode"):
+        xr_output_path = gpm_download.process_data()
     logger.info(f"Path: {xr_output_path} - {xr_output_path.exists()}")
-    ta_shapes_4326 = ta_gdf.to_crs("epsg:4326")
-
-    dataset = rioxarray.open_rasterio(xr_output_path)
-
-    upscale_factor = 8
 
-    new_width = dataset.rio.width * upscale_factor
-    new_height = dataset.rio.height * upscale_factor
-    dataset_upsampled = dataset.rio.reproject(
-        dataset.rio.crs,
-        shape=(new_height, new_width),
-        resampling=Resampling.bilinear,
-    )
-
-    sampled = dataset_upsampled.xvec.zonal_stats(
-        ta_shapes_4326.geometry,
-        x_coords="x",
-        y_coords="y",
-        stats=np.nanmean,
-        all_touched=False,
-    )
+    # sample from the last stored hour, or from the first hour of a late file decoded in this run (e.g., a half-hour of
+    # yesterday which was missing on GES DISC in earlier runs), so gaps in the store are filled
+    sample_start = forcing_store.last_valid_time("GPM")
+    if sample_start is not None and gpm_download.timestamps:
+        sample_start = min(
+            sample_start, pd.Timestamp(min(gpm_download.timestamps)).floor("h")
+        )
 
-    gpm_rainfall = sampled.xvec.to_geodataframe().reset_index(drop=False)
+    with xr.open_dataset(xr_output_path, mask_and_scale=False) as gpm_archive:
+        dataset = gpm_archive["gpm_precipitation"]
+        last_archived_timestep = pd.Timestamp(dataset["time"].values.max())
+        if sample_start is not None:
+            dataset = dataset.sel(time=dataset["time"] >= sample_start)
+        dataset = dataset.load()
 
-    gpm_rainfall["ta"] = gpm_rainfall.apply(
-        lambda row: ta_shapes_4326.loc[
-            ta_shapes_4326.geometry == row.geometry, "placeCode"
-        ].iloc[0],
-        axis=1,
-    )
+    if len(dataset["time"]) > 0:
+        with record_stage("gpm sampling"):
+            gpm_rainfall_new = sample_ta_means(dataset, ta_gdf)
+        gpm_rainfall_new.index = pd.to_datetime(gpm_rainfall_new.index)
+        gpm_rainfall_new = gpm_rainfall_new.sort_index()
+        gpm_rainfall_new = gpm_rainfall_new.resample("h").mean()
+        forcing_store.write("GPM", gpm_rainfall_new)
 
-    gpm_rainfall = gpm_rainfall.pivot(
-        index="time", columns="ta", values="gpm_precipitation"
+    gpm_rainfall = forcing_store.read(
+        "GPM", start=gpm_download.start_date, end=last_archived_timestep
     )
-    gpm_rainfall.index = [pd.to_datetime(str(date)) for date in gpm_rainfall.index]
-    gpm_rainfall = gpm_rainfall.sort_index()
-    gpm_rainfall = gpm_rainfall.resample("h").mean()
     gpm_rainfall["src"] = "GPM"
     return gpm_rainfall
@@ -1,5 +1,7 @@
 import logging
-from utils.api import api_post_request
+import time
+from pathlib import Path
+from utils.api import api_post_file
 from settings.base import DISASTER_TYPE
 
 logger = logging.getLogger(__name__)
@@ -16,14 +18,19 @@ class RasterUploader:
 
     def upload_raster_file(self):
         """
-        Upload raster_files (class attribute) to ibf raster endpoint
+        Upload raster_files (class attribute) to ibf raster endpoint. The rasters are streamed from disk, so memory use
+        does not depend on the raster size.
         """
         for raster_file in self.raster_files:
-            files = {"file": open(raster_file, "rb")}
-            api_post_request(
+            raster_size = Path(raster_file).stat().st_size
+            start = time.perf_counter()
+            api_post_file(
                 token=self.token,
                 path="admin-area-dynamic-data/raster/" + DISASTER_TYPE,
-                files=files,
+                file_path=raster_file,
+            )
+            upload_time = time.perf_counter() - start
+            logger.info(
+                f"Uploaded raster-file: {raster_file} ({raster_size / 1e6:.1f} MB in {upload_time:.1f} s, {raster_size / 1e6 / upload_time:.1f} MB/s)"
             )
-            logger.info(f"Uploaded raster-file: {raster_file}")
             # Path(raster_file).unlink()
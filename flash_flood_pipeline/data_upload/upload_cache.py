@@ -0,0 +1,146 @@
+import datetime
+import hashlib
+import json
+import logging
+import threading
+from pathlib import Path
+from settings.base import CACHE_FOLDER, UPLOAD_FORCE_RESEND, UPLOAD_RESEND_HOURS
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_INDICATOR_FIELDS = [
+    "dynamicIndicator",
+    "pointDataCategory",
+    "linesDataCategory",
+    "key",
+]
+
+
+def utc_naive(date):
+    """
+    Upload date as naive UTC datetime, so dates with and without a timezone can be compared.
+    """
+    if date.tzinfo is None:
+        return date
+    return date.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class UploadCache:
+    """
+    Content hashes of the data sent to the IBF portal in the previous pipeline run, per (endpoint, leadTime, eventName,
+    region, indicator), with the upload date the data was last sent with. The content (which is skipped when it did not
+    change) is kept apart from the upload date of the portal (which is refreshed every run by events/process, which is
+    never skipped, see runPipeline.main). Data which did not change is sent again after UPLOAD_RESEND_HOURS. Only the
+    previous run counts: data which was not sent (or skipped) in the previous run is always sent.
+    """
+
+    def __init__(
+        self,
+        cache_path=CACHE_FOLDER / "upload_hashes.json",
+        force_upload=UPLOAD_FORCE_RESEND,
+        resend_hours=UPLOAD_RESEND_HOURS,
+    ):
+        self.cache_path = Path(cache_path)
+        self.force_upload = force_upload
+        self.resend_after = datetime.timedelta(hours=resend_hours)
+        self.previous_hashes = {}
+        if self.cache_path.exists() and not force_upload:
+            with open(self.cache_path, "r") as cache_file:
+                self.previous_hashes = {
+                    key: entry
+                    for key, entry in json.load(cache_file).items()
+                    if isinstance(entry, dict)
+                }
+        self.hashes = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def payload_key(path, body, region):
+        """
+        Key of a body: point and lines data bodies have no eventName, so the region of the uploader is part of the key.
+
+        Args:
+            path (str): api endpoint path
+            body (dict): api post body
+            region (str): name of the region (district) of the upload, None for country wide uploads
+        """
+        indicator = "/".join(
+            str(body[field]) for field in PAYLOAD_INDICATOR_FIELDS if body.get(field)
+        )
+        return "|".join(
+            [
+                path,
+                str(body.get("leadTime")),
+                str(body.get("eventName")),
+                str(region),
+                indicator,
+            ]
+        )
+
+    @staticmethod
+    def payload_hash(body):
+        """
+        Hash of the content of a body, without the date (which changes every run).
+        """
+        content = {key: value for key, value in body.items() if key != "date"}
+        return hashlib.sha256(
+            json.dumps(content, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    def is_unchanged(self, path, body, region, date):
+        """
+        Check whether the same body was sent to the endpoint for the same region in the previous run, less than
+        UPLOAD_RESEND_HOURS before this upload date. Unchanged bodies are kept (with the date they were sent with) for the
+        next run.
+
+        Args:
+            path (str): api endpoint path
+            body (dict): api post body
+            region (str): name of the region (district) of the upload, None for country wide uploads
+            date (datetime.datetime): upload date of the pipeline run
+        """
+        key = self.payload_key(path, body, region)
+        with self.lock:
+            previous = self.previous_hashes.get(key)
+            if (
+                previous is not None
+                and previous["hash"] == self.payload_hash(body)
+                and utc_naive(date) - datetime.datetime.fromisoformat(previous["date"])
+                < self.resend_after
+            ):
+                self.hashes[key] = previous
+                return True
+        return False
+
+    def register(self, path, body, region, date):
+        """
+        Register a body which was sent to the endpoint in this run.
+        """
+        with self.lock:
+            self.hashes[self.payload_key(path, body, region)] = {
+                "hash": self.payload_hash(body),
+                "date": utc_naive(date).isoformat(),
+            }
+
+    def save(self):
+        """
+        Store the hashes of this run, to be compared with in the next run.
+        """
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.cache_path.with_suffix(".tmp")
+        with self.lock, open(temporary_path, "w") as cache_file:
+            json.dump(self.hashes, cache_file)
+        temporary_path.replace(self.cache_path)
+
+
+_UPLOAD_CACHE = None
+
+
+def get_upload_cache():
+    """
+    Upload cache shared by all uploads of the pipeline run.
+    """
+    global _UPLOAD_CACHE
+    if _UPLOAD_CACHE is None:
+        _UPLOAD_CACHE = UploadCache()
+    return _UPLOAD_CACHE
@@ -6,9 +6,7 @@ from settings.base import (
     ALERT_THRESHOLD_VALUE,
     COUNTRY_CODE_ISO3,
     DISASTER_TYPE,
-    KARONGA_PLACECODES,
-    RUMPHI_PLACECODES,
-    BLANTYRE_PLACECODES,
+    REGIONS,
     THRESHOLD_CORRECTION_VALUES,
 )
 from mapping_tables.exposure_mapping_tables import (
@@ -17,6 +15,7 @@ from mapping_tables.exposure_mapping_tables import (
     GEOSERVER_EXPOSURE_DICT,
 )
 from utils.api import api_post_request
+from data_upload.upload_cache import get_upload_cache
 
 
 logger = logging.getLogger(__name__)
@@ -70,6 +69,57 @@ class DataUploader:
         self.sensor_previous_values_dict = sensor_previous_values_dict
         self.token = token
 
+    def post_changed_data(self, path, bodies):
+        """
+        Post bodies to an endpoint of the IBF portal one after another, in the order of bodies, skipping the bodies which
+        did not change since the previous pipeline run sent them for this region (see UploadCache, set
+        UPLOAD_FORCE_RESEND to send everything).
+
+        Args:
+            path (str): api enpoint path relative to base url (e.g., admin-area-dynamic-data/exposure)
+            bodies (list): api post bodies (dictionaries)
+        """
+        upload_cache = get_upload_cache()
+        changed_bodies = [
+            body
+            for body in bodies
+            if not upload_cache.is_unchanged(path, body, self.district_name, self.date)
+        ]
+        if len(changed_bodies) < len(bodies):
+            logger.info(
+                f"{path}: skipped {len(bodies) - len(changed_bodies)} uploads which did not change since the previous run"
+            )
+
+        for body in changed_bodies:
+            api_post_request(token=self.token, path=path, body=body)
+            upload_cache.register(path, body, self.district_name, self.date)
+
+    def schedule_uploads(self, upload_scheduler, phase_name):
+        """
+        Schedule the uploads of the region in the order of the IBF portal: the TA exposure and triggers, then the point
+        assets and then the geoserver assets. The uploads of other regions, lead times and the raster run concurrently.
+
+        Args:
+            upload_scheduler (UploadScheduler): scheduler which runs the uploads of the pipeline run
+            phase_name (str): prefix of the names of the upload phases (e.g., "3-hour Karonga")
+
+        Returns:
+            phase (str): name of the last upload phase of the region
+        """
+        tas_phase = upload_scheduler.submit(
+            f"{phase_name}: upload and trigger tas", self.upload_and_trigger_tas
+        )
+        point_assets_phase = upload_scheduler.submit(
+            f"{phase_name}: expose point assets",
+            self.expose_point_assets,
+            depends_on=[tas_phase],
+        )
+        return upload_scheduler.submit(
+            f"{phase_name}: expose geoserver assets",
+            self.expose_geoserver_assets,
+            depends_on=[point_assets_phase],
+        )
+
     def upload_and_trigger_tas(self):
         """
         (1) Uploading all values for the different exposure types (exposed population, estimation of damage, nr of affected roads,
@@ -122,21 +172,14 @@ class DataUploader:
             ~pd.isnull(ta_exposure_trigger["trigger_value"])
         ]  # filter all that are not warning or trigger
 
-        df_triggered_tas_blantyre = ta_exposure_trigger.loc[
-            ta_exposure_trigger["placeCode"].isin(BLANTYRE_PLACECODES)
-        ]
-        df_triggered_tas_karonga = ta_exposure_trigger.loc[
-            ta_exposure_trigger["placeCode"].isin(KARONGA_PLACECODES)
-        ]
-        df_triggered_tas_rumphi = ta_exposure_trigger.loc[
-            ta_exposure_trigger["placeCode"].isin(RUMPHI_PLACECODES)
-        ]
         event_mapping = {
-            "Blantyre City": df_triggered_tas_blantyre,
-            "Karonga": df_triggered_tas_karonga,
-            "Rumphi": df_triggered_tas_rumphi,
+            region["event_name"]: ta_exposure_trigger.loc[
+                ta_exposure_trigger["placeCode"].isin(region["placecodes"])
+            ]
+            for region in REGIONS.values()
         }
 
+        exposure_bodies = []
         for distr_name, exposed_tas in event_mapping.items():
             if len(exposed_tas) > 0:
                 for key, value in EXPOSURE_TYPES.items():
@@ -146,7 +189,7 @@ class DataUploader:
                     exposure_df[key] = exposure_df.apply(
                         lambda row: 0 if row[key] < 0 else row[key], axis=1
                     )
-                    body = TA_EXPOSURE_DICT
+                    body = TA_EXPOSURE_DICT.copy()
                     body["dynamicIndicator"] = value
                     body["leadTime"] = self.lead_time
                     body["eventName"] = distr_name
@@ -157,11 +200,7 @@ class DataUploader:
                         .to_dict("records")
                     )
                     body["date"] = self.date.strftime("%Y-%m-%dT%H:%M:%SZ")
-                    api_post_request(
-                        token=self.token,
-                        path="admin-area-dynamic-data/exposure",
-                        body=body,
-                    )
+                    exposure_bodies.append(body)
 
                 for _, row in exposed_tas.iterrows():
                     if row["trigger_value"] == 1:
@@ -175,7 +214,7 @@ class DataUploader:
                     )
 
                 # forecast_severity: upload value=1 for all warned or triggered areas
-                body = TA_EXPOSURE_DICT
+                body = TA_EXPOSURE_DICT.copy()
                 body["dynamicIndicator"] = "forecast_severity"
                 body["leadTime"] = self.lead_time
                 body["eventName"] = distr_name
@@ -188,12 +227,10 @@ class DataUploader:
                     .to_dict("records")
                 )
                 body["date"] = self.date.strftime("%Y-%m-%dT%H:%M:%SZ")
-                api_post_request(
-                    token=self.token, path="admin-area-dynamic-data/exposure", body=body
-                )
+                exposure_bodies.append(body)
 
                 # forecast_trigger
-                body = TA_EXPOSURE_DICT
+                body = TA_EXPOSURE_DICT.copy()
                 body["dynamicIndicator"] = "forecast_trigger"
                 body["leadTime"] = self.lead_time
                 body["eventName"] = distr_name
@@ -204,9 +241,10 @@ class DataUploader:
                     .to_dict("records")
                 )
                 body["date"] = self.date.strftime("%Y-%m-%dT%H:%M:%SZ")
-                api_post_request(
-                    token=self.token, path="admin-area-dynamic-data/exposure", body=body
-                )
+                exposure_bodies.append(body)
+
+        # the exposure indicators are posted before forecast_severity and forecast_trigger, which refer to them
+        self.post_changed_data("admin-area-dynamic-data/exposure", exposure_bodies)
 
     def expose_point_assets(self):
         """
@@ -249,9 +287,7 @@ class DataUploader:
                     ],
                     "date": self.date.strftime(format="%Y-%m-%dT%H:%M:%S.%fZ"),
                 }
-                api_post_request(
-                    token=self.token, path="point-data/dynamic", body=dynamic_post_body
-                )
+                self.post_changed_data("point-data/dynamic", [dynamic_post_body])
 
     def expose_geoserver_assets(self):
         """
@@ -264,7 +300,7 @@ class DataUploader:
             ]
         )
         exposed_roads = [str(int(x)) for x in exposed_roads]
-        exposed_roads_body = GEOSERVER_EXPOSURE_DICT
+        exposed_roads_body = GEOSERVER_EXPOSURE_DICT.copy()
         exposed_roads_body["exposedFids"] = exposed_roads
         exposed_roads_body["countryCodeISO3"] = COUNTRY_CODE_ISO3
         exposed_roads_body["disasterType"] = DISASTER_TYPE
@@ -272,9 +308,7 @@ class DataUploader:
         exposed_roads_body["leadTime"] = self.lead_time
         exposed_roads_body["date"] = self.date.strftime("%Y-%m-%dT%H:%M:%SZ")
         # logger.info(exposed_roads_body)
-        api_post_request(
-            token=self.token, path="lines-data/exposure-status", body=exposed_roads_body
-        )
+        self.post_changed_data("lines-data/exposure-status", [exposed_roads_body])
 
         exposed_buildings = list(
             self.buildings_exposure.loc[
@@ -282,7 +316,7 @@ class DataUploader:
             ]
         )
         exposed_buildings = [str(int(x)) for x in exposed_buildings]
-        exposed_buildings_body = GEOSERVER_EXPOSURE_DICT
+        exposed_buildings_body = GEOSERVER_EXPOSURE_DICT.copy()
         exposed_buildings_body["exposedFids"] = exposed_buildings
         exposed_buildings_body["countryCodeISO3"] = COUNTRY_CODE_ISO3
         exposed_buildings_body["disasterType"] = DISASTER_TYPE
@@ -290,11 +324,7 @@ class DataUploader:
         exposed_buildings_body["leadTime"] = self.lead_time
         exposed_buildings_body["date"] = self.date.strftime("%Y-%m-%dT%H:%M:%SZ")
         # logger.info(exposed_buildings_body)
-        api_post_request(
-            token=self.token,
-            path="lines-data/exposure-status",
-            body=exposed_buildings_body,
-        )
+        self.post_changed_data("lines-data/exposure-status", [exposed_buildings_body])
 
     def upload_sensor_values(self):
         """
@@ -322,9 +352,7 @@ class DataUploader:
                 "pointDataCategory": "gauges",
                 "dynamicPointData": values_list,
             }
-            api_post_request(
-                token=self.token, path="point-data/dynamic", body=sensor_dynamic_body
-            )
+            self.post_changed_data("point-data/dynamic", [sensor_dynamic_body])
 
     def untrigger_portal(self):
         """
@@ -335,7 +363,7 @@ class DataUploader:
         untrigger_ta = self.TA_exposure.copy()
         untrigger_ta["amount"] = 0
 
-        body = TA_EXPOSURE_DICT
+        body = TA_EXPOSURE_DICT.copy()
         body["dynamicIndicator"] = "population_affected"  # "population_affected"
 
         body["exposurePlaceCodes"] = (
@@ -345,12 +373,10 @@ class DataUploader:
         body["date"] = self.date.strftime("%Y-%m-%dT%H:%M:%SZ")
         body["eventName"] = None
 
-        api_post_request(
-            token=self.token, path="admin-area-dynamic-data/exposure", body=body
-        )
+        self.post_changed_data("admin-area-dynamic-data/exposure", [body])
 
         # upload 'forecast_severity' with value 0 for all TA's
-        body = TA_EXPOSURE_DICT
+        body = TA_EXPOSURE_DICT.copy()
         body["dynamicIndicator"] = "forecast_severity"
 
         body["exposurePlaceCodes"] = (
@@ -360,12 +386,10 @@ class DataUploader:
         body["date"] = self.date.strftime("%Y-%m-%dT%H:%M:%SZ")
         body["eventName"] = None
 
-        api_post_request(
-            token=self.token, path="admin-area-dynamic-data/exposure", body=body
-        )
+        self.post_changed_data("admin-area-dynamic-data/exposure", [body])
 
         # upload 'forecast_trigger' with value 0 for all TA's
-        body = TA_EXPOSURE_DICT
+        body = TA_EXPOSURE_DICT.copy()
         body["dynamicIndicator"] = "forecast_trigger"
         body["exposurePlaceCodes"] = (
             untrigger_ta[["placeCode", "amount"]].dropna().to_dict("records")
@@ -374,6 +398,4 @@ class DataUploader:
         body["date"] = self.date.strftime("%Y-%m-%dT%H:%M:%SZ")
         body["eventName"] = None
 
-        api_post_request(
-            token=self.token, path="admin-area-dynamic-data/exposure", body=body
-        )
+        self.post_changed_data("admin-area-dynamic-data/exposure", [body])
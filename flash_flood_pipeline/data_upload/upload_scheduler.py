@@ -0,0 +1,80 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from settings.base import UPLOAD_MAX_WORKERS
+from utils.general_utils.stage_instrumentation import record_stage
+
+logger = logging.getLogger(__name__)
+
+
+class UploadScheduler:
+    """
+    Run upload phases (e.g., TA exposure, point assets, raster upload) concurrently while respecting the order the IBF
+    portal needs: a phase starts only when the phases it depends on are finished (e.g., events/process after all
+    other uploads). Phases have to be submitted after the phases they depend on. The waiting and upload time of each
+    phase is logged when all phases are finished.
+    """
+
+    def __init__(self, max_workers=UPLOAD_MAX_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.futures = {}
+        self.timings = {}
+
+    def submit(self, name, function, *args, depends_on=(), **kwargs):
+        """
+        Schedule an upload phase.
+
+        Args:
+            name (str): unique name of the phase (used in the timing report)
+            function (callable): function which uploads the data, called with args and kwargs
+            depends_on (list): names of the phases which should be finished before this phase starts
+
+        Returns:
+            name (str): name of the phase
+        """
+        if name in self.futures:
+            raise ValueError(f"Upload phase {name} is already scheduled")
+        dependencies = [self.futures[dependency] for dependency in depends_on]
+        submitted = time.perf_counter()
+
+        def run_phase():
+            for dependency in dependencies:
+                dependency.result()
+            start = time.perf_counter()
+            try:
+                with record_stage(f"upload {name}"):
+                    return function(*args, **kwargs)
+            finally:
+                self.timings[name] = {
+                    "waiting_s": start - submitted,
+                    "upload_s": time.perf_counter() - start,
+                }
+
+        self.futures[name] = self.executor.submit(run_phase)
+        return name
+
+    def phases(self):
+        return list(self.futures)
+
+    def wait(self):
+        """
+        Wait until all phases are finished and log the timing per phase. Raises the error of the first failed phase
+        (phases depending on a failed phase are not run).
+        """
+        errors = []
+        for name, future in self.futures.items():
+            try:
+                future.result()
+            except Exception as error:
+                errors.append((name, error))
+        self.executor.shutdown()
+
+        for name, timing in self.timings.items():
+            logger.info(
+                f"Upload phase {name}: waited {timing['waiting_s']:.2f} s, uploaded in {timing['upload_s']:.2f} s"
+            )
+
+        if errors:
+            name, error = errors[0]
+            logger.error(f"Upload phase {name} failed")
+            raise error
@@ -1,3 +1,4 @@
+import numpy as np
 from enums.precipitation_sum import PrecipitationSum
 
 
@@ -6,13 +7,15 @@ def event_mapping_12hr(number):
     Map the precipiation sum amount for an 12hr event to a value of 10,20,30,40,50,60,70,80,90 or max 100 mm.
 
     Args:
-        number (float): precipitation sum amount to apply the mapping to
+        number (float or np.ndarray): precipitation sum amount(s) to apply the mapping to
 
     Returns:
-        Mapped number (int): Precipiation sum amount according to a defined 12hr event
+        Mapped number (int or np.ndarray): Precipiation sum amount(s) according to a defined 12hr event
     """
-    rounded_number = round(number / 10) * 10
-    return min(rounded_number, PrecipitationSum.UPPER_VALUE_12HR_EVENT.value)
+    rounded_number = np.round(np.asarray(number) / 10) * 10
+    return np.minimum(
+        rounded_number, PrecipitationSum.UPPER_VALUE_12HR_EVENT.value
+    ).astype(int)
 
 
 def event_mapping_24hr(number):
@@ -20,18 +23,16 @@ def event_mapping_24hr(number):
     Map the precipiation sum amount for an 24hr event to a value of 25,50, 75, 100, 125, 150, 175 or max 200 mm.
 
     Args:
-        number (float): precipitation sum amount to apply the mapping to
+        number (float or np.ndarray): precipitation sum amount(s) to apply the mapping to
 
     Returns:
-        Mapped number (int): Precipiation sum amount according to a defined 24hr event
+        Mapped number (int or np.ndarray): Precipiation sum amount(s) according to a defined 24hr event
     """
-    rounded_number = round(number / 25) * 25
-    
-    if min(rounded_number, PrecipitationSum.UPPER_VALUE_24HR_EVENT.value) == 25:
-        number = 0
-    else:
-        number = min(rounded_number, PrecipitationSum.UPPER_VALUE_24HR_EVENT.value)
-    return number
+    rounded_number = np.round(np.asarray(number) / 25) * 25
+    rounded_number = np.minimum(
+        rounded_number, PrecipitationSum.UPPER_VALUE_24HR_EVENT.value
+    )
+    return np.where(rounded_number == 25, 0, rounded_number).astype(int)
 
 
 def event_mapping_48hr(number):
@@ -39,18 +40,19 @@ def event_mapping_48hr(number):
     Map the precipiation sum amount for an 48hr event to a value of 50, 100, 150 or max 200 mm.
 
     Args:
-        number (float): precipitation sum amount to apply the mapping to
+        number (float or np.ndarray): precipitation sum amount(s) to apply the mapping to
 
     Returns:
-        Mapped number (int): Precipiation sum amount according to a defined 48hr event
+        Mapped number (int or np.ndarray): Precipiation sum amount(s) according to a defined 48hr event
     """
-    
-    rounded_number = round(number / 50) * 50
+    number = np.asarray(number)
+    rounded_number = np.round(number / 50) * 50
 
-    if number < 37.5: # CUSTOM TEMPORARY MAPPING 
-        return 0
-    else:
-        return min(rounded_number, PrecipitationSum.UPPER_VALUE_48HR_EVENT.value)
+    return np.where(
+        number < 37.5,  # CUSTOM TEMPORARY MAPPING
+        0,
+        np.minimum(rounded_number, PrecipitationSum.UPPER_VALUE_48HR_EVENT.value),
+    ).astype(int)
 
 
 def event_mapping_4hr(number):
@@ -58,13 +60,15 @@ def event_mapping_4hr(number):
     Map the precipiation sum amount for an 4hr event to a value of 10,20,30,40,50,60,70 or max 80 mm.
 
     Args:
-        number (float): precipitation sum amount to apply the mapping to
+        number (float or np.ndarray): precipitation sum amount(s) to apply the mapping to
 
     Returns:
-        Mapped number (int): Precipiation sum amount according to a defined 4hr event
+        Mapped number (int or np.ndarray): Precipiation sum amount(s) according to a defined 4hr event
     """
-    rounded_number = round(number / 10) * 10
-    return min(rounded_number, PrecipitationSum.UPPER_VALUE_4HR_EVENT.value)
+    rounded_number = np.round(np.asarray(number) / 10) * 10
+    return np.minimum(
+        rounded_number, PrecipitationSum.UPPER_VALUE_4HR_EVENT.value
+    ).astype(int)
 
 
 def event_mapping_2hr(number):
@@ -72,13 +76,15 @@ def event_mapping_2hr(number):
     Map the precipiation sum amount for an 2hr event to a value of 10,20,30,40,50,60 or max 70 mm.
 
     Args:
-        number (float): precipitation sum amount to apply the mapping to
+        number (float or np.ndarray): precipitation sum amount(s) to apply the mapping to
 
     Returns:
-        Mapped number (int): Precipiation sum amount according to a defined 2hr event
+        Mapped number (int or np.ndarray): Precipiation sum amount(s) according to a defined 2hr event
     """
-    rounded_number = round(number / 10) * 10
-    return min(rounded_number, PrecipitationSum.UPPER_VALUE_2HR_EVENT.value)
+    rounded_number = np.round(np.asarray(number) / 10) * 10
+    return np.minimum(
+        rounded_number, PrecipitationSum.UPPER_VALUE_2HR_EVENT.value
+    ).astype(int)
 
 
 def event_mapping_1hr(number):
@@ -87,10 +93,22 @@ def event_mapping_1hr(number):
     TEMPORAL CORRECTION: Map the precipiation sum amount for an 1hr event to a value of 10,20,30,40 or max 50 mm.
 
     Args:
-        number (float): precipitation sum amount to apply the mapping to
+        number (float or np.ndarray): precipitation sum amount(s) to apply the mapping to
 
     Returns:
-        Mapped number (int): Precipiation sum amount according to a defined 1hr event
+        Mapped number (int or np.ndarray): Precipiation sum amount(s) according to a defined 1hr event
     """
-    rounded_number = round(number / 10) * 10
-    return min(rounded_number, PrecipitationSum.UPPER_VALUE_1HR_EVENT.value)
+    rounded_number = np.round(np.asarray(number) / 10) * 10
+    return np.minimum(
+        rounded_number, PrecipitationSum.UPPER_VALUE_1HR_EVENT.value
+    ).astype(int)
+
+
+EVENT_MAPPING = {
+    "48hr": event_mapping_48hr,
+    "24hr": event_mapping_24hr,
+    "12hr": event_mapping_12hr,
+    "4hr": event_mapping_4hr,
+    "2hr": event_mapping_2hr,
+    "1hr": event_mapping_1hr,
+}
@@ -0,0 +1,32 @@
+import numpy as np
+from mapping_tables.event_mapping import EVENT_MAPPING
+from settings.base import SEVERITY_ORDER_DISTRICT_MAPPING
+
+WINDOWS = list(EVENT_MAPPING)
+
+
+def compile_severity_lookup(severity_order):
+    """
+    Compile a severity order (list of events from least to most severe, e.g. ["5mm_1hr", "10mm_12hr", ...]) into an integer
+    lookup array, so the severity of many events can be determined at once by indexing.
+
+    Args:
+        severity_order (list): event names ordered from least to most severe
+
+    Returns:
+        severity_lookup (np.ndarray): array of shape (max mm + 1, nr of windows) with the position of each (mm, window) event
+        in the severity order, -1 for events which are not part of the severity order. Windows are ordered as in EVENT_MAPPING.
+    """
+    parsed_events = [event.split("mm_") for event in severity_order]
+    max_mm = max(int(mm) for mm, _ in parsed_events)
+
+    severity_lookup = np.full((max_mm + 1, len(WINDOWS)), -1, dtype=int)
+    for severity, (mm, window) in enumerate(parsed_events):
+        severity_lookup[int(mm), WINDOWS.index(window)] = severity
+    return severity_lookup
+
+
+SEVERITY_LOOKUP_DISTRICT_MAPPING = {
+    district: compile_severity_lookup(severity_order)
+    for district, severity_order in SEVERITY_ORDER_DISTRICT_MAPPING.items()
+}
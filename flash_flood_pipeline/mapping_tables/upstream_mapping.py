@@ -0,0 +1,42 @@
+from scipy import sparse
+from settings.base import UPSTREAM_MAP
+
+
+def compile_upstream_matrix(upstream_map):
+    """
+    Compile the upstream map into a row normalized sparse adjacency matrix, so the average rainfall over the upstream area of
+    all TA's follows from a single matrix multiplication.
+
+    Args:
+        upstream_map (dict): dictionary with PlaceCode TA as key and a list of the TA's in its upstream area (including itself) as value
+
+    Returns:
+        place_codes (list): TA's in the order of the rows and columns of the matrix (keys of the upstream map)
+        upstream_matrix (sparse.csr_matrix): matrix of shape (nr of TA's, nr of TA's) with weight 1 / len(upstream TA's) for each upstream TA
+    """
+    place_codes = list(upstream_map.keys())
+    place_code_index = {key: index for index, key in enumerate(place_codes)}
+
+    unknown_tas = sorted(
+        {ta for upstream_tas in upstream_map.values() for ta in upstream_tas}
+        - set(place_codes)
+    )
+    if unknown_tas:
+        raise ValueError(f"Upstream TA's without an entry in the upstream map: {unknown_tas}")
+
+    rows = []
+    columns = []
+    values = []
+    for key, upstream_tas in upstream_map.items():
+        for ta in upstream_tas:
+            rows.append(place_code_index[key])
+            columns.append(place_code_index[ta])
+            values.append(1 / len(upstream_tas))
+
+    upstream_matrix = sparse.csr_matrix(
+        (values, (rows, columns)), shape=(len(place_codes), len(place_codes))
+    )
+    return place_codes, upstream_matrix
+
+
+UPSTREAM_PLACECODES, UPSTREAM_MATRIX = compile_upstream_matrix(UPSTREAM_MAP)
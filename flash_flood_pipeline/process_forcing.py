@@ -4,13 +4,14 @@ import datetime
 from data_processing.process_cosmo import process_cosmo
 from data_processing.process_gpm import update_gpm_archive
 from data_download.download_gfs import GfsDownload
+from data_processing.forcing_store import ForcingStore
 import logging
 import rioxarray
 from rasterio.enums import Resampling
-import xvec
 import numpy as np
 import pandas as pd
 from settings.base import ENVIRONMENT
+from utils.general_utils.stage_instrumentation import record_stage
 
 
 logger = logging.getLogger(__name__)
@@ -30,6 +31,7 @@ class ForcingProcessor:
         )
 
         self.cosmo_folder = Path(r"data/cosmo/")
+        self.forcing_store = ForcingStore()
 
     @property
     def most_recent_cosmo_date(self):
@@ -91,34 +93,56 @@ class ForcingProcessor:
         else:
             raise CosmoNotFound("No eligible COSMO-data found")
 
-    def retrieve_forecast(self):
-        if self.cosmo_prediction_found:
-            logger.info("Eligible COSMO-data found.")
-
+    def cosmo_forecast(self, cosmo_date):
+        """
+        Rainfall per TA of the COSMO run of cosmo_date. Each run is processed once and read from the forcing store afterwards.
+        """
+        if not self.forcing_store.contains("COSMO", cosmo_date):
             cosmo_path = Path(
                 r"data/cosmo/COSMO_MLW_{}T00_prec.nc".format(
-                    self.cosmo_date_to_use.strftime("%Y%m%d")
+                    cosmo_date.strftime("%Y%m%d")
                 )
             )
-            forcing_forecast = process_cosmo(ta_gdf=self.ta_gdf, cosmo_path=cosmo_path)
-            forcing_forecast["src"] = "COSMO"
-        else:
-            logger.info("Eligible COSMO-data not found, switching to GFS.")
+            with record_stage("cosmo processing"):
+                cosmo_rainfall = process_cosmo(ta_gdf=self.ta_gdf, cosmo_path=cosmo_path)
+            self.forcing_store.write("COSMO", cosmo_rainfall, issue_time=cosmo_date)
+        return self.forcing_store.read("COSMO", issue_time=cosmo_date)
+
+    def gfs_forecast(self, date):
+        """
+        Rainfall per TA of the most recent GFS run at date. Each run is retrieved once and read from the forcing store afterwards.
+        """
+        gfs_data = GfsDownload(ta_gdf=self.ta_gdf, date=date)
 
-            gfs_data = GfsDownload(ta_gdf=self.ta_gdf, date=self.current_date_utc)
-            xr_gfs_forecast = gfs_data.retrieve()
+        if not self.forcing_store.contains("GFS", gfs_data.cycle):
+            with record_stage("gfs download"):
+                xr_gfs_forecast = gfs_data.retrieve()
 
             xr_gfs_forecast.to_netcdf(
-                rf"data\{ENVIRONMENT}\debug_output\gfs_{self.current_date_utc.strftime('%Y%m%d-%H')}.nc"
+                rf"data\{ENVIRONMENT}\debug_output\gfs_{gfs_data.cycle.strftime('%Y%m%d-%H')}.nc"
             )
-            forcing_forecast = gfs_data.sample(dataset=xr_gfs_forecast)
+            with record_stage("gfs sampling"):
+                gfs_rainfall = gfs_data.sample(dataset=xr_gfs_forecast)
+            self.forcing_store.write("GFS", gfs_rainfall, issue_time=gfs_data.cycle)
+        return self.forcing_store.read("GFS", issue_time=gfs_data.cycle)
+
+    def retrieve_forecast(self):
+        if self.cosmo_prediction_found:
+            logger.info("Eligible COSMO-data found.")
+
+            forcing_forecast = self.cosmo_forecast(self.cosmo_date_to_use)
+            forcing_forecast["src"] = "COSMO"
+        else:
+            logger.info("Eligible COSMO-data not found, switching to GFS.")
+
+            forcing_forecast = self.gfs_forecast(self.current_date_utc)
             forcing_forecast["src"] = "GFS"
         return forcing_forecast
 
     def construct_forcing_timeseries(self):
-        gpm_archive_df = update_gpm_archive(ta_gdf=self.ta_gdf)
-
-        gpm_archive_df.to_csv(rf"data/{ENVIRONMENT}/debug_output/gpm_archive.csv")
+        gpm_archive_df = update_gpm_archive(
+            ta_gdf=self.ta_gdf, forcing_store=self.forcing_store
+        )
 
         last_gpm_timestep = gpm_archive_df.index[-1]
 
@@ -147,8 +171,10 @@ class ForcingProcessor:
 
             if cosmo_path_data_gap.exists():
                 logger.info("Filling gap between GPM and prediction with COSMO")
-                cosmo_data = process_cosmo(
-                    ta_gdf=self.ta_gdf, cosmo_path=cosmo_path_data_gap
+                cosmo_data = self.cosmo_forecast(
+                    datetime.datetime.combine(
+                        forcing_gap_start.date(), datetime.time(hour=0)
+                    )
                 )
                 forcing_timeseries_datagap = cosmo_data.loc[
                     (cosmo_data.index > forcing_gap_start)
@@ -157,9 +183,7 @@ class ForcingProcessor:
                 forcing_timeseries_datagap["src"] = "COSMO_GAP"
             else:
                 logger.info("Filling gap between GPM and prediction with GFS")
-                gfs_data = GfsDownload(ta_gdf=self.ta_gdf, date=forcing_gap_start)
-                xr_gfs_gap = gfs_data.retrieve()
-                forcing_timeseries_datagap = gfs_data.sample(dataset=xr_gfs_gap)
+                forcing_timeseries_datagap = self.gfs_forecast(forcing_gap_start)
                 forcing_timeseries_datagap["src"] = "GFS_GAP"
                 forcing_timeseries_datagap = forcing_timeseries_datagap.loc[
                     (forcing_timeseries_datagap.index > forcing_gap_start)
@@ -171,10 +195,6 @@ class ForcingProcessor:
                 axis=0,
             )  # drop first row: doublecheck how values are represented
 
-        forcing_combined.to_csv(
-            rf"data/{ENVIRONMENT}/debug_output/forcing_combined_{datetime.datetime.now().strftime('%Y%m%d-%H')}.csv"
-        )
-
         split_forcing_dfs = [
             forcing_combined[[c]]
             .rename(columns={c: "precipitation"})
@@ -1,14 +1,16 @@
 import datetime
 import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 import geopandas as gpd
-import numpy as np
 import logging
 from settings.base import (
     DATA_FOLDER,
     ASSET_TYPES,
     ENVIRONMENT,
-    ALERT_THRESHOLD_VALUE,
+    REGIONS,
+    REGION_MAX_WORKERS,
     THRESHOLD_CORRECTION_VALUES,
 )
 from logger_config.configure_logger import configure_logger
@@ -23,10 +25,18 @@ from data_processing.process_waterlevel_sensor_data import (
 )
 from data_upload.upload_results import DataUploader
 from data_upload.raster_uploader import RasterUploader
+from data_upload.upload_scheduler import UploadScheduler
+from data_upload.upload_cache import get_upload_cache
 from utils.raster_utils.clip_rasters_on_ta import clip_rasters_on_ta
 from utils.raster_utils.merge_rasters_gdal import merge_rasters_gdal
 from utils.vector_utils.combine_vector_data import combine_vector_data
-from utils.api import api_post_request, api_authenticate
+from utils.vector_utils.region_statistics_index import lookup_region_statistics
+from utils.general_utils.stage_instrumentation import (
+    StageRecorder,
+    get_stage_recorder,
+    record_stage,
+)
+from utils.api import api_post_request, api_authenticate, get_api_client
 from process_forcing import ForcingProcessor
 from scenario_selection.scenario_selector import scenarioSelector
 import pandas as pd
@@ -39,206 +49,154 @@ sys.path.append(r"d:\VSCode\IBF-flash-flood-pipeline")
 logger = logging.getLogger(__name__)
 
 
-def write_forcing_dict_to_csv(forcing_dict, output_loc):
-    ts_coll = []
-    for k, v in forcing_dict.items():
-        ts = v.copy()
-        ts = ts.rename(columns={"precipitation": k})
-        ts = ts.set_index("datetime")
-        ts.index = pd.to_datetime(ts.index)
-        ts_coll.append(ts)
+def store_raingauge_rainfall(
+    forcing_store, karonga_rainfall_sensor_data, blantyre_raingauge_data_idw
+):
+    """
+    Write the rain gauge rainfall which replaces the satellite rainfall of some TA's to the forcing store (source
+    RAINGAUGE), so the forcing used by the scenario selector can be traced back from the store.
+
+    Args:
+        forcing_store (ForcingStore): store with rainfall per TA for all forcing sources
+        karonga_rainfall_sensor_data (pd.DataFrame): rainfall of the Karonga sensor (datetime and precipitation), None if not available
+        blantyre_raingauge_data_idw (pd.DataFrame): rainfall interpolated from the Blantyre gauges with datetime as index and placeCode as columns
+    """
+    gauge_rainfall = []
+    if karonga_rainfall_sensor_data is not None:
+        gauge_rainfall.append(
+            karonga_rainfall_sensor_data.set_index("datetime")[["precipitation"]].rename(
+                columns={"precipitation": "MW10407"}
+            )
+        )
+    if len(blantyre_raingauge_data_idw) > 0:
+        gauge_rainfall.append(blantyre_raingauge_data_idw)
 
-    pd.concat(ts_coll, axis=1).to_csv(output_loc)
+    if gauge_rainfall:
+        # the first value of a timestep is used in the forcing (see main)
+        gauge_rainfall = pd.concat(
+            [
+                rainfall.loc[~rainfall.index.duplicated(keep="first")]
+                for rainfall in gauge_rainfall
+            ],
+            axis=1,
+        )
+        forcing_store.write("RAINGAUGE", gauge_rainfall)
 
 
-def determine_trigger_states(
-    karonga_events: dict, rumphi_events: dict, blantyre_events: dict
-):
-    """Determine for the three regions whether they should be triggered or not (based on the exposure of >20 people
+def determine_trigger_states(region_events: dict):
+    """Determine for all regions whether they should be triggered or not (based on the exposure of >20 people)
 
     Args:
-        karonga_events (dict): dictionary with events for karonga with the TA code as key and event as value
-        rumphi_events (dict): dictionary with events for karonga with the TA code as key and event as value
-        blantyre_events (dict): dictionary with events for karonga with the TA code as key and event as value
+        region_events (dict): dictionary with the region key (see REGIONS in settings) as key and a dictionary with the TA code as key and event as value
 
     Returns:
-        trigger states for all areas (e.g. True/False)
+        trigger_states (dict): dictionary with the region key as key and the trigger state as value (e.g. True/False)
     """
+    trigger_states = {region_key: False for region_key in region_events}
+
+    events = pd.DataFrame(
+        [
+            (region_key, place_code, scenario)
+            for region_key, events in region_events.items()
+            for place_code, scenario in (events or {}).items()
+        ],
+        columns=["region", "placeCode", "scenario"],
+    )
+    if events.empty:
+        return trigger_states
 
-    if karonga_events:
-        karonga_triggered_list = []
-        for key, value in karonga_events.items():
-            if key in THRESHOLD_CORRECTION_VALUES:
-                threshold_value = (
-                    ALERT_THRESHOLD_VALUE + THRESHOLD_CORRECTION_VALUES.get(key)
-                )
-            else:
-                threshold_value = ALERT_THRESHOLD_VALUE
-            region_file = gpd.read_file(
-                str(DATA_FOLDER / value / "region_statistics.gpkg")
-            )
-            affected_people = region_file[region_file["placeCode"] == key][
-                "affected_people"
-            ].values[0]
-
-            if affected_people is not None:
-                karonga_triggered_list.append(
-                    region_file[region_file["placeCode"] == key][
-                        "affected_people"
-                    ].values[0]
-                    > threshold_value
-                )
-            else:
-                karonga_triggered_list.append(False)
-        karonga_trigger = any(karonga_triggered_list)
-    else:
-        karonga_trigger = False
-
-    if rumphi_events:
-        rumphi_triggered_list = []
-        for key, value in rumphi_events.items():
-            if key in THRESHOLD_CORRECTION_VALUES:
-                threshold_value = (
-                    ALERT_THRESHOLD_VALUE + THRESHOLD_CORRECTION_VALUES.get(key)
-                )
-            else:
-                threshold_value = ALERT_THRESHOLD_VALUE
-            region_file = gpd.read_file(
-                str(DATA_FOLDER / value / "region_statistics.gpkg")
-            )
-            affected_people = region_file[region_file["placeCode"] == key][
-                "affected_people"
-            ].values[0]
-            if affected_people is not None:
-                rumphi_triggered_list.append(
-                    region_file[region_file["placeCode"] == key][
-                        "affected_people"
-                    ].values[0]
-                    > threshold_value
-                )
-            else:
-                rumphi_triggered_list.append(False)
-        rumphi_trigger = any(rumphi_triggered_list)
-    else:
-        rumphi_trigger = False
-
-    if blantyre_events:
-        blantyre_triggered_list = []
-        for key, value in blantyre_events.items():
-            if key in THRESHOLD_CORRECTION_VALUES:
-                threshold_value = (
-                    ALERT_THRESHOLD_VALUE + THRESHOLD_CORRECTION_VALUES.get(key)
-                )
-            else:
-                threshold_value = ALERT_THRESHOLD_VALUE
+    events = lookup_region_statistics(events).drop_duplicates(
+        subset=["region", "placeCode"]
+    )
 
-            region_file = gpd.read_file(
-                str(DATA_FOLDER / value / "region_statistics.gpkg")
-            )
-            affected_people = region_file[region_file["placeCode"] == key][
-                "affected_people"
-            ].values[0]
-            if affected_people is not None:
-                blantyre_triggered_list.append(
-                    region_file[region_file["placeCode"] == key][
-                        "affected_people"
-                    ].values[0]
-                    > threshold_value
-                )
-            else:
-                blantyre_triggered_list.append(False)
-        blantyre_trigger = any(blantyre_triggered_list)
-    else:
-        blantyre_trigger = False
+    threshold_values = events["region"].map(
+        {region_key: region["alert_threshold"] for region_key, region in REGIONS.items()}
+    ) + events["placeCode"].map(THRESHOLD_CORRECTION_VALUES).fillna(0)
+    events["triggered"] = (
+        pd.to_numeric(events["affected_people"]) > threshold_values
+    )
 
-    return karonga_trigger, rumphi_trigger, blantyre_trigger
+    trigger_states.update(
+        {
+            region_key: bool(triggered)
+            for region_key, triggered in events.groupby("region")["triggered"]
+            .any()
+            .items()
+        }
+    )
+    return trigger_states
 
 
-def combine_events_and_upload_to_ibf(
-    token,
-    ta_gdf,
-    events,
-    lead_time,
-    districtname,
-    date=datetime.datetime.now(),
-    additional_raster_paths=[],
-    skip_depth_upload=False,
-):
-    """Combine the different conditions per TA for each province (e.g., combine a 90 mm in 12 hr scenario in rumphi boma with
-    a 100 mm in 12 hr scenario in Chisowoko and upload the depth rasters, exposure status and TA values to the IBF portal
+def stitch_region_events(ta_gdf, events, region_key):
+    """Combine the different conditions per TA for a region (e.g., combine a 90 mm in 12 hr scenario in rumphi boma with
+    a 100 mm in 12 hr scenario in Chisowoko): stitch the exposed assets and TA values and clip the depth rasters per TA.
+    Runs in a separate process per region.
 
     Args:
         ta_gdf (gpd.GeoDataFrame): Dataframe with all TA's concerned by the pipeline.
         events (Dict): Dictionary with all events in the area considered (format: {"MW10203":"30mm2hr"})
-        lead_time (int): leadtime for the region (e.g., 3 hours from now)
-        districtname (str): name of the district for trigger warning name (e.g., Karonga, Rumphi)
-        date (datetime.datetime): reference time used to upload to the IBF system
-        additional_raster_paths (list): list of raster paths which belong to a different district but have not yet been uploaded.
-            needed if multiple regions have the same leadtime.
-        skip_depth_upload (Bool): whether depth upload should be skipped (in case of 2 regions with same leadtime). If Skip is provided a list
-            of raster paths is returned to be uploaded the next time this function is called.
+        region_key (str): key of the region (see REGIONS in settings)
 
     Returns:
-        data_uploader (DataUploader): class with all data to be uploaded
-        raster_paths (list): list of all raster paths to be uploaded in the next function call.
+        vector_datasets (Dict): dictionary with the asset type as key and the exposed assets of the region as value
+        raster_paths (list): list of the depth rasters per TA of the region
+        stage_records (list): timing and resource usage of the stages in the worker process (see StageRecorder)
     """
+    stage_recorder = StageRecorder()
     logger.info(
-        "step 3a started for vector data: clip and stitch data from one scenario per ta to one file for all tas together"
+        f"step 3a started for vector data ({region_key}): clip and stitch data from one scenario per ta to one file for all tas together"
     )
     vector_datasets = {}
 
     event_ta_gdf = ta_gdf.loc[ta_gdf["placeCode"].isin(list(events.keys()))].copy()
+    event_ta_gdf["scenario"] = event_ta_gdf["placeCode"].map(events)
 
-    for asset_type in ASSET_TYPES:
-        for key, value in events.items():
-            event_ta_gdf.loc[event_ta_gdf["placeCode"] == key, "scenario"] = value
-
-        vector_datasets[asset_type] = combine_vector_data(
-            event_ta_gdf, DATA_FOLDER, asset_type
-        )
-    # for key, val in vector_datasets.items():
-
-    #     if key != "region_statistics":
-    #         val["id"] = pd.to_numeric(val["id"])
-
-    #     val.to_file(
-    #         Path(r"d:\VSCode\IBF-flash-flood-pipeline\data") / f"{key}_mock_event.gpkg"
-    #     )
+    with stage_recorder.stage(f"vector stitch {region_key}"):
+        for asset_type in ASSET_TYPES:
+            vector_datasets[asset_type] = combine_vector_data(
+                event_ta_gdf, DATA_FOLDER, asset_type
+            )
 
     logger.info(
-        "step 3a finished for vector data: clip and stitch data from one scenario per ta to one file for all tas together"
+        f"step 3a finished for vector data ({region_key}): clip and stitch data from one scenario per ta to one file for all tas together"
     )
 
-    # step (3b) - raster data: clip and stitch data of rasters (flood extent, affected people)
+    # step (3b) - raster data: clip data of rasters (flood extent, affected people)
     logger.info(
-        "step 3b started for raster data: clip and stitch data from one scenario per ta to one file for all tas together"
-    )
-    raster_paths = clip_rasters_on_ta(
-        event_ta_gdf, DATA_FOLDER, Path(f"data/{ENVIRONMENT}/temp_rasters")
+        f"step 3b started for raster data ({region_key}): clip data from one scenario per ta"
     )
-
-    if not skip_depth_upload:
-        raster_paths += [rf"data/static_data/{ENVIRONMENT}/nodata_ibf.tif"]
-        raster_paths += additional_raster_paths
-        merge_rasters_gdal(
-            f"data/{ENVIRONMENT}/flood_extents/flood_extent_"
-            + str(lead_time)
-            + "-hour_MWI.tif",
-            raster_paths,
+    with stage_recorder.stage(f"raster clip {region_key}"):
+        raster_paths = clip_rasters_on_ta(
+            event_ta_gdf,
+            DATA_FOLDER,
+            Path(f"data/{ENVIRONMENT}/temp_rasters") / region_key,
         )
     logger.info(
-        "step 3b finished for raster data: clip and stitch data from one scenario per ta to one file for all tas together"
+        f"step 3b finished for raster data ({region_key}): clip data from one scenario per ta"
     )
+    return vector_datasets, raster_paths, stage_recorder.records
 
-    # step (4): upload data and trigger
-    logger.info(
-        "step 4 started: upload and trigger tas, expose point assets, expose geoserver assets, upload raster file waterdepth"
-    )
+
+def schedule_region_uploads(
+    token, vector_datasets, lead_time, region_key, date, upload_scheduler
+):
+    """Schedule the upload of the exposure status and TA values of a region to the IBF portal
+
+    Args:
+        vector_datasets (Dict): dictionary with the asset type as key and the exposed assets of the region as value (see stitch_region_events)
+        lead_time (int): leadtime for the region (e.g., 3 hours from now)
+        region_key (str): key of the region (see REGIONS in settings)
+        date (datetime.datetime): reference time used to upload to the IBF system
+        upload_scheduler (UploadScheduler): scheduler which runs the uploads concurrently with other uploads of the pipeline run
+
+    Returns:
+        data_uploader (DataUploader): class with all data to be uploaded
+    """
     data_uploader = DataUploader(
         token=token,
         time=str(lead_time) + "-hour",
         regions=vector_datasets["region_statistics"],
-        district_name=districtname,
+        district_name=REGIONS[region_key]["name"],
         schools=vector_datasets["vulnerable_schools"],
         waterpoints=vector_datasets["vulnerable_waterpoints"],
         roads=vector_datasets["vulnerable_roads"],
@@ -247,39 +205,23 @@ def combine_events_and_upload_to_ibf(
         date=date,
     )
 
-    data_uploader.upload_and_trigger_tas()
-    data_uploader.expose_point_assets()
-    data_uploader.expose_geoserver_assets()
+    data_uploader.schedule_uploads(
+        upload_scheduler, f"{lead_time}-hour {REGIONS[region_key]['name']}"
+    )
+    return data_uploader
 
-    if not skip_depth_upload:
-        raster_uploader = RasterUploader(
-            raster_files=[
-                f"data/{ENVIRONMENT}/flood_extents/flood_extent_{str(lead_time)}-hour_MWI.tif"
-            ],
-            token=token
-        )
-        raster_uploader.upload_raster_file()
 
-    logger.info(
-        "step 4 finished: upload and trigger tas, expose point assets, expose geoserver assets, upload raster file waterdepth"
-    )
-    if not skip_depth_upload:
-        raster_paths = []
-    return data_uploader, raster_paths
-
-
-def historic_event_management(
-    karonga_leadtime,
-    karonga_trigger,
-    karonga_events,
-    rumphi_leadtime,
-    rumphi_trigger,
-    rumphi_events,
-    blantyre_leadtime,
-    blantyre_trigger,
-    blantyre_events,
-):
+def historic_event_management(region_states):
+    """Keep regions triggered for 5 days after a flood with leadtime 0: store the events of regions which are triggered
+    with leadtime 0 and use the latest of these events for regions with such an event in the past 5 days.
+
+    Args:
+        region_states (dict): dictionary with the region key (see REGIONS in settings) as key and a dictionary with the
+            lead_time, trigger (state) and events of the region as value
 
+    Returns:
+        region_states (dict): region states, with leadtime 0, trigger True and the historic events for regions with a recent leadtime 0 event
+    """
     leadtime_0_library_path = Path(rf"data/{ENVIRONMENT}/events/leadtime_0_events.json")
 
     if leadtime_0_library_path.exists():
@@ -293,14 +235,11 @@ def historic_event_management(
 
     write_date = datetime.datetime.now().strftime("%d-%m-%Y_%H_%M")
 
-    new_leadtime0_dict = {}
-
-    if karonga_trigger and karonga_leadtime == 0:
-        new_leadtime0_dict["karonga"] = karonga_events
-    if rumphi_trigger and rumphi_leadtime == 0:
-        new_leadtime0_dict["rumphi"] = rumphi_events
-    if blantyre_trigger and blantyre_leadtime == 0:
-        new_leadtime0_dict["blantyre"] = blantyre_events
+    new_leadtime0_dict = {
+        region_key: region_state["events"]
+        for region_key, region_state in region_states.items()
+        if region_state["trigger"] and region_state["lead_time"] == 0
+    }
 
     leadtime_0_dict[write_date] = new_leadtime0_dict
 
@@ -326,59 +265,30 @@ def historic_event_management(
             > datetime.datetime.now() - datetime.timedelta(days=5)
         ]
 
-        if "karonga" in recent_historic_event_dataframe.columns and not all(
+    region_states = {
+        region_key: dict(region_state) for region_key, region_state in region_states.items()
+    }
+    for region_key, region_state in region_states.items():
+        if region_key in recent_historic_event_dataframe.columns and not all(
             [
                 pd.isnull(event)
-                for event in recent_historic_event_dataframe["karonga"].tolist()
+                for event in recent_historic_event_dataframe[region_key].tolist()
             ]
         ):
-            karonga_leadtime = 0
-            karonga_trigger = True
-            karonga_events = recent_historic_event_dataframe.loc[
-                recent_historic_event_dataframe[["karonga"]].first_valid_index(),
-                "karonga",
-            ]
-        if "rumphi" in recent_historic_event_dataframe.columns and not all(
-            [
-                pd.isnull(event)
-                for event in recent_historic_event_dataframe["rumphi"].tolist()
-            ]
-        ):
-            rumphi_leadtime = 0
-            rumphi_trigger = True
-            rumphi_events = recent_historic_event_dataframe.loc[
-                recent_historic_event_dataframe[["rumphi"]].first_valid_index(),
-                "rumphi",
-            ]
-        if "blantyre" in recent_historic_event_dataframe.columns and not all(
-            [
-                pd.isnull(event)
-                for event in recent_historic_event_dataframe["blantyre"].tolist()
-            ]
-        ):
-            blantyre_leadtime = 0
-            blantyre_trigger = True
-            blantyre_events = recent_historic_event_dataframe.loc[
-                recent_historic_event_dataframe[["blantyre"]].first_valid_index(),
-                "blantyre",
+            region_state["lead_time"] = 0
+            region_state["trigger"] = True
+            region_state["events"] = recent_historic_event_dataframe.loc[
+                recent_historic_event_dataframe[[region_key]].first_valid_index(),
+                region_key,
             ]
 
-    return (
-        karonga_leadtime,
-        karonga_trigger,
-        karonga_events,
-        rumphi_leadtime,
-        rumphi_trigger,
-        rumphi_events,
-        blantyre_leadtime,
-        blantyre_trigger,
-        blantyre_events,
-    )
+    return region_states
 
 
 def main():
     """Run impact based forecasting pipeline for malawi early warning system."""
     configure_logger()
+    stage_recorder = get_stage_recorder()
     token = api_authenticate()
 
     startTime = time.time()
@@ -390,8 +300,9 @@ def main():
 
     logger.info("Step 1a: Retrieving forcing data")
 
-    fp = ForcingProcessor(ta_gdf=ta_gdf)
-    forcing_timeseries = fp.construct_forcing_timeseries()
+    with record_stage("forcing"):
+        fp = ForcingProcessor(ta_gdf=ta_gdf)
+        forcing_timeseries = fp.construct_forcing_timeseries()
 
     logger.info("Step 1b: Retrieving satellite data")
     gather_satellite_data()
@@ -409,11 +320,6 @@ def main():
         start_date=forcing_start_date
     )
 
-    write_forcing_dict_to_csv(
-        forcing_dict=forcing_timeseries,
-        output_loc=rf"data/{ENVIRONMENT}/debug_output/forcing_ts_before_gauge_{datetime.datetime.now().strftime('%Y-%m-%d-%H')}.csv",
-    )
-
     if karonga_rainfall_sensor_data is not None:
         logger.info(
             "Step 1c.1: Overwriting satellite forcing with Karonga rainfall sensor data"
@@ -471,9 +377,8 @@ def main():
             df_combined = df_combined.sort_values(by=["datetime"])
             forcing_timeseries[ta] = df_combined
 
-    write_forcing_dict_to_csv(
-        forcing_dict=forcing_timeseries,
-        output_loc=rf"data/{ENVIRONMENT}/debug_output/forcing_ts_after_gauge_{datetime.datetime.now().strftime('%Y-%m-%d-%H')}.csv",
+    store_raingauge_rainfall(
+        fp.forcing_store, karonga_rainfall_sensor_data, blantyre_raingauge_data_idw
     )
 
     blantyre_rainfall_sensor_data.to_csv(
@@ -483,100 +388,98 @@ def main():
     # step (2): scenarioselector: choose scenario per ta
     logger.info("Step 2: Scenario selection")
 
-    scenarios_selector = scenarioSelector(gfs_data=forcing_timeseries)
-    (
-        karonga_leadtime,
-        karonga_events,
-        rumphi_leadtime,
-        rumphi_events,
-        blantyre_leadtime,
-        blantyre_events,
-    ) = scenarios_selector.select_scenarios()
+    with record_stage("scenario selection"):
+        scenarios_selector = scenarioSelector(gfs_data=forcing_timeseries)
+        region_states = scenarios_selector.select_scenarios()
 
     logger.info("step 2 finished: scenario selection")
 
-    karonga_trigger, rumphi_trigger, blantyre_trigger = determine_trigger_states(
-        karonga_events=karonga_events,
-        rumphi_events=rumphi_events,
-        blantyre_events=blantyre_events,
-    )
-
-    (
-        karonga_leadtime,
-        karonga_trigger,
-        karonga_events,
-        rumphi_leadtime,
-        rumphi_trigger,
-        rumphi_events,
-        blantyre_leadtime,
-        blantyre_trigger,
-        blantyre_events,
-    ) = historic_event_management(
-        karonga_leadtime,
-        karonga_trigger,
-        karonga_events,
-        rumphi_leadtime,
-        rumphi_trigger,
-        rumphi_events,
-        blantyre_leadtime,
-        blantyre_trigger,
-        blantyre_events,
-    )
+    with record_stage("trigger evaluation"):
+        trigger_states = determine_trigger_states(
+            {
+                region_key: region_state["events"]
+                for region_key, region_state in region_states.items()
+            }
+        )
+    for region_key, region_state in region_states.items():
+        region_state["trigger"] = trigger_states[region_key]
 
-    region_trigger_metadata = pd.DataFrame(
-        data={
-            "region": ["Karonga", "Rumphi", "Blantyre"],
-            "region_triggered": [karonga_trigger, rumphi_trigger, blantyre_trigger],
-            "lead_time": [karonga_leadtime, rumphi_leadtime, blantyre_leadtime],
-            "events": [karonga_events, rumphi_events, blantyre_events],
-        }
-    )
+    region_states = historic_event_management(region_states)
 
-    triggered_regions = region_trigger_metadata.loc[
-        region_trigger_metadata["region_triggered"]
-    ]
-    triggered_regions = triggered_regions.sort_values(by="lead_time", ascending=True)
+    triggered_regions = {
+        region_key: region_state
+        for region_key, region_state in region_states.items()
+        if region_state["trigger"]
+    }
 
     date = datetime.datetime.now(
         tz=datetime.timezone.utc
     )  # check if it is ok that the current date is generated twice, even though it is not used in the shape post request
 
-    for lead_time in np.unique(triggered_regions["lead_time"].tolist()):
-        triggered_regions_leadtime_filter = triggered_regions.loc[
-            triggered_regions["lead_time"] == lead_time
+    # uploads run in the background while the next lead time is merged, events/process is posted after all uploads
+    upload_scheduler = UploadScheduler()
+
+    # step (3): stitch vector data and clip rasters, for all triggered regions in parallel
+    region_datasets = {}
+    if triggered_regions:
+        with record_stage("region stitching"), ProcessPoolExecutor(
+            max_workers=min(len(triggered_regions), REGION_MAX_WORKERS)
+        ) as executor:
+            region_datasets = dict(
+                zip(
+                    triggered_regions,
+                    executor.map(
+                        stitch_region_events,
+                        repeat(ta_gdf),
+                        [
+                            region_state["events"]
+                            for region_state in triggered_regions.values()
+                        ],
+                        triggered_regions,
+                    ),
+                )
+            )
+        for _, _, stage_records in region_datasets.values():
+            stage_recorder.add_records(stage_records, parent="region stitching")
+
+    # step (4): merge the rasters of all regions with the same lead time and upload data and trigger
+    for lead_time in sorted(
+        {int(region_state["lead_time"]) for region_state in triggered_regions.values()}
+    ):
+        lead_time_regions = [
+            region_key
+            for region_key, region_state in triggered_regions.items()
+            if int(region_state["lead_time"]) == lead_time
         ]
 
-        if len(triggered_regions_leadtime_filter) > 1:
-            raster_path_collection = []
-
-            for i, (_, row) in enumerate(triggered_regions_leadtime_filter.iterrows()):
-                if i < len(triggered_regions_leadtime_filter) - 1:
-                    skip_depth_map_upload = True
-                else:
-                    skip_depth_map_upload = False
-
-                _, additional_raster_paths = combine_events_and_upload_to_ibf(
-                    token=token,
-                    ta_gdf=ta_gdf,
-                    events=row["events"],
-                    lead_time=int(row["lead_time"]),
-                    districtname=row["region"],
-                    date=date,
-                    additional_raster_paths=raster_path_collection,
-                    skip_depth_upload=skip_depth_map_upload,
-                )
-                raster_path_collection.extend(additional_raster_paths)
-        else:
-            combine_events_and_upload_to_ibf(
+        logger.info(f"step 4 started: merge rasters and upload data for {lead_time}-hour")
+        flood_extent_path = f"data/{ENVIRONMENT}/flood_extents/flood_extent_{lead_time}-hour_MWI.tif"
+        raster_paths = [
+            raster_path
+            for region_key in lead_time_regions
+            for raster_path in region_datasets[region_key][1]
+        ]
+        with record_stage(f"merge flood map {lead_time}-hour"):
+            merge_rasters_gdal(
+                flood_extent_path,
+                raster_paths + [rf"data/static_data/{ENVIRONMENT}/nodata_ibf.tif"],
+            )
+
+        for region_key in lead_time_regions:
+            schedule_region_uploads(
                 token=token,
-                ta_gdf=ta_gdf,
-                events=triggered_regions_leadtime_filter["events"].iloc[0],
-                lead_time=int(triggered_regions_leadtime_filter["lead_time"].iloc[0]),
-                districtname=triggered_regions_leadtime_filter["region"].iloc[0],
+                vector_datasets=region_datasets[region_key][0],
+                lead_time=lead_time,
+                region_key=region_key,
                 date=date,
+                upload_scheduler=upload_scheduler,
             )
 
-    # step (3a) - vector data: clip and stitch data of assets
+        raster_uploader = RasterUploader(raster_files=[flood_extent_path], token=token)
+        upload_scheduler.submit(
+            f"{lead_time}-hour: upload raster file waterdepth",
+            raster_uploader.upload_raster_file,
+        )
 
     # upload gauge data
     gauge_data_uploader = DataUploader(
@@ -594,9 +497,11 @@ def main():
         sensor_reference_values_dict=gauges_reference_value_dict,
         date=date,
     )
-    gauge_data_uploader.upload_sensor_values()
+    upload_scheduler.submit(
+        "upload sensor values", gauge_data_uploader.upload_sensor_values
+    )
 
-    if not karonga_trigger and not rumphi_trigger and not blantyre_trigger:
+    if not triggered_regions:
         portal_resetter = DataUploader(
             token=token,
             time=None,
@@ -609,9 +514,11 @@ def main():
             health_sites=None,
             date=date,
         )
-        portal_resetter.untrigger_portal()
+        upload_scheduler.submit("untrigger portal", portal_resetter.untrigger_portal)
         logger.info("Untriggered portal")
 
+    # events/process is never skipped by the upload cache: it refreshes the upload date of the portal, also when all other
+    # data did not change since the previous run
     logger.info("Closing Events...")
 
     if ENVIRONMENT == "prod":
@@ -619,7 +526,9 @@ def main():
 
     else:
         api_path = "events/process?noNotifications=true"
-    api_post_request(
+    upload_scheduler.submit(
+        "close events",
+        api_post_request,
         token=token,
         path=api_path,
         body={
@@ -627,10 +536,15 @@ def main():
             "disasterType": "flash-floods",
             "date": date.strftime("%Y-%m-%dT%H:%M:%SZ"),
         },
+        depends_on=upload_scheduler.phases(),
     )
+    upload_scheduler.wait()
+    get_upload_cache().save()
 
+    get_api_client().log_latency_summary()
     elapsedTime = str(time.time() - startTime)
     logger.info(str(elapsedTime))
+    stage_recorder.write_report()
 
 
 if __name__ == "__main__":
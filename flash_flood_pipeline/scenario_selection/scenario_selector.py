@@ -2,29 +2,26 @@ import pandas as pd
 from datetime import datetime
 from utils.general_utils.convert_placecode_to_district import (
     convert_placecode_to_district,
+    convert_placecode_to_region,
 )
+from utils.general_utils.rolling_window_sums import rolling_window_sums
 
 import numpy as np
-from mapping_tables.event_mapping import (
-    event_mapping_12hr,
-    event_mapping_24hr,
-    event_mapping_48hr,
-    event_mapping_4hr,
-    event_mapping_2hr,
-    event_mapping_1hr,
-)
+import xarray as xr
+from mapping_tables.event_mapping import EVENT_MAPPING
+from mapping_tables.severity_mapping import SEVERITY_LOOKUP_DISTRICT_MAPPING
+from mapping_tables.upstream_mapping import UPSTREAM_PLACECODES, UPSTREAM_MATRIX
 from settings.base import (
-    KARONGA_PLACECODES,
-    RUMPHI_PLACECODES,
-    BLANTYRE_PLACECODES,
+    REGIONS,
     SMALL_LAGTIME_PLACECODES,
     SEVERITY_ORDER_DISTRICT_MAPPING,
     EVENT_TRIGGER_HOURS,
-    UPSTREAM_MAP,
     ENVIRONMENT,
 )
 
 COLUMNAME = "precipitation"
+WINDOWS = list(EVENT_MAPPING)
+SMALL_LAGTIME_WINDOWS = ["4hr", "2hr", "1hr"]
 
 
 class scenarioSelector:
@@ -39,53 +36,91 @@ class scenarioSelector:
 
     def add_rolling_functions(self):
         """
-        Add for each datetime in the dataframe a new column with the sum of the values before that datetime and 48H, 24H, 12H, 4H, 2H and 1H before.
+        Compute for each datetime the sum of the precipitation of the 48H, 24H, 12H, 4H, 2H and 1H before (including the datetime itself),
+        for all TA's and windows at once. Timestamps are the union of the timestamps of all TA's.
 
         Args:
             gfs_data (dict): dictionary of the gfs_data with PlaceCode TA as key and dataframe as value including precipitation column
 
         Returns:
-            gfs_data (dict): dictionary of the gfs_data with PlaceCode TA as key and dataframe as value. Rolling summation values of 48H, 24H, 12H, 4H, 2H and 1H before are added as columns (e.g., 1hr column for hourly rolling sum).
+            rolling_sums (xr.DataArray): rolling sums with dimensions (datetime, placeCode, window), NaN for timestamps which are not available for a TA
         """
-        gfs_data = self.gfs_data.copy()
-        for _, df in gfs_data.items():
-            df["datetime"] = pd.to_datetime(df["datetime"])
-            df.set_index("datetime", inplace=True)
-        for _, df in gfs_data.items():
-            df["48hr"] = df[COLUMNAME].rolling("48h").sum()
-            df["24hr"] = df[COLUMNAME].rolling("24h").sum()
-            df["12hr"] = df[COLUMNAME].rolling("12h").sum()
-            df["4hr"] = df[COLUMNAME].rolling("4h").sum()
-            df["2hr"] = df[COLUMNAME].rolling("2h").sum()
-            df["1hr"] = df[COLUMNAME].rolling("1h").sum()
-            del df[COLUMNAME]
-        return gfs_data
-
-    def aggregate_upstream_tas(self, gfs_data):
+        place_codes = list(self.gfs_data.keys())
+        precipitation = pd.concat(
+            {
+                place_code: df.set_index(pd.to_datetime(df["datetime"]))[COLUMNAME]
+                for place_code, df in self.gfs_data.items()
+            },
+            axis=1,
+        ).sort_index()
+        is_present = pd.concat(
+            {
+                place_code: pd.Series(True, index=pd.to_datetime(df["datetime"]))
+                for place_code, df in self.gfs_data.items()
+            },
+            axis=1,
+        ).reindex(precipitation.index)
+
+        rolling_sums = rolling_window_sums(
+            precipitation.index,
+            precipitation.to_numpy(dtype="float64"),
+            [window.replace("hr", "h") for window in WINDOWS],
+            is_present=is_present.notna().to_numpy(),
+        )
+
+        return xr.DataArray(
+            rolling_sums,
+            dims=("datetime", "placeCode", "window"),
+            coords={
+                "datetime": precipitation.index.rename("datetime"),
+                "placeCode": place_codes,
+                "window": WINDOWS,
+            },
+        )
+
+    def aggregate_upstream_tas(self, rolling_sums):
         """
         For TA's with substantial upstream areas, their forecasted precipitation is averaged with upstream precipitation. This is done based
-        on the rainfall forecast values for all TA's.
+        on the rainfall forecast values for all TA's, with one multiplication by the normalized upstream matrix (compiled from UPSTREAM_MAP).
+        Missing values are left out of the average.
 
         Args:
-            gfs_data (dict): dictionary of the gfs_data with PlaceCode TA as key and dataframe as value including precipitation column
+            rolling_sums (xr.DataArray): rolling sums with dimensions (datetime, placeCode, window)
 
         Returns:
-            gfs_data (dict): dictionary of the gfs_data with PlaceCode TA as key and dataframe as value. The precipitation column is now
+            rolling_sums (xr.DataArray): rolling sums with dimensions (datetime, placeCode, window) for all TA's in UPSTREAM_MAP. The rolling sums are now
             an average of all relevant (upstream) TA's. For the TA mapping see settings.base.py
         """
-        for key, value in gfs_data.items():
-            upstream_tas = UPSTREAM_MAP[key]
-            dfs = []
-            for ta in upstream_tas:
-                dfs.append(gfs_data[ta])
-
-            averages = (
-                pd.concat([each.stack() for each in dfs], axis=1)
-                .apply(lambda x: x.mean(), axis=1)
-                .unstack()
+        missing_tas = [
+            ta
+            for ta in UPSTREAM_PLACECODES
+            if ta not in rolling_sums["placeCode"].values
+        ]
+        if missing_tas:
+            raise ValueError(
+                f"No forcing data for TA's referenced in UPSTREAM_MAP: {missing_tas}"
+            )
+
+        unmapped_tas = sorted(
+            set(rolling_sums["placeCode"].values.tolist()) - set(UPSTREAM_PLACECODES)
+        )
+        if unmapped_tas:
+            raise ValueError(f"TA's without an entry in UPSTREAM_MAP: {unmapped_tas}")
+
+        rolling_sums = rolling_sums.sel(placeCode=UPSTREAM_PLACECODES).transpose(
+            "placeCode", "datetime", "window"
+        )
+        values = rolling_sums.values.reshape(len(UPSTREAM_PLACECODES), -1)
+        is_valid = np.isfinite(values)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            averages = (UPSTREAM_MATRIX @ np.where(is_valid, values, 0)) / (
+                UPSTREAM_MATRIX @ is_valid.astype("float64")
             )
-            gfs_data[key] = averages
-        return gfs_data
+
+        return rolling_sums.copy(
+            data=averages.reshape(rolling_sums.shape)
+        ).transpose("datetime", "placeCode", "window")
 
     def event_selection(self):
         """
@@ -93,83 +128,152 @@ class scenarioSelector:
         in the library. Uses the dataframe with rainfall per traditional authority. This rainfall is first rolled and aggregated with upstream areas before selecting events (functions above)
 
         Returns:
-            gfs_data (dict): dictionary of the gfs_data with PlaceCode TA as key and dataframe as value.
-            In each dataframe for every temporal aggregation period (e.g., 1 hour, 2 hours) the corresponding event values are stored (e.g., 20mm_1hr)
+            events (xr.DataArray): event values in mm with dimensions (datetime, placeCode, window), e.g. 20 for the 20mm_1hr event. Windows of 1, 2 and 4 hours
+            are 0 for TA's without a small lagtime, timesteps which are not available for a TA are NaN.
         """
-        gfs_data = self.add_rolling_functions()
-        gfs_data = self.aggregate_upstream_tas(gfs_data)
+        rolling_sums = self.add_rolling_functions()
+        rolling_sums = self.aggregate_upstream_tas(rolling_sums)
+
+        place_codes = rolling_sums["placeCode"].values.tolist()
+        rolling_sums_array = rolling_sums.values
+
+        is_valid = np.isfinite(rolling_sums_array)
+        events = np.zeros(rolling_sums_array.shape)
+        for window_index, window in enumerate(WINDOWS):
+            events[:, :, window_index] = EVENT_MAPPING[window](
+                np.where(
+                    is_valid[:, :, window_index],
+                    rolling_sums_array[:, :, window_index],
+                    0,
+                )
+            )
 
-        for key, df in gfs_data.items():
-            for index, row in df.iterrows():
+        is_large_lagtime_ta = ~np.isin(place_codes, SMALL_LAGTIME_PLACECODES)
+        is_small_lagtime_window = np.isin(WINDOWS, SMALL_LAGTIME_WINDOWS)
+        events[:, is_large_lagtime_ta[:, None] & is_small_lagtime_window[None, :]] = 0
+        events[~is_valid] = np.nan
 
-                df.loc[index, "12hr"] = event_mapping_12hr(row["12hr"].item())
-                df.loc[index, "24hr"] = event_mapping_24hr(row["24hr"].item())
-                df.loc[index, "48hr"] = event_mapping_48hr(row["48hr"].item())
+        return rolling_sums.copy(data=events)
 
-            if key in SMALL_LAGTIME_PLACECODES:
-                for index, row in df.iterrows():
-                    df.loc[index, "1hr"] = event_mapping_1hr(row["1hr"].item())
-                    df.loc[index, "2hr"] = event_mapping_2hr(row["2hr"].item())
-                    df.loc[index, "4hr"] = event_mapping_4hr(row["4hr"].item())
+    def event_names(self, events):
+        """
+        Convert the event values to the names of the events in the library (e.g., 20mm_12hr). TA's without a small lagtime
+        only get events for the 12, 24 and 48 hour windows.
 
-            else:
-                df.drop(columns=["1hr", "2hr", "4hr"], inplace=True)
+        Args:
+            events (xr.DataArray): event values in mm with dimensions (datetime, placeCode, window)
 
-            for column in df.columns:
-                df[column] = df[column].astype(int).astype(str) + "mm_" + str(column)
+        Returns:
+            event_data (dict): dictionary with PlaceCode TA as key and dataframe as value. In each dataframe for every temporal aggregation
+            period (e.g., 1 hour, 2 hours) the corresponding event names are stored (e.g., 20mm_1hr)
+        """
+        event_data = {}
+        for place_code in events["placeCode"].values:
+            if place_code in SMALL_LAGTIME_PLACECODES:
+                windows = WINDOWS
+            else:
+                windows = [w for w in WINDOWS if w not in SMALL_LAGTIME_WINDOWS]
 
-        return gfs_data
+            ta_events = (
+                events.sel(placeCode=place_code, window=windows)
+                .to_pandas()
+                .dropna(how="any")
+            )
+            ta_events = ta_events.astype(int).astype(str) + "mm_" + ta_events.columns
+            ta_events.columns.name = None
+            event_data[place_code] = ta_events
+        return event_data
 
-    def find_worst_event(self, df_target_hours, district):
+    def find_worst_events(self, events):
         """
-        Takes the dataframe with all events for a single TA and determines which event (e.g., 20mm in 1 hour) will give the largest flooding. The worst event (e.g., 40mm in 2 hours over 20mm in 1 hour) is stored and used to trigger/display in the IBF system.
+        Determine for all TA's at once which event (e.g., 20mm in 1 hour) will give the largest flooding. The worst event (e.g., 40mm in 2 hours over 20mm in 1 hour)
+        is stored and used to trigger/display in the IBF system. The severity of all events is looked up in the integer coded severity order of the district
+        of each TA, after which the worst event and its timing follow from a single argmax.
 
         Args:
-            df_target_hours (pd.DataFrame): Dataframe with rainfall intensities converted to events in the library for a single TA and only timestamps corresponding to IBF leadtimes.
+            events (xr.DataArray): event values in mm with dimensions (datetime, placeCode, window) and a time_reference coordinate (in hours from now),
+            only containing timestamps corresponding to IBF leadtimes.
 
         Returns:
-            most_severe_event (str): name of the most severe event which will occur somewhere in the coming 48 hours
-            event_time (int): time when the most severe event is going to occur. (in hours from now)
+            worst_events (dict): dictionary with PlaceCode TA as key and a tuple of the name of the most severe event which will occur somewhere in the coming 48 hours
+            and the time when the most severe event is going to occur (in hours from now) as value. TA's without events get ("0mm_1hr", 0).
         """
-        df_hours_filtered = df_target_hours.drop(columns=["time_reference"])
-        events_list = df_hours_filtered.to_numpy().flatten()
-        severity_index_list = []
-
-        for item in events_list:
-            if not str(item).startswith("0"):
-                severity_index_list.append(
-                    SEVERITY_ORDER_DISTRICT_MAPPING.get(district).index(item)
-                )
+        place_codes = events["placeCode"].values.tolist()
+        districts = [convert_placecode_to_district(key) for key in place_codes]
+        severity_lookup = np.stack(
+            [SEVERITY_LOOKUP_DISTRICT_MAPPING.get(district) for district in districts]
+        )
+
+        event_values = events.transpose("datetime", "placeCode", "window").values
+        is_event = np.isfinite(event_values) & (event_values > 0)
+        event_mm = np.where(is_event, event_values, 0).astype(int)
+        is_known_event = event_mm < severity_lookup.shape[1]
 
-        if severity_index_list:
-            most_severe_event = SEVERITY_ORDER_DISTRICT_MAPPING.get(district)[
-                max(severity_index_list)
-            ]
-            most_severe_event_index = df_target_hours[
-                df_target_hours[most_severe_event.split("_")[1]] == most_severe_event
-            ].first_valid_index()
-            event_time = df_target_hours.loc[most_severe_event_index, "time_reference"]
-            return most_severe_event, event_time
-        else:
-            return "0mm_1hr", 0
+        severity = np.full(event_mm.shape, -1)
+        ta_index = np.broadcast_to(
+            np.arange(len(place_codes))[None, :, None], event_mm.shape
+        )
+        window_index = np.broadcast_to(
+            np.arange(event_mm.shape[2])[None, None, :], event_mm.shape
+        )
+        severity[is_known_event] = severity_lookup[
+            ta_index[is_known_event],
+            event_mm[is_known_event],
+            window_index[is_known_event],
+        ]
+        severity[~is_event] = -1
+
+        unknown_events = is_event & (severity < 0)
+        if unknown_events.any():
+            _, ta, window = np.argwhere(unknown_events)[0]
+            raise ValueError(
+                f"'{event_mm[unknown_events][0]}mm_{events['window'].values[window]}' is not in the severity order of {districts[ta]}"
+            )
+
+        # worst event per TA and the first timestep at which it occurs
+        worst_severity = severity.max(axis=(0, 2), initial=-1)
+        is_worst_event = (severity == worst_severity[None, :, None]).any(axis=2)
+        worst_event_time_index = np.argmax(is_worst_event, axis=0)
+        time_reference = events["time_reference"].values
+
+        worst_events = {}
+        for ta, key in enumerate(place_codes):
+            if worst_severity[ta] >= 0:
+                worst_events[key] = (
+                    SEVERITY_ORDER_DISTRICT_MAPPING.get(districts[ta])[
+                        worst_severity[ta]
+                    ],
+                    time_reference[worst_event_time_index[ta]],
+                )
+            else:
+                worst_events[key] = ("0mm_1hr", 0)
+        return worst_events
 
     def select_scenarios(self):
         """
         Determine the worst upcoming flood scenario for each TA in the coming 48 hours, including when the first flooding for any TA in a region occurs.
 
         Returns:
-            karonga_leadtime (int): Timing of the first flood in karonga region (in hours from now)
-            karonga_events (Dict): Dictionary with the TA's of Karonga as keys and their worst event as value "20mm_12hr" format. TA's without rain are excluded
-            rumphi_leadtime (int): Timing of the first flood in rumphi region (in hours from now)
-            rumphi_events (Dict): Dictionary with the TA's of rumphi as keys and their worst event as value "20mm_12hr" format. TA's without rain are excluded
-            blantyre_leadtime (int): Timing of the first flood in blantyre region (in hours from now)
-            blantyre_events (Dict): Dictionary with the TA's of blantyre as keys and their worst event as value "20mm_12hr" format. TA's without rain are excluded
+            region_states (Dict): Dictionary with the region key (see REGIONS in settings) as key and a dictionary as value with:
+                lead_time (int): Timing of the first flood in the region (in hours from now), None if no flood is forecasted
+                events (Dict): Dictionary with the TA's of the region as keys and their worst event as value "20mm_12hr" format. TA's without rain are excluded
         """
-        event_data = self.event_selection()
-        for _, df in event_data.items():
+        events = self.event_selection()
+        now = datetime.now()
+        events = events.assign_coords(
+            time_reference=(
+                "datetime",
+                ((events["datetime"].to_index() - now) / pd.Timedelta("1 hour"))
+                .astype(int)
+                .values,
+            )
+        )
+
+        event_data = self.event_names(events)
+        for key, df in event_data.items():
             df["time_reference"] = (
-                (df.index - datetime.now()) / pd.Timedelta("1 hour")
-            ).astype(int)
+                events["time_reference"].to_series().loc[df.index].values
+            )
 
         ts_events = []
         for k, v in event_data.items():
@@ -184,20 +288,16 @@ class scenarioSelector:
             rf"data/{ENVIRONMENT}/debug_output/event_selector_output_{datetime.now().strftime('%Y-%m-%d-%H')}.csv",
         )
 
-        karonga_leadtimes = []
-        karonga_events = {}
-        rumphi_leadtimes = []
-        rumphi_events = {}
-        blantyre_leadtimes = []
-        blantyre_events = {}
+        region_leadtimes = {region_key: [] for region_key in REGIONS}
+        region_events = {region_key: {} for region_key in REGIONS}
 
-        for key, df in event_data.items():
-            df_target_hours = df[df["time_reference"].isin(EVENT_TRIGGER_HOURS)]
-            event, leadtime = self.find_worst_event(
-                df_target_hours=df_target_hours,
-                district=convert_placecode_to_district(key),
+        worst_events = self.find_worst_events(
+            events.isel(
+                datetime=np.isin(events["time_reference"].values, EVENT_TRIGGER_HOURS)
             )
+        )
 
+        for key, (event, leadtime) in worst_events.items():
             if event not in [
                 "0mm_1hr",
                 "0mm_2hr",
@@ -206,32 +306,17 @@ class scenarioSelector:
                 "0mm_24hr",
                 "0mm_48hr",
             ]:
-                if key in KARONGA_PLACECODES:
-                    karonga_leadtimes.append(leadtime)
-                    karonga_events[key] = event
-                elif key in RUMPHI_PLACECODES:
-                    rumphi_leadtimes.append(leadtime)
-                    rumphi_events[key] = event
-                elif key in BLANTYRE_PLACECODES:
-                    blantyre_leadtimes.append(leadtime)
-                    blantyre_events[key] = event
-        if karonga_leadtimes:
-            karonga_leadtime = min(karonga_leadtimes)
-        else:
-            karonga_leadtime = None
-        if rumphi_leadtimes:
-            rumphi_leadtime = min(rumphi_leadtimes)
-        else:
-            rumphi_leadtime = None
-        if blantyre_leadtimes:
-            blantyre_leadtime = min(blantyre_leadtimes)
-        else:
-            blantyre_leadtime = None
-        return (
-            karonga_leadtime,
-            karonga_events,
-            rumphi_leadtime,
-            rumphi_events,
-            blantyre_leadtime,
-            blantyre_events,
-        )
+                region_key = convert_placecode_to_region(key)
+                if region_key is not None:
+                    region_leadtimes[region_key].append(leadtime)
+                    region_events[region_key][key] = event
+
+        return {
+            region_key: {
+                "lead_time": min(region_leadtimes[region_key])
+                if region_leadtimes[region_key]
+                else None,
+                "events": region_events[region_key],
+            }
+            for region_key in REGIONS
+        }
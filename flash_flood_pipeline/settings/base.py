@@ -2,7 +2,11 @@ from pathlib import Path
 
 # references
 DATA_FOLDER = Path("data/input_data")
+COMPILED_LIBRARY_FOLDER = Path("data/compiled_library")
 ENVIRONMENT = "prod"  # can be prod or dev
+CACHE_FOLDER = Path(f"data/{ENVIRONMENT}/cache")
+FORCING_STORE_FOLDER = Path(f"data/{ENVIRONMENT}/forcing_store")
+RUN_REPORT_FOLDER = Path(f"data/{ENVIRONMENT}/debug_output")
 
 # general
 ASSET_TYPES = [
@@ -441,20 +445,73 @@ UPSTREAM_MAP = {
     "MW31532": ["MW31532"],
 }
 
+# regions
+ALERT_THRESHOLD_VALUE = 20
+REGIONS = {  # districts handled by the pipeline, the key is used in the historic event library
+    "karonga": {
+        "name": "Karonga",  # name in the trigger warning
+        "event_name": "Karonga",  # event name in the IBF portal
+        "placecodes": KARONGA_PLACECODES,
+        "severity_order": EVENT_SEVERITY_ORDER,
+        "alert_threshold": ALERT_THRESHOLD_VALUE,  # nr of affected people, corrected per TA by THRESHOLD_CORRECTION_VALUES
+    },
+    "rumphi": {
+        "name": "Rumphi",
+        "event_name": "Rumphi",
+        "placecodes": RUMPHI_PLACECODES,
+        "severity_order": EVENT_SEVERITY_ORDER,
+        "alert_threshold": ALERT_THRESHOLD_VALUE,
+    },
+    "blantyre": {
+        "name": "Blantyre",
+        "event_name": "Blantyre City",
+        "placecodes": BLANTYRE_PLACECODES,
+        "severity_order": EVENT_SEVERITY_ORDER_URBAN,
+        "alert_threshold": ALERT_THRESHOLD_VALUE,
+    },
+}
+REGION_MAX_WORKERS = 3  # regions stitched and clipped at the same time (processes)
+
 SEVERITY_ORDER_DISTRICT_MAPPING = {
-    "Blantyre City": EVENT_SEVERITY_ORDER_URBAN,
-    "Karonga": EVENT_SEVERITY_ORDER,
-    "Rumphi": EVENT_SEVERITY_ORDER,
+    **{region["event_name"]: region["severity_order"] for region in REGIONS.values()},
     None: EVENT_SEVERITY_ORDER,
 }
 
+# forcing
+TA_SAMPLING_UPSCALE_FACTOR = 8  # sub-cells per forcing grid cell (per axis) for TA means
+COSMO_TIMESTEPS_PER_CHUNK = 1  # COSMO timesteps read and sampled to TA's at once
+GPM_MAX_WORKERS = 5  # concurrent requests to GES DISC (catalogs and HDF5 downloads)
+GPM_TIMEOUT = 120  # seconds
+GPM_DECODE_WORKERS = 4  # processes decoding IMERG files for backfills, 1 to decode in the pipeline process
+GPM_DECODE_PARALLEL_MIN_FILES = 96  # new IMERG files (2 days) from which they are decoded in parallel
+GPM_SUBSET_DOWNLOAD = True  # download only the Malawi subset of the IMERG files through OPeNDAP, False for the full global files
+GFS_OPENDAP_URL = "https://nomads.ncep.noaa.gov/dods/gfs_0p25/gfs{date}/gfs_0p25_{hour}z"  # GFS run per cycle date and hour
+GFS_CACHE_DAYS = 7  # days the Malawi subsets of GFS runs are kept in the cache
+FORCING_STORE_RETENTION_DAYS = 30  # days of valid time kept per source in the forcing store, counted back from the latest day
+
+# flood maps
+FLOOD_MAP_CREATION_OPTIONS = {  # GeoTIFF creation options of the merged flood map uploaded to the IBF portal
+    "COMPRESS": "DEFLATE",
+    "ZLEVEL": 6,
+    "PREDICTOR": 1,
+    "TILED": "NO",
+    "NUM_THREADS": "ALL_CPUS",
+}
+
 # alerts
-ALERT_THRESHOLD_VALUE = 20
 ALERT_THRESHOLD_PARAMETER = "affected_people"
 
 # upload results
 COUNTRY_CODE_ISO3 = "MWI"
 DISASTER_TYPE = "flash-floods"
+API_TIMEOUT = 120  # seconds
+API_MAX_WORKERS = 8  # concurrent requests to the IBF API
+API_MAX_RETRIES = 4  # retries of requests failing with a connection error, 429 or 5xx status
+API_BACKOFF_FACTOR = 1  # seconds, retry n waits API_BACKOFF_FACTOR * 2 ** n (unless the API sends Retry-After)
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # bytes read from disk at once when uploading (raster) files
+UPLOAD_MAX_WORKERS = 4  # upload phases (e.g., TA exposure, point assets, raster) running at the same time
+UPLOAD_FORCE_RESEND = False  # resend all data to the IBF portal, also when it did not change since the previous run
+UPLOAD_RESEND_HOURS = 24  # hours after which data which did not change is sent to the IBF portal again
 
 # CBFEWS forecast info
 HISTORIC_TIME_PERIOD_DAYS = 4
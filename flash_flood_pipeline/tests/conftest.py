@@ -0,0 +1,28 @@
+import os
+import sys
+from pathlib import Path
+import pytest
+
+# the pipeline modules are imported from the flash_flood_pipeline folder (like in runPipeline.py)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# settings.credentials reads the IBF credentials when it is imported, the tests only talk to the stub IBF API
+for variable in ["IBF_URL", "ADMIN_LOGIN", "IBF_PASSWORD", "SENSOR_USERNAME", "SENSOR_PASSWORD"]:
+    os.environ.setdefault(variable, "test")
+
+
+@pytest.fixture(scope="session")
+def stub_api():
+    """
+    Stub of the IBF API (see benchmarks/stub_api.py) which keeps the JSON bodies it receives, used by all api requests
+    of the tests.
+    """
+    import utils.api
+    from benchmarks.stub_api import StubIbfApi
+
+    stub_api = StubIbfApi(record_bodies=True).start()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(utils.api, "API_SERVICE_URL", stub_api.url)
+        monkeypatch.setattr(utils.api, "_API_CLIENT", None)
+        yield stub_api
+    stub_api.stop()
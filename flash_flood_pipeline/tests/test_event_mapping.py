@@ -0,0 +1,230 @@
+"""
+Regression tests of the vectorized event mapping (EVENT_MAPPING and scenarioSelector.event_selection/event_names)
+against the row-by-row mapping it replaced: the scalar event_mapping_* functions applied with iterrows per TA. Both map
+the same grid of rolling sums, which contains the exact bucket boundaries of every window (e.g., 5, 15 and 25 mm for the
+1 hour window, 12.5 and 37.5 mm for the 24 and 48 hour windows), values just below and above them and values above the
+caps. Some TA's have timesteps without data (NaN in all windows) or a NaN in a single window.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+from enums.precipitation_sum import PrecipitationSum
+from mapping_tables.event_mapping import EVENT_MAPPING
+from scenario_selection.scenario_selector import (
+    SMALL_LAGTIME_WINDOWS,
+    WINDOWS,
+    scenarioSelector,
+)
+from settings.base import SMALL_LAGTIME_PLACECODES
+
+LARGE_LAGTIME_PLACECODES = ["MW10101", "MW10102", "MW10103"]
+PLACE_CODES = [
+    LARGE_LAGTIME_PLACECODES[0],
+    SMALL_LAGTIME_PLACECODES[0],
+    SMALL_LAGTIME_PLACECODES[1],
+    LARGE_LAGTIME_PLACECODES[1],
+    SMALL_LAGTIME_PLACECODES[2],
+    LARGE_LAGTIME_PLACECODES[2],
+]
+
+
+def iterrows_mapping_12hr(number):
+    rounded_number = round(number / 10) * 10
+    return min(rounded_number, PrecipitationSum.UPPER_VALUE_12HR_EVENT.value)
+
+
+def iterrows_mapping_24hr(number):
+    rounded_number = round(number / 25) * 25
+    if min(rounded_number, PrecipitationSum.UPPER_VALUE_24HR_EVENT.value) == 25:
+        number = 0
+    else:
+        number = min(rounded_number, PrecipitationSum.UPPER_VALUE_24HR_EVENT.value)
+    return number
+
+
+def iterrows_mapping_48hr(number):
+    rounded_number = round(number / 50) * 50
+    if number < 37.5:
+        return 0
+    else:
+        return min(rounded_number, PrecipitationSum.UPPER_VALUE_48HR_EVENT.value)
+
+
+def iterrows_mapping_4hr(number):
+    rounded_number = round(number / 10) * 10
+    return min(rounded_number, PrecipitationSum.UPPER_VALUE_4HR_EVENT.value)
+
+
+def iterrows_mapping_2hr(number):
+    rounded_number = round(number / 10) * 10
+    return min(rounded_number, PrecipitationSum.UPPER_VALUE_2HR_EVENT.value)
+
+
+def iterrows_mapping_1hr(number):
+    rounded_number = round(number / 10) * 10
+    return min(rounded_number, PrecipitationSum.UPPER_VALUE_1HR_EVENT.value)
+
+
+ITERROWS_MAPPING = {
+    "48hr": iterrows_mapping_48hr,
+    "24hr": iterrows_mapping_24hr,
+    "12hr": iterrows_mapping_12hr,
+    "4hr": iterrows_mapping_4hr,
+    "2hr": iterrows_mapping_2hr,
+    "1hr": iterrows_mapping_1hr,
+}
+BUCKET_SIZES = {"48hr": 50, "24hr": 25, "12hr": 10, "4hr": 10, "2hr": 10, "1hr": 10}
+
+
+def grid_values():
+    """
+    Rolling sums to map: multiples of half of every bucket size (the bucket boundaries and centres) up to twice the
+    largest cap, the same values 1e-9 mm lower and higher, and a sample of random values.
+    """
+    largest_cap = max(member.value for member in PrecipitationSum)
+    boundaries = np.unique(
+        np.concatenate(
+            [
+                np.arange(0, 2 * largest_cap + bucket_size, bucket_size / 2)
+                for bucket_size in BUCKET_SIZES.values()
+            ]
+            + [[12.5, 37.5, 62.5]]
+        )
+    )
+    random_values = np.random.default_rng(0).uniform(0, 2 * largest_cap, 500)
+    values = np.concatenate(
+        [boundaries, boundaries + 1e-9, boundaries[1:] - 1e-9, [1e-12], random_values]
+    )
+    return np.sort(values)
+
+
+def rolling_sums_grid(place_codes):
+    """
+    Rolling sums with dimensions (datetime, placeCode, window): every TA and window runs through the grid values with
+    its own offset. The first TA (no small lagtime) has a NaN in the 1 hour window of one timestep, which it does not
+    use. The second TA has no data for three timesteps, the third a NaN in the 1 hour window of one timestep and the
+    fourth a NaN in the 48 hour window of one timestep.
+    """
+    values = grid_values()
+    datetimes = pd.date_range("2026-10-17", periods=len(values), freq="h")
+    offsets = np.arange(len(place_codes))[:, None] * 7 + np.arange(len(WINDOWS)) * 3
+    grid = values[(np.arange(len(values))[:, None, None] + offsets[None]) % len(values)]
+    grid[40, 0, WINDOWS.index("1hr")] = np.nan
+    grid[10:13, 1, :] = np.nan
+    grid[20, 2, WINDOWS.index("1hr")] = np.nan
+    grid[30, 3, WINDOWS.index("48hr")] = np.nan
+    return xr.DataArray(
+        grid,
+        dims=("datetime", "placeCode", "window"),
+        coords={
+            "datetime": datetimes.rename("datetime"),
+            "placeCode": place_codes,
+            "window": WINDOWS,
+        },
+    )
+
+
+def iterrows_event_selection(rolling_sums):
+    """
+    The row-by-row event mapping: per TA a dataframe with a column of rolling sums per window, mapped with iterrows.
+    Timesteps without a rolling sum for one of the windows of a TA are left out, like the TA's without data for a
+    timestep were in the forcing.
+
+    Returns:
+        event_data (dict): dictionary with PlaceCode TA as key and dataframe with the event names as value
+    """
+    event_data = {}
+    for key in rolling_sums["placeCode"].values:
+        df = rolling_sums.sel(placeCode=key).to_pandas()
+        df.columns.name = None
+        if key in SMALL_LAGTIME_PLACECODES:
+            df = df.dropna(how="any")
+        else:
+            df = df.drop(columns=SMALL_LAGTIME_WINDOWS).dropna(how="any")
+            df = df.reindex(columns=WINDOWS)
+
+        for index, row in df.iterrows():
+            df.loc[index, "12hr"] = iterrows_mapping_12hr(row["12hr"].item())
+            df.loc[index, "24hr"] = iterrows_mapping_24hr(row["24hr"].item())
+            df.loc[index, "48hr"] = iterrows_mapping_48hr(row["48hr"].item())
+
+        if key in SMALL_LAGTIME_PLACECODES:
+            for index, row in df.iterrows():
+                df.loc[index, "1hr"] = iterrows_mapping_1hr(row["1hr"].item())
+                df.loc[index, "2hr"] = iterrows_mapping_2hr(row["2hr"].item())
+                df.loc[index, "4hr"] = iterrows_mapping_4hr(row["4hr"].item())
+        else:
+            df.drop(columns=["1hr", "2hr", "4hr"], inplace=True)
+
+        for column in df.columns:
+            df[column] = df[column].astype(int).astype(str) + "mm_" + str(column)
+        event_data[key] = df
+    return event_data
+
+
+class GridScenarioSelector(scenarioSelector):
+    """
+    Scenario selector which maps the rolling sums of the grid instead of the rolling sums of forcing data.
+    """
+
+    def __init__(self, rolling_sums):
+        super().__init__(gfs_data=None)
+        self.rolling_sums = rolling_sums
+
+    def add_rolling_functions(self):
+        return self.rolling_sums
+
+    def aggregate_upstream_tas(self, rolling_sums):
+        return rolling_sums
+
+
+@pytest.fixture(scope="module")
+def rolling_sums():
+    return rolling_sums_grid(PLACE_CODES)
+
+
+@pytest.fixture(scope="module")
+def vectorized_events(rolling_sums):
+    selector = GridScenarioSelector(rolling_sums)
+    return selector.event_names(selector.event_selection())
+
+
+@pytest.fixture(scope="module")
+def row_by_row_events(rolling_sums):
+    return iterrows_event_selection(rolling_sums)
+
+
+@pytest.mark.parametrize("window", WINDOWS)
+def test_event_mapping_matches_row_by_row_mapping(window):
+    values = grid_values()
+    row_by_row = [ITERROWS_MAPPING[window](value) for value in values.tolist()]
+    np.testing.assert_array_equal(EVENT_MAPPING[window](values), row_by_row)
+
+
+def test_large_lagtime_placecodes_have_no_small_lagtime():
+    assert not set(LARGE_LAGTIME_PLACECODES) & set(SMALL_LAGTIME_PLACECODES)
+
+
+def test_event_names_are_given_for_the_same_tas(vectorized_events, row_by_row_events):
+    assert list(vectorized_events) == list(row_by_row_events)
+
+
+@pytest.mark.parametrize("place_code", PLACE_CODES)
+def test_event_names_match_row_by_row_mapping(
+    place_code, vectorized_events, row_by_row_events
+):
+    pd.testing.assert_frame_equal(
+        vectorized_events[place_code],
+        row_by_row_events[place_code],
+        check_names=False,
+        check_freq=False,
+    )
+
+
+def test_timesteps_without_data_are_left_out(rolling_sums, vectorized_events):
+    assert len(vectorized_events[PLACE_CODES[1]]) == len(rolling_sums["datetime"]) - 3
+
+
+def test_unused_nan_window_keeps_the_timestep(rolling_sums, vectorized_events):
+    assert len(vectorized_events[PLACE_CODES[0]]) == len(rolling_sums["datetime"])
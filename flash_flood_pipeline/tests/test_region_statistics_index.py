@@ -0,0 +1,83 @@
+"""
+The region statistics index is stored in the cache folder, keyed by the contents of the region statistics files, and
+the scenario library is never written to.
+"""
+import geopandas as gpd
+import pandas as pd
+import pytest
+from shapely.geometry import box
+from settings.base import CACHE_FOLDER
+from utils.vector_utils import region_statistics_index
+from utils.vector_utils.region_statistics_index import (
+    REGION_STATISTICS_FILE,
+    load_region_statistics_index,
+    lookup_region_statistics,
+)
+
+PLACE_CODES = ["MW10101", "MW10102"]
+
+
+def write_region_statistics(data_folder, scenario, affected_people):
+    scenario_folder = data_folder / scenario
+    scenario_folder.mkdir(parents=True, exist_ok=True)
+    gpd.GeoDataFrame(
+        {"placeCode": PLACE_CODES, "affected_people": affected_people},
+        geometry=[box(index, 0, index + 1, 1) for index in range(len(PLACE_CODES))],
+        crs="epsg:4326",
+    ).to_file(scenario_folder / REGION_STATISTICS_FILE)
+
+
+def folder_contents(folder):
+    return sorted(str(path.relative_to(folder)) for path in folder.rglob("*"))
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    monkeypatch.setattr(region_statistics_index, "_REGION_STATISTICS_INDEX_CACHE", {})
+    data_folder = tmp_path / "scenarios"
+    write_region_statistics(data_folder, "20mm_12hr", [1, 2])
+    write_region_statistics(data_folder, "50mm_24hr", [10, 20])
+    return data_folder, tmp_path / "cache"
+
+
+def test_scenario_library_is_not_written_to(library, tmp_path, monkeypatch):
+    data_folder, _ = library
+    monkeypatch.chdir(tmp_path)
+    contents = folder_contents(data_folder)
+    load_region_statistics_index(data_folder)
+    assert folder_contents(data_folder) == contents
+
+
+def test_index_is_written_to_the_cache_folder(library, tmp_path, monkeypatch):
+    data_folder, _ = library
+    monkeypatch.chdir(tmp_path)
+    load_region_statistics_index(data_folder)
+    assert len(list((tmp_path / CACHE_FOLDER / "region_statistics").glob("*.parquet"))) == 1
+
+
+def test_index_is_read_from_the_cache_folder(library, monkeypatch):
+    data_folder, cache_folder = library
+    load_region_statistics_index(data_folder, cache_folder)
+    monkeypatch.setattr(region_statistics_index, "_REGION_STATISTICS_INDEX_CACHE", {})
+    monkeypatch.setattr(region_statistics_index.gpd, "read_file", None)
+    assert len(load_region_statistics_index(data_folder, cache_folder)) == 4
+
+
+def test_changed_region_statistics_give_a_new_index(library, monkeypatch):
+    data_folder, cache_folder = library
+    load_region_statistics_index(data_folder, cache_folder)
+    write_region_statistics(data_folder, "50mm_24hr", [30, 40])
+    monkeypatch.setattr(region_statistics_index, "_REGION_STATISTICS_INDEX_CACHE", {})
+    region_statistics = load_region_statistics_index(data_folder, cache_folder)
+    assert region_statistics.loc[
+        region_statistics["scenario"] == "50mm_24hr", "affected_people"
+    ].tolist() == [30, 40]
+
+
+def test_lookup_selects_the_scenario_of_each_ta(library):
+    data_folder, cache_folder = library
+    events = pd.DataFrame({"placeCode": PLACE_CODES, "scenario": ["50mm_24hr", "20mm_12hr"]})
+    event_statistics = lookup_region_statistics(
+        events, load_region_statistics_index(data_folder, cache_folder)
+    )
+    assert event_statistics["affected_people"].tolist() == [10, 2]
@@ -0,0 +1,106 @@
+"""
+Tests of the TA means of sample_ta_means (see utils/raster_utils/ta_weight_matrix.py) with 5000 synthetic square TA's
+of 2x2 grid cells, in shuffled order and with shuffled placeCodes, on a grid with a margin of one cell around them.
+"""
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+from shapely.geometry import box
+from utils.raster_utils.ta_weight_matrix import sample_ta_means
+
+RESOLUTION = 0.1
+TAS_X = 100
+TAS_Y = 50
+TIMESTEPS = 24
+
+
+def create_field(values):
+    """
+    Gridded field (time, y, x) with descending latitudes, like the forcing grids, covering the TA's with a margin of one
+    cell.
+
+    Args:
+        values (callable): values of a timestep as function of the x and y cell centre coordinates (2D arrays)
+    """
+    x = 30 - RESOLUTION / 2 + RESOLUTION * np.arange(2 * TAS_X + 2)
+    y = -5 + RESOLUTION / 2 - RESOLUTION * np.arange(2 * TAS_Y + 2)
+    xx, yy = np.meshgrid(x, y)
+    return xr.DataArray(
+        np.broadcast_to(values(xx, yy), (TIMESTEPS, len(y), len(x))).copy(),
+        coords={
+            "time": pd.date_range("2026-10-17", periods=TIMESTEPS, freq="h"),
+            "y": y,
+            "x": x,
+        },
+        dims=("time", "y", "x"),
+    )
+
+
+@pytest.fixture(scope="module")
+def ta_gdf():
+    """
+    TA's of 2x2 grid cells in a block of TAS_X by TAS_Y TA's with its north-west corner at (30, -5), in shuffled order
+    and with random placeCodes.
+    """
+    rng = np.random.default_rng(0)
+    geometries = [
+        box(
+            30 + 2 * i * RESOLUTION,
+            -5 - (2 * j + 2) * RESOLUTION,
+            30 + (2 * i + 2) * RESOLUTION,
+            -5 - 2 * j * RESOLUTION,
+        )
+        for i in range(TAS_X)
+        for j in range(TAS_Y)
+    ]
+    place_codes = [
+        f"MW{code:08d}"
+        for code in rng.choice(10**8, size=len(geometries), replace=False)
+    ]
+    ta_gdf = gpd.GeoDataFrame(
+        {"placeCode": place_codes}, geometry=geometries, crs="epsg:4326"
+    )
+    return ta_gdf.sample(frac=1, random_state=1).reset_index(drop=True)
+
+
+@pytest.fixture
+def ta_means(ta_gdf, tmp_path, monkeypatch):
+    """
+    TA means of a field, with the TA weight matrices cached in a temporary folder.
+    """
+    monkeypatch.chdir(tmp_path)
+    return lambda values: sample_ta_means(create_field(values), ta_gdf)
+
+
+@pytest.fixture
+def rainfall_means(ta_means):
+    return ta_means(lambda xx, yy: np.random.default_rng(0).gamma(0.5, 2, xx.shape))
+
+
+def test_columns_are_unique(rainfall_means):
+    assert rainfall_means.columns.is_unique
+
+
+def test_columns_are_the_placecodes(rainfall_means, ta_gdf):
+    assert set(rainfall_means.columns) == set(ta_gdf["placeCode"])
+
+
+def test_every_ta_has_a_mean(rainfall_means):
+    assert rainfall_means.notna().all().all()
+
+
+def test_uniform_field_gives_the_constant(ta_means):
+    np.testing.assert_allclose(ta_means(lambda xx, yy: np.full(xx.shape, 7.0)), 7.0)
+
+
+@pytest.mark.parametrize("axis", ["x", "y"])
+def test_linear_field_gives_the_ta_centroid(ta_means, ta_gdf, axis):
+    linear_means = ta_means(lambda xx, yy: xx if axis == "x" else yy)
+    bounds = ta_gdf.set_index("placeCode").bounds
+    centroids = (bounds[f"min{axis}"] + bounds[f"max{axis}"]) / 2
+    expected = np.broadcast_to(
+        centroids[linear_means.columns].values, linear_means.shape
+    )
+    np.testing.assert_allclose(linear_means.values, expected)
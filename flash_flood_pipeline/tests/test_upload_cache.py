@@ -0,0 +1,186 @@
+"""
+Tests of the upload cache (see data_upload/upload_cache.py) against the stub IBF API: the uploads of two regions with the
+same lead time (TA exposure, point and lines data, sensor values) and events/process, in a sequence of pipeline runs.
+"""
+import datetime
+import os
+import pytest
+from settings.base import UPLOAD_RESEND_HOURS
+
+LEAD_TIME = "3-hour"
+FIRST_RUN = datetime.datetime(2026, 10, 17, 10, 5, tzinfo=datetime.timezone.utc)
+EXPOSED_IDS = {"karonga": [1, 2, 3], "rumphi": [4, 5]}
+CHANGED_EXPOSED_IDS = {"karonga": [1, 2, 3], "rumphi": [4, 5, 6]}
+RUNS = {
+    "first": (FIRST_RUN, EXPOSED_IDS),
+    "next hour": (FIRST_RUN + datetime.timedelta(hours=1), EXPOSED_IDS),
+    "changed rumphi": (FIRST_RUN + datetime.timedelta(hours=2), CHANGED_EXPOSED_IDS),
+    "resend": (
+        FIRST_RUN + datetime.timedelta(hours=2 + UPLOAD_RESEND_HOURS),
+        CHANGED_EXPOSED_IDS,
+    ),
+}
+
+
+def run_uploads(token, date, exposed_ids):
+    """
+    Upload the data of Karonga and Rumphi and the sensor values concurrently and post events/process afterwards, like
+    runPipeline.main, and save the upload cache. A new upload cache is used, like in a new pipeline run.
+
+    Args:
+        token (str): IBF API token
+        date (datetime.datetime): upload date of the run
+        exposed_ids (dict): ids of the exposed assets (all asset types) per region
+    """
+    import pandas as pd
+    from data_upload import upload_cache
+    from data_upload.upload_results import DataUploader
+    from data_upload.upload_scheduler import UploadScheduler
+    from mapping_tables.exposure_mapping_tables import EXPOSURE_TYPES
+    from settings.base import REGIONS
+    from utils.api import api_post_request
+
+    upload_cache._UPLOAD_CACHE = None
+    upload_scheduler = UploadScheduler()
+    for region_key in ["karonga", "rumphi"]:
+        region = REGIONS[region_key]
+        tas = pd.DataFrame({"placeCode": region["placecodes"]})
+        for exposure_type in EXPOSURE_TYPES:
+            tas[exposure_type] = 50
+        assets = pd.DataFrame(
+            {"id": exposed_ids[region_key], "vulnerability": "high risk"}
+        )
+        data_uploader = DataUploader(
+            token=token,
+            time=LEAD_TIME,
+            regions=tas,
+            district_name=region["name"],
+            schools=assets,
+            waterpoints=assets,
+            roads=assets,
+            buildings=assets,
+            health_sites=assets,
+            date=date,
+        )
+        data_uploader.schedule_uploads(upload_scheduler, region_key)
+
+    gauge_data_uploader = DataUploader(
+        token=token,
+        time=None,
+        regions=None,
+        district_name=None,
+        schools=None,
+        waterpoints=None,
+        roads=None,
+        buildings=None,
+        health_sites=None,
+        sensor_actual_values_dict={1: 2.5},
+        sensor_previous_values_dict={1: 2.0},
+        sensor_reference_values_dict={1: 1.5},
+        date=date,
+    )
+    upload_scheduler.submit("sensor values", gauge_data_uploader.upload_sensor_values)
+    upload_scheduler.submit(
+        "close events",
+        api_post_request,
+        token=token,
+        path="events/process",
+        body={
+            "countryCodeISO3": "MWI",
+            "disasterType": "flash-floods",
+            "date": date.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        },
+        depends_on=upload_scheduler.phases(),
+    )
+    upload_scheduler.wait()
+    upload_cache.get_upload_cache().save()
+
+
+def data_bodies(bodies):
+    """
+    The bodies with data (all bodies except events/process).
+    """
+    return [(endpoint, body) for endpoint, body in bodies if endpoint != "events/process"]
+
+
+def asset_ids(body):
+    """
+    Ids of the exposed assets in a point-data/dynamic or lines-data/exposure-status body.
+    """
+    if "dynamicPointData" in body:
+        return [point["fid"] for point in body["dynamicPointData"]]
+    return [int(fid) for fid in body["exposedFids"]]
+
+
+@pytest.fixture(scope="module")
+def uploaded_bodies(stub_api, tmp_path_factory):
+    """
+    The (endpoint, body) pairs received by the stub IBF API in each of the RUNS, which share an upload cache.
+    """
+    from utils.api import api_authenticate
+
+    working_directory = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("upload_cache"))
+    try:
+        token = api_authenticate()
+        uploaded_bodies = {}
+        for run, (date, exposed_ids) in RUNS.items():
+            stub_api.reset()
+            run_uploads(token, date, exposed_ids)
+            uploaded_bodies[run] = list(stub_api.bodies)
+    finally:
+        os.chdir(working_directory)
+    return uploaded_bodies
+
+
+def test_first_run_sends_every_body(uploaded_bodies):
+    assert len(data_bodies(uploaded_bodies["first"])) == 31
+
+
+def test_unchanged_data_is_skipped_in_the_next_hour(uploaded_bodies):
+    assert data_bodies(uploaded_bodies["next hour"]) == []
+
+
+@pytest.mark.parametrize("run", RUNS)
+def test_events_process_refreshes_the_upload_date_every_run(uploaded_bodies, run):
+    date = RUNS[run][0].strftime("%Y-%m-%dT%H:%M:%SZ")
+    assert [
+        body["date"]
+        for endpoint, body in uploaded_bodies[run]
+        if endpoint == "events/process"
+    ] == [date]
+
+
+def test_changed_region_sends_its_changed_bodies(uploaded_bodies):
+    changed_endpoints = sorted(
+        (endpoint, body.get("pointDataCategory") or body.get("linesDataCategory"))
+        for endpoint, body in data_bodies(uploaded_bodies["changed rumphi"])
+    )
+    assert changed_endpoints == [
+        ("lines-data/exposure-status", "buildings"),
+        ("lines-data/exposure-status", "roads"),
+        ("point-data/dynamic", "health_sites"),
+        ("point-data/dynamic", "schools"),
+        ("point-data/dynamic", "waterpoints"),
+    ]
+
+
+def test_changed_region_does_not_send_other_regions(uploaded_bodies):
+    # point and lines data bodies have no eventName, the region of the uploader keeps Karonga and Rumphi apart
+    assert all(
+        asset_ids(body) == [4, 5, 6]
+        for _, body in data_bodies(uploaded_bodies["changed rumphi"])
+    )
+
+
+def test_unchanged_data_is_resent_after_resend_hours(uploaded_bodies):
+    assert len(data_bodies(uploaded_bodies["resend"])) == 31
+
+
+def test_resent_data_has_the_new_upload_date(uploaded_bodies):
+    # TA exposure and point data use different date formats of the same time
+    date = RUNS["resend"][0].strftime("%Y-%m-%dT%H:%M:%S")
+    assert all(
+        body["date"].startswith(date)
+        for _, body in data_bodies(uploaded_bodies["resend"])
+    )
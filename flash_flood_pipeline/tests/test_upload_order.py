@@ -0,0 +1,96 @@
+"""
+Tests of the order of the uploads of a region (see DataUploader.schedule_uploads) against the stub IBF API: the uploads
+of two regions run concurrently, the posts of each region keep the order of the IBF portal.
+"""
+import datetime
+import pandas as pd
+import pytest
+from mapping_tables.exposure_mapping_tables import EXPOSURE_TYPES
+from settings.base import REGIONS
+
+LEAD_TIME = "3-hour"
+EXPOSED_IDS = {"karonga": [1, 2, 3], "rumphi": [4, 5]}
+REGION_UPLOAD_ORDER = (
+    [("admin-area-dynamic-data/exposure", indicator) for indicator in EXPOSURE_TYPES.values()]
+    + [
+        ("admin-area-dynamic-data/exposure", "forecast_severity"),
+        ("admin-area-dynamic-data/exposure", "forecast_trigger"),
+        ("point-data/dynamic", "schools"),
+        ("point-data/dynamic", "waterpoints"),
+        ("point-data/dynamic", "health_sites"),
+        ("lines-data/exposure-status", "roads"),
+        ("lines-data/exposure-status", "buildings"),
+    ]
+)
+
+
+def body_region(endpoint, body):
+    """
+    Region of a body: the eventName of TA exposure, the ids of the exposed assets of point and lines data.
+    """
+    if endpoint == "admin-area-dynamic-data/exposure":
+        return next(
+            region_key
+            for region_key, region in REGIONS.items()
+            if region["event_name"] == body["eventName"]
+        )
+    if "dynamicPointData" in body:
+        asset_ids = [point["fid"] for point in body["dynamicPointData"]]
+    else:
+        asset_ids = [int(fid) for fid in body["exposedFids"]]
+    return next(
+        region_key for region_key, ids in EXPOSED_IDS.items() if ids == asset_ids
+    )
+
+
+@pytest.fixture(scope="module")
+def uploads_per_region(stub_api, tmp_path_factory):
+    """
+    The (endpoint, indicator) of the bodies received by the stub IBF API per region, in the order they arrived.
+    """
+    from data_upload import upload_cache
+    from data_upload.upload_results import DataUploader
+    from data_upload.upload_scheduler import UploadScheduler
+    from utils.api import api_authenticate
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(tmp_path_factory.mktemp("upload_order"))
+        monkeypatch.setattr(upload_cache, "_UPLOAD_CACHE", None)
+        monkeypatch.setattr(stub_api, "latency", 0.01)
+        token = api_authenticate()
+        stub_api.reset()
+
+        upload_scheduler = UploadScheduler()
+        for region_key, exposed_ids in EXPOSED_IDS.items():
+            tas = pd.DataFrame({"placeCode": REGIONS[region_key]["placecodes"]})
+            for exposure_type in EXPOSURE_TYPES:
+                tas[exposure_type] = 50
+            assets = pd.DataFrame({"id": exposed_ids, "vulnerability": "high risk"})
+            DataUploader(
+                token=token,
+                time=LEAD_TIME,
+                regions=tas,
+                district_name=REGIONS[region_key]["name"],
+                schools=assets,
+                waterpoints=assets,
+                roads=assets,
+                buildings=assets,
+                health_sites=assets,
+                date=datetime.datetime(2026, 10, 17, 10, tzinfo=datetime.timezone.utc),
+            ).schedule_uploads(upload_scheduler, f"{LEAD_TIME} {region_key}")
+        upload_scheduler.wait()
+
+    uploads_per_region = {region_key: [] for region_key in EXPOSED_IDS}
+    for endpoint, body in stub_api.bodies:
+        indicator = (
+            body.get("dynamicIndicator")
+            or body.get("pointDataCategory")
+            or body.get("linesDataCategory")
+        )
+        uploads_per_region[body_region(endpoint, body)].append((endpoint, indicator))
+    return uploads_per_region
+
+
+@pytest.mark.parametrize("region_key", EXPOSED_IDS)
+def test_region_uploads_keep_the_portal_order(uploads_per_region, region_key):
+    assert uploads_per_region[region_key] == REGION_UPLOAD_ORDER
@@ -0,0 +1,42 @@
+"""
+Tests of the checks of the TA's of the upstream aggregation (see scenarioSelector.aggregate_upstream_tas).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+from mapping_tables.upstream_mapping import UPSTREAM_PLACECODES
+from scenario_selection.scenario_selector import WINDOWS, scenarioSelector
+
+
+def rolling_sums(place_codes):
+    return xr.DataArray(
+        np.ones((2, len(place_codes), len(WINDOWS))),
+        dims=("datetime", "placeCode", "window"),
+        coords={
+            "datetime": pd.date_range("2026-10-17", periods=2, freq="h"),
+            "placeCode": place_codes,
+            "window": WINDOWS,
+        },
+    )
+
+
+def test_all_mapped_tas_are_aggregated():
+    aggregated = scenarioSelector(gfs_data=None).aggregate_upstream_tas(
+        rolling_sums(UPSTREAM_PLACECODES)
+    )
+    assert aggregated["placeCode"].values.tolist() == UPSTREAM_PLACECODES
+
+
+def test_ta_without_upstream_map_entry_raises():
+    with pytest.raises(ValueError, match="MW99999"):
+        scenarioSelector(gfs_data=None).aggregate_upstream_tas(
+            rolling_sums(UPSTREAM_PLACECODES + ["MW99999"])
+        )
+
+
+def test_mapped_ta_without_forcing_raises():
+    with pytest.raises(ValueError, match=UPSTREAM_PLACECODES[0]):
+        scenarioSelector(gfs_data=None).aggregate_upstream_tas(
+            rolling_sums(UPSTREAM_PLACECODES[1:])
+        )
@@ -3,11 +3,262 @@ from settings.credentials import (
     API_ADMIN_PASSWORD,
     API_USERNAME,
 )
+from settings.base import (
+    API_TIMEOUT,
+    API_MAX_WORKERS,
+    API_MAX_RETRIES,
+    API_BACKOFF_FACTOR,
+    UPLOAD_CHUNK_SIZE,
+)
+from collections import defaultdict
+from pathlib import Path
+from requests.adapters import HTTPAdapter
 import requests
 import logging
+import threading
+import time
+import uuid
 
 logger = logging.getLogger(__name__)
 
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+
+class MultipartFileStream:
+    """
+    Multipart/form-data body with a single file which is read from disk in chunks while it is sent, so the file is
+    never fully loaded in memory. Every iteration (e.g., a retry) reads the file again from the start. Upload progress
+    is logged per quarter of the file.
+    """
+
+    def __init__(self, file_path, field_name="file", chunk_size=UPLOAD_CHUNK_SIZE):
+        self.file_path = Path(file_path)
+        self.chunk_size = chunk_size
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self.preamble = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{self.file_path.name}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode()
+        self.epilogue = f"\r\n--{boundary}--\r\n".encode()
+        self.file_size = self.file_path.stat().st_size
+
+    def __len__(self):
+        return len(self.preamble) + self.file_size + len(self.epilogue)
+
+    def __iter__(self):
+        yield self.preamble
+        bytes_sent = 0
+        next_progress = 0.25
+        with open(self.file_path, "rb") as file:
+            while chunk := file.read(self.chunk_size):
+                bytes_sent += len(chunk)
+                if bytes_sent >= next_progress * self.file_size:
+                    logger.info(
+                        f"Uploading {self.file_path.name}: {bytes_sent / 1e6:.1f} of {self.file_size / 1e6:.1f} MB"
+                    )
+                    next_progress += 0.25
+                yield chunk
+        yield self.epilogue
+
+
+class ApiClient:
+    """
+    Client for the IBF API. Requests share a pooled session (keep-alive), failing requests (connection errors, 429 and
+    5xx responses) are retried with exponential backoff and an expired token is refreshed once per request. At most
+    max_workers requests of the client are in flight at the same time, whichever thread sends them. The latency of all
+    requests is recorded per endpoint.
+    """
+
+    def __init__(
+        self,
+        token=None,
+        max_workers=API_MAX_WORKERS,
+        max_retries=API_MAX_RETRIES,
+        backoff_factor=API_BACKOFF_FACTOR,
+        timeout=API_TIMEOUT,
+    ):
+        self.token = token
+        self.expired_tokens = set()
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.latencies = defaultdict(list)
+        self.token_lock = threading.Lock()
+        self.request_slots = threading.BoundedSemaphore(max_workers)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def authenticate(self):
+        """
+        Authenticate with the IBF API and store the bearer token in the client.
+
+        Returns:
+            bearer_token (str): token to be used as authentication for api requests
+        """
+        with self.request_slots:
+            login_response = self.session.post(
+                API_SERVICE_URL + "user/login",
+                data=[("email", API_USERNAME), ("password", API_ADMIN_PASSWORD)],
+                timeout=self.timeout,
+            )
+        self.token = login_response.json()["user"]["token"]
+        return self.token
+
+    def refresh_token(self, expired_token):
+        """
+        Authenticate again after the API rejected a token. Concurrent requests with the same expired token refresh it only once.
+        """
+        with self.token_lock:
+            if expired_token == self.token or self.token is None:
+                logger.info("IBF API token expired, authenticating again")
+                self.expired_tokens.add(expired_token)
+                self.authenticate()
+            return self.token
+
+    def retry_delay(self, attempt, response=None):
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            return int(response.headers["Retry-After"])
+        return self.backoff_factor * 2**attempt
+
+    def post(self, path, body=None, files=None, token=None, data=None):
+        """
+        Post a request to the IBF API.
+
+        Args:
+            path (str): api enpoint path relative to base url (e.g., admin-area-dynamic-data/exposure)
+            body (Dict): api post body (dictionary)
+            files (Dict): files to transfer to the portal (e.g., {"file": open(raster_file, "rb")})
+            token (str): bearer token, the token of the client is used when None or when the token was refreshed
+            data (MultipartFileStream): streamed multipart body (see post_file)
+
+        Returns:
+            response (requests.Response): response of the API
+        """
+        if token is None or token in self.expired_tokens:
+            token = self.token if self.token is not None else self.authenticate()
+
+        endpoint = path.split("?")[0]
+        attempt = 0
+        token_refreshed = False
+        while True:
+            if body is not None:
+                headers = {
+                    "Authorization": "Bearer " + token,
+                    "Content-Type": "application/json",
+                    "Accept": "application/json",
+                }
+            elif data is not None:
+                headers = {
+                    "Authorization": "Bearer " + token,
+                    "Content-Type": data.content_type,
+                }
+            else:
+                headers = {"Authorization": "Bearer " + token}
+
+            if files is not None:
+                # rewind files which were (partly) sent by a failed attempt
+                for file in files.values():
+                    if hasattr(file, "seek"):
+                        file.seek(0)
+
+            try:
+                # retry delays are waited outside the request slot
+                with self.request_slots:
+                    start = time.perf_counter()
+                    response = self.session.post(
+                        API_SERVICE_URL + path,
+                        json=body,
+                        files=files,
+                        data=data,
+                        headers=headers,
+                        timeout=self.timeout,
+                    )
+            except (requests.ConnectionError, requests.Timeout) as error:
+                self.latencies[endpoint].append(time.perf_counter() - start)
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning(f"{path}: {error}, retrying")
+                time.sleep(self.retry_delay(attempt))
+                attempt += 1
+                continue
+            self.latencies[endpoint].append(time.perf_counter() - start)
+
+            if response.status_code == 401 and not token_refreshed:
+                token = self.refresh_token(token)
+                token_refreshed = True
+                continue
+
+            if (
+                response.status_code in RETRY_STATUS_CODES
+                and attempt < self.max_retries
+            ):
+                logger.warning(f"{path}: status {response.status_code}, retrying")
+                time.sleep(self.retry_delay(attempt, response))
+                attempt += 1
+                continue
+
+            if response.status_code >= 400:
+                logger.info(response.text)
+                logger.error("PIPELINE ERROR")
+                raise ValueError()
+            return response
+
+    def post_file(self, path, file_path, field_name="file", token=None):
+        """
+        Upload a file as multipart/form-data, streamed from disk in chunks. Retries read the file again from disk.
+
+        Args:
+            path (str): api enpoint path relative to base url (e.g., admin-area-dynamic-data/raster/flash-floods)
+            file_path (str): path of the file to upload
+            field_name (str): name of the form field of the file
+            token (str): bearer token, the token of the client is used when None
+
+        Returns:
+            response (requests.Response): response of the API
+        """
+        return self.post(
+            path, token=token, data=MultipartFileStream(file_path, field_name)
+        )
+
+    def latency_summary(self):
+        """
+        Number of requests and latency (mean, max and total in seconds) per endpoint.
+        """
+        return {
+            endpoint: {
+                "count": len(latencies),
+                "mean_s": sum(latencies) / len(latencies),
+                "max_s": max(latencies),
+                "total_s": sum(latencies),
+            }
+            for endpoint, latencies in self.latencies.items()
+        }
+
+    def log_latency_summary(self):
+        for endpoint, summary in self.latency_summary().items():
+            logger.info(
+                f"IBF API {endpoint}: {summary['count']} requests, mean {summary['mean_s']:.2f} s, max {summary['max_s']:.2f} s"
+            )
+
+
+_API_CLIENT = None
+
+
+def get_api_client():
+    """
+    Client shared by all uploads of the pipeline run.
+    """
+    global _API_CLIENT
+    if _API_CLIENT is None:
+        _API_CLIENT = ApiClient()
+    return _API_CLIENT
+
 
 def api_authenticate():
     """
@@ -16,12 +267,7 @@ def api_authenticate():
     Returns:
         bearer_token (str): token to be used as authentication for api requests
     """
-    API_LOGIN_URL = API_SERVICE_URL + "user/login"
-    login_response = requests.post(
-        API_LOGIN_URL,
-        data=[("email", API_USERNAME), ("password", API_ADMIN_PASSWORD)],
-    )
-    return login_response.json()["user"]["token"]
+    return get_api_client().authenticate()
 
 
 def api_post_request(token, path, body=None, files=None):
@@ -33,17 +279,16 @@ def api_post_request(token, path, body=None, files=None):
         body (Dict): api post body (dictionary)
         files (bitestring): string of bytes to transfer a binary file to the portal
     """
-    if body is not None:
-        headers = {
-            "Authorization": "Bearer " + token,
-            "Content-Type": "application/json",
-            "Accept": "application/json",
-        }
-    elif files is not None:
-        headers = {"Authorization": "Bearer " + token}
-
-    r = requests.post(API_SERVICE_URL + path, json=body, files=files, headers=headers)
-    if r.status_code >= 400:
-        logger.info(r.text)
-        logger.error("PIPELINE ERROR")
-        raise ValueError()
+    get_api_client().post(path, body=body, files=files, token=token)
+
+
+def api_post_file(token, path, file_path):
+    """
+    Upload a file to the IBF API, streamed from disk (see ApiClient.post_file)
+
+    Args:
+        path (str): api enpoint path relative to base url (e.g., admin-area-dynamic-data/raster/flash-floods)
+        file_path (str): path of the file to upload
+    """
+    get_api_client().post_file(path, file_path, token=token)
+
@@ -1,16 +1,15 @@
-from settings.base import (
-    KARONGA_PLACECODES,
-    RUMPHI_PLACECODES,
-    BLANTYRE_PLACECODES,
-)
+from settings.base import REGIONS
 
 
 def convert_placecode_to_district(place_code):
-    if place_code in KARONGA_PLACECODES:
-        return "Karonga"
-    elif place_code in RUMPHI_PLACECODES:
-        return "Rumphi"
-    elif place_code in BLANTYRE_PLACECODES:
-        return "Blantyre City"
-    else:
-        return None
+    for region in REGIONS.values():
+        if place_code in region["placecodes"]:
+            return region["event_name"]
+    return None
+
+
+def convert_placecode_to_region(place_code):
+    for region_key, region in REGIONS.items():
+        if place_code in region["placecodes"]:
+            return region_key
+    return None
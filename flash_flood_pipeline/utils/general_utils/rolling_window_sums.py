@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+
+def rolling_window_sums(times, values, windows, is_present=None):
+    """
+    Compute time based rolling sums for multiple windows and all columns (e.g., TA's) in one pass, using cumulative sums.
+    The semantics equal pandas time based rolling sums (e.g., df.rolling("12h").sum()), also for irregular timesteps:
+    the window of a timestep t contains all timesteps in (t - window, t], NaN values are skipped and the sum is NaN
+    if the window contains no values.
+
+    Args:
+        times (pd.DatetimeIndex): sorted timestamps of the rows of values
+        values (np.ndarray): array of shape (nr of timesteps, nr of columns), e.g. precipitation per TA
+        windows (list): window lengths as pd.Timedelta or strings (e.g., ["48h", "24h"])
+        is_present (np.ndarray): optional boolean array of the same shape as values, False for timesteps which do not exist
+            for a column (e.g., when columns with different timestamps are combined). The sums of these timesteps are NaN.
+
+    Returns:
+        window_sums (np.ndarray): array of shape (nr of timesteps, nr of columns, nr of windows) with the rolling sums
+    """
+    time_values = pd.DatetimeIndex(times).values
+    values = np.asarray(values, dtype="float64")
+    is_valid = np.isfinite(values)
+
+    cumulative_values = np.zeros((len(values) + 1, values.shape[1]))
+    cumulative_values[1:] = np.cumsum(np.where(is_valid, values, 0), axis=0)
+    cumulative_counts = np.zeros((len(values) + 1, values.shape[1]), dtype=int)
+    cumulative_counts[1:] = np.cumsum(is_valid, axis=0)
+
+    window_end = np.arange(1, len(values) + 1)
+    window_sums = np.empty(values.shape + (len(windows),))
+
+    for window_index, window in enumerate(windows):
+        window_start = np.searchsorted(
+            time_values, time_values - pd.Timedelta(window).to_timedelta64(), side="right"
+        )
+        sums = cumulative_values[window_end] - cumulative_values[window_start]
+        counts = cumulative_counts[window_end] - cumulative_counts[window_start]
+
+        # remove round-off of the cumulative sums, so sums like 15.0 mm are not mapped as 14.999999 mm
+        window_sums[:, :, window_index] = np.where(counts > 0, np.round(sums, 9), np.nan)
+
+    if is_present is not None:
+        window_sums[~np.asarray(is_present, dtype=bool)] = np.nan
+
+    return window_sums
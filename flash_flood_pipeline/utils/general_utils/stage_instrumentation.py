@@ -0,0 +1,223 @@
+import datetime
+import functools
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from settings.base import ENVIRONMENT, RUN_REPORT_FOLDER
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+def cpu_time():
+    """
+    CPU time (user + system) of the process and its finished child processes (e.g., the region stitching pool) in seconds.
+    """
+    if resource is None:
+        return time.process_time()
+    return sum(
+        usage.ru_utime + usage.ru_stime
+        for usage in (
+            resource.getrusage(resource.RUSAGE_SELF),
+            resource.getrusage(resource.RUSAGE_CHILDREN),
+        )
+    )
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of the process (or of its largest finished child process, if larger) in MB, None if unknown.
+    """
+    if resource is None:
+        return None
+    peak_rss = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak_rss / 1024**2 if sys.platform == "darwin" else peak_rss / 1024
+
+
+def io_bytes():
+    """
+    Bytes read from and written to storage by the process, (None, None) if the platform does not report them (only Linux).
+    """
+    try:
+        with open("/proc/self/io", "r") as io_file:
+            io_counters = dict(line.split(": ") for line in io_file.read().splitlines())
+    except OSError:
+        return None, None
+    return int(io_counters["read_bytes"]), int(io_counters["write_bytes"])
+
+
+class StageRecorder:
+    """
+    Record the wall time, CPU time, peak memory and disk IO of the named stages of a pipeline run (e.g., GPM download,
+    scenario selection, uploads) and write them to a JSON run report. Stages can be nested: the report contains the name
+    of the enclosing stage. CPU time and IO are counted for the whole process, so stages which run at the same time (e.g.,
+    the upload phases) include each others usage. Memory is reported as the high-water mark of the run at the end of the
+    stage (peak so far) and how much the stage raised it (delta, 0 for stages which stayed below an earlier peak).
+    """
+
+    def __init__(self):
+        self.run_start = datetime.datetime.now(tz=datetime.timezone.utc)
+        self.records = []
+        self.lock = threading.Lock()
+        self.active_stages = threading.local()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Record a stage of the pipeline run.
+
+        Args:
+            name (str): name of the stage (e.g., "gpm download")
+        """
+        stack = self.active_stages.__dict__.setdefault("stack", [])
+        parent = stack[-1] if stack else None
+        stack.append(name)
+
+        start = datetime.datetime.now(tz=datetime.timezone.utc)
+        start_wall = time.perf_counter()
+        start_cpu = cpu_time()
+        start_read, start_write = io_bytes()
+        start_peak_rss = peak_rss_mb()
+        status = "failed"
+        try:
+            yield
+            status = "ok"
+        finally:
+            stack.pop()
+            end_read, end_write = io_bytes()
+            end_peak_rss = peak_rss_mb()
+            record = {
+                "name": name,
+                "parent": parent,
+                "status": status,
+                "start": start.isoformat(),
+                "wall_s": time.perf_counter() - start_wall,
+                "cpu_s": cpu_time() - start_cpu,
+                "peak_rss_so_far_mb": end_peak_rss,
+                "peak_rss_delta_mb": (
+                    None if end_peak_rss is None else end_peak_rss - start_peak_rss
+                ),
+                "read_bytes": None if start_read is None else end_read - start_read,
+                "write_bytes": None if start_write is None else end_write - start_write,
+            }
+            with self.lock:
+                self.records.append(record)
+
+    def timed(self, name):
+        """
+        Decorator which records every call of the function as a stage.
+
+        Args:
+            name (str): name of the stage
+        """
+
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def add_records(self, records, parent=None):
+        """
+        Add stages recorded by another recorder (e.g., in a worker process of the region stitching pool).
+
+        Args:
+            records (list): stages recorded by the other recorder
+            parent (str): name of the stage which encloses the stages without an enclosing stage
+        """
+        with self.lock:
+            self.records.extend(
+                {**record, "parent": record["parent"] or parent} for record in records
+            )
+
+    def report(self):
+        return {
+            "environment": ENVIRONMENT,
+            "run_start": self.run_start.isoformat(),
+            "wall_s": (
+                datetime.datetime.now(tz=datetime.timezone.utc) - self.run_start
+            ).total_seconds(),
+            "cpu_s": cpu_time(),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": sorted(self.records, key=lambda record: record["start"]),
+        }
+
+    def write_report(self, report_folder=RUN_REPORT_FOLDER):
+        """
+        Write the run report to run_report_<run start>.json in report_folder and log the duration of each stage.
+
+        Args:
+            report_folder (Path): folder to store the run report in
+
+        Returns:
+            report_path (Path): path of the run report
+        """
+        report = self.report()
+        for record in report["stages"]:
+            logger.info(
+                f"Stage {record['name']} ({record['status']}): {record['wall_s']:.2f} s wall, {record['cpu_s']:.2f} s cpu"
+            )
+
+        report_folder = Path(report_folder)
+        report_folder.mkdir(parents=True, exist_ok=True)
+        report_path = (
+            report_folder / f"run_report_{self.run_start.strftime('%Y-%m-%d_%H%M%S')}.json"
+        )
+        with open(report_path, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        logger.info(
+            f"Run report written to {report_path}: {report['wall_s']:.2f} s wall, peak memory {report['peak_rss_mb']} MB"
+        )
+        return report_path
+
+
+_STAGE_RECORDER = None
+
+
+def get_stage_recorder():
+    """
+    Stage recorder shared by all stages of the pipeline run.
+    """
+    global _STAGE_RECORDER
+    if _STAGE_RECORDER is None:
+        _STAGE_RECORDER = StageRecorder()
+    return _STAGE_RECORDER
+
+
+def record_stage(name):
+    """
+    Context manager which records a stage of the pipeline run (see StageRecorder.stage).
+    """
+    return get_stage_recorder().stage(name)
+
+
+def timed_stage(name):
+    """
+    Decorator which records every call of the function as a stage of the pipeline run (see StageRecorder.timed).
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with record_stage(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
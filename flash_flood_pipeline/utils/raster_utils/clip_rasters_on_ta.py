@@ -1,23 +1,49 @@
 import rasterio
 from pathlib import Path
+from settings.base import COMPILED_LIBRARY_FOLDER
+from utils.vector_utils.compiled_library import (
+    DEPTH_ASSET_TYPE,
+    compiled_asset_entry,
+    depth_tile_path,
+    load_manifest,
+)
 
 
-def clip_rasters_on_ta(ta_df, data_folder, output_folder):
+def clip_rasters_on_ta(
+    ta_df, data_folder, output_folder, library_folder=COMPILED_LIBRARY_FOLDER
+):
     """
-    Clip the country wide flood map to a flood map per TA for each TA where a flood event is predicted.
+    Clip the country wide flood map to a flood map per TA for each TA where a flood event is predicted. For scenarios
+    in the compiled library (see compile_library.py) the pre-clipped flood map tiles are used instead.
 
     Args:
         ta_df (gpd.GeoDataFrame): dataframe with all TA's. Contains a scenario column which describes the forecasted flood event for that TA
         data_folder (Path): Path to input data folder where the different scenario datasets are stored
         output_folder (Path): Folder where the clipped rasters should be stored
+        library_folder (Path): Path to the compiled scenario library
 
     returns:
         raster_path (list): list of paths to the raster files clipped/created
     """
-    Path(output_folder).mkdir(exist_ok=True)
+    Path(output_folder).mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(library_folder)
     raster_paths = []
     for _, row in ta_df.iterrows():
         if row["scenario"] != "":
+            compiled_entry = compiled_asset_entry(
+                manifest, data_folder, row["scenario"], DEPTH_ASSET_TYPE
+            )
+            if compiled_entry is not None:
+                if row["placeCode"] in compiled_entry["tiles"]:
+                    raster_paths.append(
+                        str(
+                            depth_tile_path(
+                                library_folder, row["scenario"], row["placeCode"]
+                            )
+                        )
+                    )
+                continue
+
             input_raster = data_folder / row["scenario"] / "depth.tif"
             with rasterio.open(input_raster) as src:
                 out_image, out_transform = rasterio.mask.mask(
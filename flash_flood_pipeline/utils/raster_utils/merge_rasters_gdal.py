@@ -1,24 +1,41 @@
+import uuid
 from osgeo import gdal
+from settings.base import FLOOD_MAP_CREATION_OPTIONS
 
 
-def merge_rasters_gdal(output_path_raster, raster_paths):
+def merge_rasters_gdal(
+    output_path_raster, raster_paths, creation_options=None, vrt_path=None
+):
     """
-    Merge rasters for individual TA's to one combined raster
+    Merge rasters for individual TA's to one combined raster. The rasters are combined in a VRT in memory (/vsimem/),
+    so no intermediate file is written and concurrent runs do not share a VRT file.
 
     Args:
         output_path_raster (str): path where the raster should be saved to (should have IBF compliant filename)
         raster_paths (list): list of the individual rasters which should be merged to get to the combined raster
+        creation_options (dict): GeoTIFF creation options which override FLOOD_MAP_CREATION_OPTIONS (e.g., {"ZLEVEL": 9, "PREDICTOR": 2})
+        vrt_path (str): path to write the VRT to disk instead (e.g., for debugging), None to keep the VRT in memory
     """
+    creation_options = {**FLOOD_MAP_CREATION_OPTIONS, **(creation_options or {})}
+    in_memory = vrt_path is None
+    if in_memory:
+        vrt_path = f"/vsimem/merged_{uuid.uuid4().hex}.vrt"
+
     # Open the input rasters
     # raster_paths+=["malawi_nodata.tif"]
-    gdal.BuildVRT("merged.vrt", raster_paths)
+    vrt = gdal.BuildVRT(vrt_path, raster_paths)
 
     original_pixsize = 1.358452567584323166e-05
 
     translate_options = gdal.TranslateOptions(
         format="GTiff",
-        creationOptions=["COMPRESS=DEFLATE"],
+        creationOptions=[f"{key}={value}" for key, value in creation_options.items()],
         xRes=original_pixsize * 2,
         yRes=original_pixsize * 2,
     )
-    gdal.Translate(output_path_raster, "merged.vrt", options=translate_options)
+    try:
+        gdal.Translate(output_path_raster, vrt, options=translate_options)
+    finally:
+        vrt = None
+        if in_memory:
+            gdal.Unlink(vrt_path)
@@ -0,0 +1,250 @@
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from rasterio import features
+from rasterio.transform import from_origin
+from scipy import sparse
+from settings.base import CACHE_FOLDER, TA_SAMPLING_UPSCALE_FACTOR
+
+logger = logging.getLogger(__name__)
+
+_WEIGHT_MATRIX_CACHE = {}
+
+
+def _axis_bilinear_weights(n_cells, upscale_factor):
+    """
+    Bilinear interpolation weights along one grid axis for every sub-cell of an upsampled axis.
+
+    Args:
+        n_cells (int): number of cells along the axis of the source grid
+        upscale_factor (int): number of sub-cells per source cell
+
+    Returns:
+        lower_index, upper_index (np.ndarray): source cell indices of the two neighbouring cell centres per sub-cell
+        lower_weight, upper_weight (np.ndarray): interpolation weights of both neighbours per sub-cell
+    """
+    position = (np.arange(n_cells * upscale_factor) + 0.5) / upscale_factor - 0.5
+    lower_index = np.floor(position).astype(int)
+    upper_weight = position - lower_index
+    lower_weight = 1 - upper_weight
+    upper_index = np.clip(lower_index + 1, 0, n_cells - 1)
+    lower_index = np.clip(lower_index, 0, n_cells - 1)
+    return lower_index, upper_index, lower_weight, upper_weight
+
+
+def grid_hash(x, y, upscale_factor=TA_SAMPLING_UPSCALE_FACTOR):
+    """
+    Hash describing the geometry of a forcing grid (cell centres and sampling resolution).
+    """
+    digest = hashlib.sha256()
+    digest.update(np.asarray(x, dtype="float64").tobytes())
+    digest.update(np.asarray(y, dtype="float64").tobytes())
+    digest.update(str(upscale_factor).encode())
+    return digest.hexdigest()
+
+
+def ta_hash(ta_gdf):
+    """
+    Hash of the TA placecodes and geometries (in EPSG:4326) as read from regions.gpkg.
+    """
+    ta_gdf_4326 = ta_gdf.to_crs("epsg:4326")
+    digest = hashlib.sha256()
+    for place_code, geometry in zip(ta_gdf_4326["placeCode"], ta_gdf_4326.geometry):
+        digest.update(str(place_code).encode())
+        digest.update(geometry.wkb)
+    return digest.hexdigest()
+
+
+def compute_ta_weight_matrix(
+    ta_gdf, x, y, upscale_factor=TA_SAMPLING_UPSCALE_FACTOR
+):
+    """
+    Compute a sparse matrix which maps the cells of a regular forcing grid to the mean value per TA. The weights reproduce
+    upsampling the grid with bilinear interpolation by upscale_factor and averaging all sub-cells with their centre within
+    the TA, without ever materializing the upsampled grid.
+
+    Args:
+        ta_gdf (gpd.GeoDataFrame): dataframe with all TA's (placeCode and geometry)
+        x (np.ndarray): cell centre coordinates of the grid along the x-axis (longitude)
+        y (np.ndarray): cell centre coordinates of the grid along the y-axis (latitude), ascending or descending
+        upscale_factor (int): number of sub-cells per grid cell along each axis
+
+    Returns:
+        weight_matrix (sparse.csr_matrix): matrix of shape (nr of TA's, len(y) * len(x)), rows sum to 1 for TA's within the grid
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    ta_gdf_4326 = ta_gdf.to_crs("epsg:4326")
+
+    x_res = x[1] - x[0]
+    y_res = y[1] - y[0]
+
+    # rasterize TA's on the sub-cell grid (north-up), sub-cells are assigned to a TA when their centre is within it
+    sub_transform = from_origin(
+        x[0] - x_res / 2,
+        max(y[0], y[-1]) + abs(y_res) / 2,
+        x_res / upscale_factor,
+        abs(y_res) / upscale_factor,
+    )
+    sub_shape = (len(y) * upscale_factor, len(x) * upscale_factor)
+    ta_labels = features.rasterize(
+        [
+            (geometry, index + 1)
+            for index, geometry in enumerate(ta_gdf_4326.geometry)
+            if geometry is not None and not geometry.is_empty
+        ],
+        out_shape=sub_shape,
+        transform=sub_transform,
+        fill=0,
+        all_touched=False,
+        dtype="int32",
+    )
+    if y_res > 0:
+        ta_labels = ta_labels[::-1, :]
+
+    sub_rows, sub_cols = np.nonzero(ta_labels)
+    ta_index = ta_labels[sub_rows, sub_cols] - 1
+    subcells_per_ta = np.bincount(ta_index, minlength=len(ta_gdf_4326))
+    subcell_weight = 1 / subcells_per_ta[ta_index]
+
+    y_low, y_high, y_low_w, y_high_w = _axis_bilinear_weights(len(y), upscale_factor)
+    x_low, x_high, x_low_w, x_high_w = _axis_bilinear_weights(len(x), upscale_factor)
+
+    rows = []
+    columns = []
+    values = []
+    for y_index, y_weight in [(y_low, y_low_w), (y_high, y_high_w)]:
+        for x_index, x_weight in [(x_low, x_low_w), (x_high, x_high_w)]:
+            rows.append(ta_index)
+            columns.append(y_index[sub_rows] * len(x) + x_index[sub_cols])
+            values.append(subcell_weight * y_weight[sub_rows] * x_weight[sub_cols])
+
+    weight_matrix = sparse.coo_matrix(
+        (np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+        shape=(len(ta_gdf_4326), len(y) * len(x)),
+    ).tocsr()
+    weight_matrix.eliminate_zeros()
+    return weight_matrix
+
+
+def get_ta_weight_matrix(
+    ta_gdf,
+    x,
+    y,
+    upscale_factor=TA_SAMPLING_UPSCALE_FACTOR,
+    cache_folder=CACHE_FOLDER / "ta_weights",
+):
+    """
+    Load the TA weight matrix for a grid from the cache, or compute and cache it when the grid or the TA's are new.
+    Matrices are cached in memory and on disk, keyed by the grid geometry and the TA hash.
+
+    Args:
+        ta_gdf (gpd.GeoDataFrame): dataframe with all TA's (placeCode and geometry)
+        x (np.ndarray): cell centre coordinates of the grid along the x-axis
+        y (np.ndarray): cell centre coordinates of the grid along the y-axis
+        upscale_factor (int): number of sub-cells per grid cell along each axis
+        cache_folder (Path): folder where the weight matrices are stored
+
+    Returns:
+        weight_matrix (sparse.csr_matrix): matrix of shape (nr of TA's, len(y) * len(x))
+    """
+    cache_key = f"{grid_hash(x, y, upscale_factor)[:16]}_{ta_hash(ta_gdf)[:16]}"
+
+    if cache_key in _WEIGHT_MATRIX_CACHE:
+        return _WEIGHT_MATRIX_CACHE[cache_key]
+
+    cache_path = Path(cache_folder) / f"{cache_key}.npz"
+    if cache_path.exists():
+        weight_matrix = sparse.load_npz(cache_path)
+    else:
+        logger.info(f"Computing TA weight matrix for grid of {len(y)}x{len(x)} cells")
+        weight_matrix = compute_ta_weight_matrix(ta_gdf, x, y, upscale_factor)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        sparse.save_npz(cache_path, weight_matrix)
+
+    _WEIGHT_MATRIX_CACHE[cache_key] = weight_matrix
+    return weight_matrix
+
+
+def crop_to_tas(data_array, ta_gdf, x_coords="x", y_coords="y"):
+    """
+    Select the rows and columns of a grid which cover the bounding box of the TA's, including the neighbouring cells
+    used by the bilinear interpolation of the TA weights (see compute_ta_weight_matrix), so the TA means are the same as
+    on the full grid. On a lazily opened dataset only this window is read from disk.
+
+    Args:
+        data_array (xr.DataArray): gridded data with x/y dimensions
+        ta_gdf (gpd.GeoDataFrame): dataframe with all TA's
+        x_coords (str): name of the x dimension
+        y_coords (str): name of the y dimension
+
+    Returns:
+        data_array (xr.DataArray): the grid window covering the TA's
+    """
+    xmin, ymin, xmax, ymax = ta_gdf.to_crs("epsg:4326").total_bounds
+    window = {}
+    for dimension, lower, upper in [(x_coords, xmin, xmax), (y_coords, ymin, ymax)]:
+        coords = data_array[dimension].values
+        resolution = abs(coords[1] - coords[0])
+        inside = np.flatnonzero(
+            (coords >= lower - resolution) & (coords <= upper + resolution)
+        )
+        window[dimension] = slice(inside[0], inside[-1] + 1)
+    return data_array.isel(window)
+
+
+def sample_ta_means(
+    data_array,
+    ta_gdf,
+    x_coords="x",
+    y_coords="y",
+    time_coords="time",
+    timesteps_per_chunk=None,
+    valid_max=None,
+):
+    """
+    Compute the mean value per TA for every timestep of a gridded dataset with one sparse matrix product. NaN cells are
+    left out of the mean (equivalent to np.nanmean over the cells of a TA).
+
+    Args:
+        data_array (xr.DataArray): gridded data with a time dimension and x/y dimensions
+        ta_gdf (gpd.GeoDataFrame): dataframe with all TA's (placeCode and geometry)
+        x_coords (str): name of the x dimension
+        y_coords (str): name of the y dimension
+        time_coords (str): name of the time dimension
+        timesteps_per_chunk (int): number of timesteps loaded at once, all timesteps if None. For lazily opened datasets
+            this bounds the memory use to one chunk
+        valid_max (float): cells with a higher value are left out of the mean, like NaN cells
+
+    Returns:
+        ta_means (pd.DataFrame): mean value per TA with time as index and placeCode as columns
+    """
+    data_array = data_array.transpose(time_coords, y_coords, x_coords)
+    weight_matrix = get_ta_weight_matrix(
+        ta_gdf, data_array[x_coords].values, data_array[y_coords].values
+    )
+
+    nr_of_timesteps = data_array.shape[0]
+    timesteps_per_chunk = timesteps_per_chunk or max(nr_of_timesteps, 1)
+    ta_means = np.empty((nr_of_timesteps, weight_matrix.shape[0]))
+    for start in range(0, nr_of_timesteps, timesteps_per_chunk):
+        chunk = slice(start, start + timesteps_per_chunk)
+        values = data_array[chunk].values.reshape(-1, weight_matrix.shape[1]).T
+        is_valid = np.isfinite(values)
+        if valid_max is not None:
+            is_valid &= values <= valid_max
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ta_means[chunk] = (
+                (weight_matrix @ np.where(is_valid, values, 0))
+                / (weight_matrix @ is_valid.astype("float64"))
+            ).T
+
+    ta_means = pd.DataFrame(
+        ta_means,
+        index=pd.Index(data_array[time_coords].values, name=time_coords),
+        columns=pd.Index(ta_gdf["placeCode"].tolist(), name="ta"),
+    )
+    return ta_means.sort_index(axis=1)
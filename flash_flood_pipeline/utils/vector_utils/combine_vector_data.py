@@ -1,9 +1,20 @@
 import geopandas as gpd
 import pandas as pd
-from settings.base import ENVIRONMENT
+from settings.base import ENVIRONMENT, COMPILED_LIBRARY_FOLDER
+from utils.vector_utils.compiled_library import (
+    compiled_asset_entry,
+    load_manifest,
+    read_compiled_assets,
+)
+from utils.vector_utils.region_statistics_index import (
+    load_region_statistics_index,
+    lookup_region_statistics,
+)
 
 
-def combine_vector_data(ta_df, data_folder, asset_type):
+def combine_vector_data(
+    ta_df, data_folder, asset_type, library_folder=COMPILED_LIBRARY_FOLDER
+):
     """
         Function to read the exposure data for each TA for its flooding scenario. For example:
         Reading the 100mm in 24 hours datasets for Karonga and the 20mm in 12 hours datasets for rumphi
@@ -14,6 +25,8 @@ def combine_vector_data(ta_df, data_folder, asset_type):
         data_folder (Path): Path to folder where all input data is stored
         asset_type (str): Type of asset to be read and combined. Choose from: 'vulnerable_buildings', 'region_statistics', 'vulnerable_health_sites', 'vulnerable_roads',
         'vulnerable_schools', 'vulnerable_waterpoints'
+        library_folder (Path): Path to the compiled scenario library (see compile_library.py). Assets of scenarios which are
+        compiled are read per TA from the library, other scenarios are clipped on the TA geometry
 
     Returns:
         merged_vector_layer (pd.DataFrame): dataset with assets and their exposure for the different TA's
@@ -34,26 +47,38 @@ def combine_vector_data(ta_df, data_folder, asset_type):
             )
         ]
 
-        region_statistics_collection = [region_statistics_untriggered_tas]
-
-        for _, row in ta_gdf_3857.iterrows():
-            vector_layer_of_interest = gpd.read_file(
-                str(data_folder / row["scenario"] / asset_type) + ".gpkg"
-            )
-
-            vector_layer_of_interest = vector_layer_of_interest.fillna(0)
-            vector_layer_of_interest_subset = vector_layer_of_interest[
-                vector_layer_of_interest["placeCode"] == row["placeCode"]
-            ]
-            region_statistics_collection.append(vector_layer_of_interest_subset)
+        region_statistics_triggered_tas = lookup_region_statistics(
+            ta_gdf_3857[["placeCode", "scenario"]],
+            load_region_statistics_index(data_folder),
+        ).drop(columns="scenario")
+        region_statistics_collection = [
+            region_statistics_untriggered_tas,
+            region_statistics_triggered_tas.fillna(0),
+        ]
 
         merged_vector_layer = pd.concat(region_statistics_collection, axis=0)
 
     else:
         vector_layers = []
+        manifest = load_manifest(library_folder)
 
         for _, row in ta_gdf_3857.iterrows():
             if row["scenario"] != "":
+                compiled_entry = compiled_asset_entry(
+                    manifest, data_folder, row["scenario"], asset_type
+                )
+                if compiled_entry is not None:
+                    features_within_ta_filtered = read_compiled_assets(
+                        library_folder,
+                        compiled_entry,
+                        row["scenario"],
+                        row["placeCode"],
+                        asset_type,
+                    )
+                    if features_within_ta_filtered is not None:
+                        vector_layers.append(features_within_ta_filtered)
+                    continue
+
                 vector_layer_of_interest = gpd.read_file(
                     str(data_folder / row["scenario"] / asset_type) + ".gpkg",
                     mask=row["geometry"],
@@ -0,0 +1,117 @@
+import json
+import logging
+import geopandas as gpd
+import pandas as pd
+from pathlib import Path
+from settings.base import COMPILED_LIBRARY_FOLDER, ENVIRONMENT
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+REGIONS_FILE = Path(f"data/static_data/{ENVIRONMENT}/regions.gpkg")
+DEPTH_ASSET_TYPE = "depth"
+
+
+def source_file_name(asset_type):
+    """
+    Name of the file of an asset type in a scenario folder (depth.tif for the flood map, <asset_type>.gpkg otherwise).
+    """
+    return f"{asset_type}.tif" if asset_type == DEPTH_ASSET_TYPE else f"{asset_type}.gpkg"
+
+
+def asset_partition_path(library_folder, scenario, place_code, asset_type):
+    """
+    Path of the compiled assets of one scenario, TA and asset type (e.g., compiled_library/100mm_24hr/MW10106/vulnerable_roads.parquet).
+    """
+    return Path(library_folder) / scenario / place_code / f"{asset_type}.parquet"
+
+
+def depth_tile_path(library_folder, scenario, place_code):
+    """
+    Path of the compiled flood map of one scenario and TA (e.g., compiled_library/100mm_24hr/MW10106/depth.tif).
+    """
+    return Path(library_folder) / scenario / place_code / f"{DEPTH_ASSET_TYPE}.tif"
+
+
+def load_manifest(library_folder=COMPILED_LIBRARY_FOLDER):
+    """
+    Read the manifest of the compiled scenario library.
+
+    Args:
+        library_folder (Path): Path to the compiled scenario library
+
+    Returns:
+        manifest (dict): manifest of the compiled library, None if the library has not been compiled (or is outdated
+        because regions.gpkg changed after compiling)
+    """
+    manifest_path = Path(library_folder) / MANIFEST_FILE
+    if not manifest_path.exists():
+        return None
+
+    with open(manifest_path, "r") as manifest_file:
+        manifest = json.load(manifest_file)
+
+    if REGIONS_FILE.exists() and REGIONS_FILE.stat().st_mtime > manifest.get(
+        "regions_mtime", 0
+    ):
+        logger.warning(
+            f"{REGIONS_FILE} changed after compiling the scenario library, the library is not used"
+        )
+        return None
+    return manifest
+
+
+def compiled_asset_entry(manifest, data_folder, scenario, asset_type):
+    """
+    Manifest entry of an asset type of a scenario.
+
+    Args:
+        manifest (dict): manifest of the compiled library (see load_manifest)
+        data_folder (Path): Path to folder where all scenarios are stored
+        scenario (str): name of the scenario (e.g., 100mm_24hr)
+        asset_type (str): type of asset (e.g., vulnerable_roads or depth)
+
+    Returns:
+        entry (dict): manifest entry with the number of features (or the tiles) per TA, None if the asset type of the scenario is not
+        compiled or its source file changed after compiling
+    """
+    if manifest is None:
+        return None
+
+    entry = manifest["scenarios"].get(scenario, {}).get(asset_type)
+    if entry is None:
+        return None
+
+    source_path = Path(data_folder) / scenario / source_file_name(asset_type)
+    if source_path.exists() and source_path.stat().st_mtime > entry["source_mtime"]:
+        logger.warning(
+            f"{source_path} changed after compiling the scenario library, the compiled assets are not used"
+        )
+        return None
+    return entry
+
+
+def read_compiled_assets(library_folder, entry, scenario, place_code, asset_type):
+    """
+    Read the compiled assets of one scenario, TA and asset type.
+
+    Args:
+        library_folder (Path): Path to the compiled scenario library
+        entry (dict): manifest entry of the scenario and asset type (see compiled_asset_entry)
+        scenario (str): name of the scenario (e.g., 100mm_24hr)
+        place_code (str): placeCode of the TA
+        asset_type (str): type of asset (e.g., vulnerable_roads)
+
+    Returns:
+        assets (pd.DataFrame): id and vulnerability (and geometry if compiled with geometry) of all assets within the TA,
+        None if the TA has no assets
+    """
+    if entry["feature_counts"].get(place_code, 0) == 0:
+        return None
+
+    partition_path = asset_partition_path(
+        library_folder, scenario, place_code, asset_type
+    )
+    if entry["include_geometry"]:
+        return gpd.read_parquet(partition_path)
+    return pd.read_parquet(partition_path)
@@ -0,0 +1,122 @@
+import hashlib
+import logging
+import geopandas as gpd
+import pandas as pd
+from pathlib import Path
+from settings.base import CACHE_FOLDER, DATA_FOLDER
+
+logger = logging.getLogger(__name__)
+
+REGION_STATISTICS_FILE = "region_statistics.gpkg"
+
+_REGION_STATISTICS_INDEX_CACHE = {}
+
+
+def region_statistics_paths(data_folder=DATA_FOLDER):
+    """
+    Region statistics files of all scenarios in the scenario library, sorted by scenario.
+    """
+    region_statistics_paths = sorted(Path(data_folder).glob(f"*/{REGION_STATISTICS_FILE}"))
+    if not region_statistics_paths:
+        raise FileNotFoundError(f"No {REGION_STATISTICS_FILE} files found in {data_folder}")
+    return region_statistics_paths
+
+
+def region_statistics_hash(data_folder=DATA_FOLDER):
+    """
+    Hash of the scenario names and the contents of the region statistics files of the scenario library.
+    """
+    digest = hashlib.sha256()
+    for region_statistics_path in region_statistics_paths(data_folder):
+        digest.update(region_statistics_path.parent.name.encode())
+        digest.update(region_statistics_path.read_bytes())
+    return digest.hexdigest()
+
+
+def build_region_statistics_index(
+    data_folder=DATA_FOLDER, cache_folder=CACHE_FOLDER / "region_statistics"
+):
+    """
+    Combine the region statistics of all scenarios in the scenario library into one table keyed by scenario and placeCode
+    and store it as (Geo)Parquet in the cache folder, keyed by the hash of the region statistics files.
+
+    Args:
+        data_folder (Path): Path to folder where all scenarios are stored (one folder per scenario, e.g. 100mm_24hr)
+        cache_folder (Path): folder where the region statistics indexes are stored
+
+    Returns:
+        region_statistics (gpd.GeoDataFrame): region statistics of all scenarios with a scenario column
+    """
+    region_statistics_collection = []
+    for region_statistics_path in region_statistics_paths(data_folder):
+        region_statistics = gpd.read_file(region_statistics_path)
+        region_statistics["scenario"] = region_statistics_path.parent.name
+        region_statistics_collection.append(region_statistics)
+
+    region_statistics = pd.concat(region_statistics_collection, ignore_index=True)
+    index_path = Path(cache_folder) / f"{region_statistics_hash(data_folder)[:16]}.parquet"
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    region_statistics.to_parquet(index_path)
+    logger.info(
+        f"Region statistics index built for {len(region_statistics_collection)} scenarios: {index_path}"
+    )
+    return region_statistics
+
+
+def load_region_statistics_index(
+    data_folder=DATA_FOLDER, cache_folder=CACHE_FOLDER / "region_statistics"
+):
+    """
+    Load the region statistics index of the scenario library. The index is read once per process, from the cache
+    folder when an index of the current region statistics files exists and built otherwise. The scenario library itself
+    is never written to.
+
+    Args:
+        data_folder (Path): Path to folder where all scenarios are stored (one folder per scenario, e.g. 100mm_24hr)
+        cache_folder (Path): folder where the region statistics indexes are stored
+
+    Returns:
+        region_statistics (gpd.GeoDataFrame): region statistics of all scenarios with a scenario column
+    """
+    data_folder = Path(data_folder)
+    if data_folder in _REGION_STATISTICS_INDEX_CACHE:
+        return _REGION_STATISTICS_INDEX_CACHE[data_folder]
+
+    index_path = Path(cache_folder) / f"{region_statistics_hash(data_folder)[:16]}.parquet"
+    if index_path.exists():
+        region_statistics = gpd.read_parquet(index_path)
+    else:
+        region_statistics = build_region_statistics_index(data_folder, cache_folder)
+
+    _REGION_STATISTICS_INDEX_CACHE[data_folder] = region_statistics
+    return region_statistics
+
+
+def lookup_region_statistics(events, region_statistics=None):
+    """
+    Select the region statistics of each TA for the scenario of that TA.
+
+    Args:
+        events (pd.DataFrame): dataframe with a placeCode and scenario column (other columns are kept)
+        region_statistics (gpd.GeoDataFrame): region statistics index, loaded with load_region_statistics_index when None
+
+    Returns:
+        event_statistics (gpd.GeoDataFrame): events with the region statistics of their scenario, in the order of events
+    """
+    if region_statistics is None:
+        region_statistics = load_region_statistics_index()
+
+    event_statistics = pd.DataFrame(events).merge(
+        region_statistics, on=["placeCode", "scenario"], how="left", indicator=True
+    )
+    missing = event_statistics.loc[event_statistics["_merge"] == "left_only"]
+    if not missing.empty:
+        raise ValueError(
+            f"No region statistics for (placeCode, scenario): {list(zip(missing['placeCode'], missing['scenario']))}"
+        )
+
+    return gpd.GeoDataFrame(
+        event_statistics.drop(columns="_merge"),
+        geometry=region_statistics.geometry.name,
+        crs=region_statistics.crs,
+    )